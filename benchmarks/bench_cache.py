@@ -0,0 +1,59 @@
+"""Size and speed of the bucket cache format against raw pickles of the tree.
+
+Builds the synthetic bucket of `bench_entries.py` and reports the size of its
+cache and the time to save and load it, as raw pickles were written before the
+flat format and as `Bucket.save` writes it now.
+
+    $ python benchmarks/bench_cache.py --files 1000000
+"""
+
+import argparse
+import io
+import pickle
+import sys
+import time
+
+from bench_entries import make_tree
+
+from pgcs.file_system.serialize import dump_tree, load_tree
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--files-per-dir", type=int, default=1000)
+    args = parser.parse_args()
+
+    bucket = make_tree(args.files, args.files_per_dir)
+    print(f"{args.files} files in {2 * len(bucket.children)} directories")
+    # raw pickles recurse once per level of the tree
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+
+    start = time.perf_counter()
+    data = pickle.dumps(bucket)
+    dump = time.perf_counter() - start
+    start = time.perf_counter()
+    pickle.loads(data)
+    load = time.perf_counter() - start
+    print(
+        f"  pickle  {len(data) / 2**20:9.1f} MiB"
+        f"  save {dump * 1000:9.1f} ms  load {load * 1000:9.1f} ms"
+    )
+
+    f = io.BytesIO()
+    start = time.perf_counter()
+    dump_tree(bucket, f)
+    dump = time.perf_counter() - start
+    f.seek(0)
+    start = time.perf_counter()
+    load_tree(f)
+    load = time.perf_counter() - start
+    size = len(f.getvalue())
+    print(
+        f"  flat    {size / 2**20:9.1f} MiB"
+        f"  save {dump * 1000:9.1f} ms  load {load * 1000:9.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Memory per node and pickle size of the cached entry tree.
+
+Builds a synthetic bucket of directories holding files with listing metadata
+and reports the memory held by the tree, the size of its pickle and the time
+to dump and load it.
+
+    $ python benchmarks/bench_entries.py --files 1000000
+"""
+
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+
+from pgcs.file_system.entries import Bucket, Directory, File
+
+
+def make_tree(n_files: int, files_per_dir: int) -> Bucket:
+    root = {}  # type: ignore[var-annotated]
+    bucket = Bucket("bench_bucket", root)
+    root[bucket.name] = bucket
+    for d in range(0, n_files, files_per_dir):
+        # repeated directory names, as in runs/<run>/checkpoints/...
+        run = Directory(f"run_{d // files_per_dir}", bucket)
+        bucket.children[run.name] = run
+        checkpoints = Directory("checkpoints", run)
+        run.children[checkpoints.name] = checkpoints
+        for i in range(d, min(d + files_per_dir, n_files)):
+            name = f"model_{i}.ckpt"
+            checkpoints.children[name] = File.from_info(
+                name,
+                checkpoints,
+                {
+                    "timeCreated": "2024-01-01T00:00:00.000Z",
+                    "updated": f"2024-01-01T00:00:{i % 60:02}.000Z",
+                    "size": str(i),
+                    "generation": str(1700000000000000 + i),
+                    "contentType": "application/octet-stream",
+                },
+            )
+    return bucket
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--files-per-dir", type=int, default=1000)
+    args = parser.parse_args()
+
+    gc.collect()
+    tracemalloc.start()
+    bucket = make_tree(args.files, args.files_per_dir)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_dirs = 2 * len(bucket.children)
+    n_nodes = args.files + n_dirs + 1
+    print(f"{args.files} files in {n_dirs} directories")
+    print(f"  memory  {memory / 2**20:9.1f} MiB  {memory / n_nodes:6.0f} B/node")
+
+    start = time.perf_counter()
+    # the protocol `Bucket.save` uses
+    data = pickle.dumps(bucket)
+    dump = time.perf_counter() - start
+    start = time.perf_counter()
+    pickle.loads(data)
+    load = time.perf_counter() - start
+    print(f"  pickle  {len(data) / 2**20:9.1f} MiB  {len(data) / n_nodes:6.0f} B/node")
+    print(f"  dump    {dump * 1000:9.1f} ms")
+    print(f"  load    {load * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-keystroke latency of the QUERY> filter.
+
+Types a query one character at a time against synthetic object names and
+reports the time spent filtering for each keystroke, for the previous
+`re.search` scan and for `Matcher` in both modes.
+
+    $ python benchmarks/bench_matcher.py --names 1000000
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+from typing import Callable, List
+
+from pgcs.matcher import Matcher
+
+
+def make_names(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=6)) for _ in range(500)]
+    return [
+        "_".join(rng.choices(words, k=3)) + f"_{i}." + rng.choice(("ckpt", "json"))
+        for i in range(n)
+    ]
+
+
+def type_query(query: str, search: Callable[[str], List[str]]) -> None:
+    for i in range(1, len(query) + 1):
+        start = time.perf_counter()
+        hits = len(search(query[:i]))
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"  {query[:i]!r:<14} {elapsed:9.1f} ms  {hits:>9} hits")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--query", default="")
+    args = parser.parse_args()
+
+    names = make_names(args.names)
+    # a prefix of an existing name so that every keystroke keeps some hits
+    query = args.query or names[len(names) // 2][:10]
+
+    print(f"re.search scan over {len(names)} names")
+    type_query(query, lambda q: [n for n in names if re.search(q, n, flags=re.I)])
+    for mode in ("regex", "fuzzy"):
+        start = time.perf_counter()
+        matcher = Matcher(names, mode)  # type: ignore[arg-type]
+        setup = (time.perf_counter() - start) * 1000
+        print(f"Matcher(mode={mode!r}) over {len(names)} names, setup {setup:.1f} ms")
+        type_query(query, matcher.match)
+
+
+if __name__ == "__main__":
+    main()
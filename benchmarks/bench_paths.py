@@ -0,0 +1,40 @@
+"""Cost of path construction when filling a deep directory.
+
+Adds children one by one to a directory nested `--depth` levels below a bucket,
+as a listing does, then formats them the way the preview pane does with
+`ls()`.
+
+    $ python benchmarks/bench_paths.py --children 100000 --depth 20
+"""
+
+import argparse
+import time
+
+from pgcs.file_system.entries import Bucket, Container, Directory, File
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--children", type=int, default=100_000)
+    parser.add_argument("--depth", type=int, default=20)
+    args = parser.parse_args()
+
+    directory: Container = Bucket("bench_bucket", {})
+    for level in range(args.depth):
+        directory = Directory(f"level_{level}", directory)
+    children = [File(f"file_{i}", directory) for i in range(args.children)]
+
+    start = time.perf_counter()
+    for child in children:
+        directory.add(child)
+    add = time.perf_counter() - start
+    start = time.perf_counter()
+    directory.ls()
+    ls = time.perf_counter() - start
+    print(f"{args.children} children at depth {args.depth}")
+    print(f"  add  {add * 1000:9.1f} ms")
+    print(f"  ls   {ls * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Time from process start to the `pg` entry point being ready.
+
+Runs a fresh interpreter `--runs` times for each command and reports the median
+wall time, so that modules imported at startup show up as they would for a user.
+
+    $ python benchmarks/bench_startup.py --runs 20
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "python": "pass",
+    "import pgcs.main": "import pgcs.main",
+    "pg --help": "import sys; sys.argv = ['pg', '--help']; "
+    "from pgcs.main import main; main()",
+    "import custom_select": "import pgcs.custom_select",
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for name, code in COMMANDS.items():
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", code], check=True, capture_output=True
+            )
+            times.append(time.perf_counter() - start)
+        print(f"  {name:22} {statistics.median(times) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
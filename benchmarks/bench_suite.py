@@ -0,0 +1,132 @@
+"""End to end timings of a session against a synthetic bucket, offline.
+
+Generates a bucket with `synthetic.py` behind an in-memory backend that adds
+`--latency` to every request, then measures listing it (`Bucket.load` and every
+`Directory.load` below), saving and loading its cache, filtering the largest
+directory one keystroke at a time, and rendering that list in `custom_select`
+driven through a pipe. `--json` writes the numbers to compare across versions.
+
+    $ python benchmarks/bench_suite.py --objects 1000000 --latency 0.05
+"""
+
+import argparse
+import io
+import json
+import time
+from typing import Dict, List
+
+from prompt_toolkit.input.ansi_escape_sequences import REVERSE_ANSI_SEQUENCES
+from prompt_toolkit.input.defaults import create_pipe_input
+from prompt_toolkit.keys import Keys
+from prompt_toolkit.output import DummyOutput
+from synthetic import BUCKET, add_arguments, make_backend
+
+from pgcs.batch import walk
+from pgcs.custom_select import View, custom_select
+from pgcs.file_system.backend import set_backend
+from pgcs.file_system.entries import Bucket, Container
+from pgcs.file_system.serialize import dump_tree, load_tree
+from pgcs.profiling import profiler
+
+results: Dict[str, float] = {}
+
+
+def report(name: str, seconds: float, note: str = "") -> None:
+    results[name] = seconds * 1000
+    print(f"  {name:<24} {seconds * 1000:10.1f} ms  {note}".rstrip())
+
+
+def requests() -> int:
+    stats = profiler.stats("gcs.list_page")
+    return stats.count if stats else 0
+
+
+def bench_listing(bucket: Bucket, jobs: int) -> List[Container]:
+    start = time.perf_counter()
+    bucket.load()
+    report("Bucket.load", time.perf_counter() - start, f"{requests()} requests")
+    start = time.perf_counter()
+    before = requests()
+    containers: List[Container] = [bucket]
+    for entry in walk([bucket], jobs=jobs):
+        if isinstance(entry, Container):
+            containers.append(entry)
+    elapsed = time.perf_counter() - start
+    report("Directory.load (all)", elapsed, f"{requests() - before} requests")
+    report("Directory.load (mean)", elapsed / max(1, len(containers) - 1))
+    return containers
+
+
+def bench_cache(bucket: Bucket) -> None:
+    f = io.BytesIO()
+    start = time.perf_counter()
+    dump_tree(bucket, f)
+    report("cache save", time.perf_counter() - start)
+    f.seek(0)
+    start = time.perf_counter()
+    load_tree(f)
+    report("cache load", time.perf_counter() - start, f"{f.tell() / 2**20:.1f} MiB")
+
+
+def bench_filter(container: Container) -> None:
+    view = View(container.children, container)
+    names = list(container.children)
+    # a prefix of an existing name so that every keystroke keeps some hits
+    query = names[len(names) // 2][:8]
+    times = []
+    for i in range(1, len(query) + 1):
+        start = time.perf_counter()
+        view.filter_candidates(query[:i])
+        times.append(time.perf_counter() - start)
+    report("filter (mean keystroke)", sum(times) / len(times), f"{len(names)} names")
+    report("filter (max keystroke)", max(times))
+
+
+def bench_render(container: Container, keys: int) -> None:
+    stats = profiler.stats("render")
+    renders = stats.count if stats else 0
+    with create_pipe_input() as pipe_input:
+        pipe_input.send_text(
+            REVERSE_ANSI_SEQUENCES[Keys.Down] * keys
+            + REVERSE_ANSI_SEQUENCES[Keys.Enter]
+        )
+        start = time.perf_counter()
+        custom_select(
+            container.children, source=container, input=pipe_input, output=DummyOutput()
+        )
+        elapsed = time.perf_counter() - start
+    stats = profiler.stats("render")
+    count = stats.count - renders if stats else 0
+    report("custom_select", elapsed, f"{keys} keys, {count} renders")
+    if stats:
+        report("render (mean)", stats.total / stats.count)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    set_backend(make_backend(args))
+    print(
+        f"{args.objects} objects, fan-out {args.fanout}, depth {args.depth}, "
+        f"names of {args.name_length} chars, {args.latency * 1000:.0f} ms latency"
+        f" (generated in {time.perf_counter() - start:.1f} s)"
+    )
+    bucket = Bucket(BUCKET, {})
+    containers = bench_listing(bucket, args.jobs)
+    bench_cache(bucket)
+    largest = max(containers, key=lambda container: len(container.children))
+    bench_filter(largest)
+    bench_render(largest, args.keys)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results_ms": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Synthetic buckets behind an in-memory backend, for the offline benchmarks.
+
+Objects are spread evenly over the directories at the bottom of a tree of
+`depth` levels with `fanout` subdirectories each. Names are random lowercase
+words of `name_length` chars drawn from a fixed seed, so that the same arguments
+give the same bucket on every run and numbers compare across versions.
+"""
+
+import argparse
+import random
+import string
+from typing import Iterator
+
+from pgcs.file_system.backend import MemoryBackend
+
+BUCKET = "bench_bucket"
+
+
+def synthetic_paths(
+    objects: int, fanout: int, depth: int, name_length: int, seed: int = 0
+) -> Iterator[str]:
+    rng = random.Random(seed)
+
+    def word() -> str:
+        return "".join(rng.choices(string.ascii_lowercase, k=name_length))
+
+    dirs = [""]
+    for _ in range(depth):
+        dirs = [f"{parent}{word()}_{i}/" for parent in dirs for i in range(fanout)]
+    for i in range(objects):
+        yield f"gs://{BUCKET}/{dirs[i % len(dirs)]}{word()}_{i}.bin"
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--objects", type=int, default=100_000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--name-length", type=int, default=12)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every request"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def make_backend(args: argparse.Namespace) -> MemoryBackend:
+    paths = synthetic_paths(
+        args.objects, args.fanout, args.depth, args.name_length, args.seed
+    )
+    # contents are empty, listings and metadata are what is measured
+    return MemoryBackend(dict.fromkeys(paths, b""), latency=args.latency)
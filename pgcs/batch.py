@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Set
+
+from pgcs.file_system.backend import split_path
+from pgcs.file_system.base import Entry
+from pgcs.file_system.entries import Container
+from pgcs.utils import format_size
+
+WALK_CONCURRENCY = 8
+
+
+def lookup(root: Dict[str, Entry], path: str, refresh: bool = False) -> Entry:
+    """Return the entry at `path`, listing the containers on the way as needed."""
+    bucket_name, key = split_path(path.rstrip("/"))
+    entry = root.get(bucket_name)
+    for name in key.split("/") if key else ():
+        if isinstance(entry, Container):
+            load(entry, refresh)
+            entry = entry.get(name)
+        else:
+            entry = None
+    if entry is None:
+        raise FileNotFoundError(path)
+    return entry
+
+
+def load(container: Container, refresh: bool = False) -> Container:
+    """List `container` unless it is cached; `refresh` lists it again."""
+    container.load(force=refresh)
+    return container
+
+
+def walk(
+    tops: Iterable[Entry], refresh: bool = False, jobs: int = WALK_CONCURRENCY
+) -> Iterator[Entry]:
+    """Yield every entry below `tops` as soon as its parent is listed.
+
+    Up to `jobs` containers are listed at once, so entries come in no
+    particular order. Cached containers are not listed again unless `refresh`.
+    """
+    with ThreadPoolExecutor(jobs, thread_name_prefix="pgcs-walk") as executor:
+        pending: Set[Future[Container]] = {
+            executor.submit(load, top, refresh)
+            for top in tops
+            if isinstance(top, Container)
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for child in list(future.result().children.values()):
+                        yield child
+                        if isinstance(child, Container):
+                            pending.add(executor.submit(load, child, refresh))
+        finally:
+            # e.g. the reader of a pipe went away
+            for future in pending:
+                future.cancel()
+
+
+def ls(
+    root: Dict[str, Entry],
+    paths: List[str],
+    recursive: bool = False,
+    refresh: bool = False,
+    jobs: int = WALK_CONCURRENCY,
+) -> Iterator[str]:
+    """Paths of the children of `paths`, or of every bucket if none."""
+    if not paths:
+        yield from (entry.path() for entry in root.values())
+        return
+    for path in paths:
+        entry = lookup(root, path, refresh)
+        if not isinstance(entry, Container):
+            yield entry.path()
+        elif recursive:
+            yield from (child.path() for child in walk([entry], refresh, jobs))
+        else:
+            yield from load(entry, refresh).ls()
+
+
+def find(
+    root: Dict[str, Entry],
+    pattern: str,
+    paths: List[str],
+    ignore_case: bool = True,
+    refresh: bool = False,
+    jobs: int = WALK_CONCURRENCY,
+) -> Iterator[str]:
+    """Paths below `paths` (every bucket if none) that match the regex `pattern`."""
+    regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    tops = [lookup(root, path, refresh) for path in paths] or list(root.values())
+    for entry in walk(tops, refresh, jobs):
+        path = entry.path()
+        if regex.search(path):
+            yield path
+
+
+def du(
+    root: Dict[str, Entry],
+    paths: List[str],
+    human: bool = False,
+    refresh: bool = False,
+    jobs: int = WALK_CONCURRENCY,
+) -> Iterator[str]:
+    """Bytes, object count and path of each of `paths`, or of every bucket.
+
+    Every path is walked to the bottom, so its rolled up `usage` is exact and
+    printed as soon as it is.
+    """
+    tops = [lookup(root, path, refresh) for path in paths] or list(root.values())
+    for top in tops:
+        if isinstance(top, Container):
+            for _ in walk([top], refresh, jobs):
+                pass
+            size, count, _ = top.usage
+        else:
+            size, count = getattr(top, "size", 0), 1
+        yield f"{format_size(size) if human else size}\t{count}\t{top.path()}"
@@ -1,14 +1,28 @@
+import asyncio
 import os
-import re
-from functools import lru_cache, partial
-from typing import Any, Dict, List, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
-import gcsfs
-from prompt_toolkit.application import Application
+from prompt_toolkit.application import Application, get_app
 from prompt_toolkit.clipboard import ClipboardData
 from prompt_toolkit.clipboard.pyperclip import PyperclipClipboard
-from prompt_toolkit.filters import IsDone
-from prompt_toolkit.formatted_text import AnyFormattedText
+from prompt_toolkit.data_structures import Point
+from prompt_toolkit.document import Document
+from prompt_toolkit.filters import Condition, IsDone
+from prompt_toolkit.formatted_text import AnyFormattedText, StyleAndTextTuples
 from prompt_toolkit.formatted_text.utils import to_plain_text
 from prompt_toolkit.key_binding import (
     KeyBindings,
@@ -23,55 +37,274 @@ from prompt_toolkit.layout.containers import (
     VSplit,
     Window,
 )
-from prompt_toolkit.layout.controls import FormattedTextControl
+from prompt_toolkit.layout.controls import FormattedTextControl, UIContent, UIControl
 from prompt_toolkit.layout.layout import Layout
-from prompt_toolkit.styles import Style
+from prompt_toolkit.mouse_events import MouseEvent, MouseEventType
+from prompt_toolkit.styles import Style, merge_styles
+from prompt_toolkit.styles.pygments import style_from_pygments_cls
 from prompt_toolkit.widgets import TextArea
+from pygments.styles import get_style_by_name
 
+from pgcs.download import DownloadManager
 from pgcs.file_system.base import Entry
-from pgcs.file_system.entries import Bucket, Directory, File
+from pgcs.file_system.entries import Bucket, Container, Directory, File
+from pgcs.file_system.index import ObjectIndex, locate, resolve
+from pgcs.file_system.lru import get_lru
+from pgcs.matcher import RANK_LIMIT, Matcher, listing_filter
 from pgcs.preferences import PREF_FILE_PATH, GCSPref
-from pgcs.utils import error_handler
+from pgcs.prefetch import Prefetcher
+from pgcs.preview import Fragments, PreviewCache, fetch_preview
+from pgcs.profiling import profiler
+from pgcs.utils import error_handler, format_size
+
+if TYPE_CHECKING:
+    from prompt_toolkit.key_binding.key_bindings import NotImplementedOrNone
 
 pref = GCSPref.read() if PREF_FILE_PATH.exists() else GCSPref()
-gfs = gcsfs.GCSFileSystem()
+prefetcher = Prefetcher(pref.prefetch_depth, pref.prefetch_concurrency)
+download_manager = DownloadManager(pref.download_concurrency, pref.download_chunk_size)
+# GCS calls issued from the UI (stat, reload) run here so that they never
+# block the prompt_toolkit event loop and may outlive a single screen
+io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pgcs-io")
 
 ITEM_CLASS = "class:item"
 SELECTED_CLASS = "class:selected"
+SIZE_CLASS = "class:size"
+LOADING_TEXT = "loading…"
+# scrolling through entries faster than this never reaches the network
+PREVIEW_DELAY = 0.05
+# queries typed faster than this are not sent to GCS, see `Browser`
+LISTING_FILTER_DELAY = 0.15
+STATUS_REFRESH_INTERVAL = 0.25
+PREVIEW_MODES = ("stat", "head", "tail")
+# like fuzzy ranking, sorting longer lists by size costs more than a keystroke
+SORT_LIMIT = RANK_LIMIT
+# views kept to go back to
+HISTORY_SIZE = 100
+
+
+class PreviewLoader:
+    """Fetches what the preview pane needs in the background.
+
+    Only the most recent request is kept; moving the cursor cancels the previous
+    one and the preview is repainted when the data arrives. Files are shown by
+    `mode`: their metadata ("stat"), or the start ("head") or end ("tail") of
+    their content, which is kept in a `PreviewCache` of `cache_size` chars.
+    Containers are listed, then measured, see `Container.measure`.
+    """
+
+    def __init__(self, mode: str, cache_size: int) -> None:
+        self.mode = mode
+        self.cache = PreviewCache(cache_size)
+        self._key: Tuple[str, str] = ("", "")
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stop = threading.Event()
+        self._errors: Dict[Tuple[str, str], str] = {}
+
+    def next_mode(self) -> None:
+        i = PREVIEW_MODES.index(self.mode) if self.mode in PREVIEW_MODES else -1
+        self.mode = PREVIEW_MODES[(i + 1) % len(PREVIEW_MODES)]
+
+    def _request_key(self, entry: Entry) -> Tuple[str, str]:
+        return entry.path(), self.mode if isinstance(entry, File) else ""
+
+    def error(self, entry: Entry) -> str:
+        return self._errors.get(self._request_key(entry), "")
+
+    def content(self, file: File) -> Optional[Fragments]:
+        return self.cache.get((file.path(), file.generation, self.mode))
+
+    def request(self, entry: Union[File, Container]) -> None:
+        self._request(entry, self._request_key(entry))
+
+    def measure(self, container: Container) -> None:
+        key = (container.path(), "usage")
+        # a measurement is not worth retrying on every repaint
+        if key not in self._errors:
+            self._request(container, key)
+
+    def _request(self, entry: Union[File, Container], key: Tuple[str, str]) -> None:
+        if key == self._key and self._task is not None and not self._task.done():
+            return
+        if self._task is not None:
+            self._task.cancel()
+        # a flat listing of a large prefix would outlive the cancelled task
+        self._stop.set()
+        self._stop = threading.Event()
+        self._key = key
+        app = get_app()
+        self._task = app.create_background_task(self._fetch(entry, key, app))
+
+    def close(self) -> None:
+        """Abandon a measurement in flight, so that exiting does not wait on it."""
+        self._stop.set()
+
+    async def _fetch(
+        self, entry: Union[File, Container], key: Tuple[str, str], app: Application[Any]
+    ) -> None:
+        await asyncio.sleep(PREVIEW_DELAY)
+        fetch: Callable[[], Any]
+        if isinstance(entry, Container):
+            fetch = entry.load
+            if key[1] == "usage":
+                fetch = partial(entry.measure, self._stop)
+        elif key[1] == "stat":
+            fetch = entry.stat
+        else:
+            fetch = partial(self._read, entry, key[1])
+        try:
+            await asyncio.get_running_loop().run_in_executor(io_executor, fetch)
+        except Exception as e:
+            self._errors[key] = str(e)
+        app.invalidate()
+
+    def _read(self, file: File, mode: str) -> None:
+        preview = fetch_preview(file, mode, pref.preview_bytes)
+        # the generation is known once the read has looked the file up
+        self.cache.put((file.path(), file.generation, mode), preview)
+
+
+preview_loader = PreviewLoader(pref.preview_mode, pref.preview_cache_size)
+# flat listings of whole buckets, see `load_flat_in_background`
+flat_listings: Dict[str, "Future[bool]"] = {}
+flat_listing_stop = threading.Event()
+
+
+def entry_size(entry: Optional[Entry]) -> int:
+    if isinstance(entry, File):
+        return entry.size
+    if isinstance(entry, Container):
+        return entry.usage[0]
+    return 0
+
+
+def format_usage(entry: Optional[Entry]) -> str:
+    if isinstance(entry, File):
+        return format_size(entry.size)
+    if isinstance(entry, Container):
+        size, _, complete = entry.usage
+        # "+" marks totals of a subtree that is not fully loaded yet
+        return format_size(size) + ("" if complete else "+")
+    return ""
+
+
+class ListOrder:
+    """Order of the candidate list: as listed, or by size with the largest first.
+
+    Sizes of containers are their rolled up `usage`, so the order follows the
+    totals as listings and measurements arrive.
+    """
+
+    def __init__(self, sort_by: str) -> None:
+        self.sort_by = sort_by
+
+    @property
+    def by_size(self) -> bool:
+        return self.sort_by == "size"
+
+    def toggle(self) -> None:
+        self.sort_by = "name" if self.by_size else "size"
+
+    def apply(self, names: List[str], choices: Dict[str, Entry]) -> List[str]:
+        if not self.by_size or len(names) > SORT_LIMIT:
+            return names
+        return sorted(names, key=lambda name: -entry_size(choices.get(name)))
+
+
+list_order = ListOrder(pref.sort_by)
+
+
+class IndexSearch:
+    """Answers the QUERY> prompt from the object index across all buckets.
+
+    Hits become `File`s on top of the cached tree, see `resolve`, so that they
+    can be previewed, copied and downloaded like listed entries.
+    """
+
+    def __init__(self, index: ObjectIndex, root: Dict[str, Entry]) -> None:
+        self.choices: Dict[str, Entry] = {}
+        self._index = index
+        self._root = root
+        self._query: Optional[str] = None
+        self._paths: List[str] = []
+
+    def __call__(self, query: str) -> List[str]:
+        if query != self._query:
+            self._query = query
+            self._paths = self._index.search(query, ignore_case=pref.ignore_case)
+            for path in self._paths:
+                if path not in self.choices:
+                    self.choices[path] = resolve(self._root, path)
+        return self._paths
+
+
+def run_in_background(
+    event: KeyPressEvent, func: Callable[..., Any], *args: Any
+) -> None:
+    future: Future[Any] = io_executor.submit(func, *args)
+    future.add_done_callback(lambda _: event.app.invalidate())
 
 
-class CustomFormattedTextControl(FormattedTextControl):
+class CandidateListControl(UIControl):
+    """List of candidate names that only formats the rows on screen.
+
+    `get_items` is called once per render and may return a very large list;
+    prompt_toolkit's `Window` asks `UIContent.get_line` only for the visible
+    rows and scrolls to keep the pointed row in view.
+    """
+
     def __init__(
-        self,
-        text: AnyFormattedText,
-        choices: Dict[str, Entry],
-        *args: Any,
-        **kwargs: Any,
+        self, get_items: Callable[[], List[str]], choices: Dict[str, Entry]
     ) -> None:
-        super(CustomFormattedTextControl, self).__init__(
-            self._convert_callable_text(text), *args, **kwargs
-        )
         self.pointed_at = 0
+        self._get_items = get_items
+        self._items: List[str] = []
         self._choices = choices
+        self._page_size = 1
 
     @property
     def choice_count(self) -> int:
-        return len(self._fragments) if self._fragments is not None else 0
+        return len(self._items)
 
-    def _convert_callable_text(self, text: AnyFormattedText) -> AnyFormattedText:
-        if callable(text):
+    def is_focusable(self) -> bool:
+        return True
 
-            def wrapper() -> List[Tuple[str, Any]]:
-                choices = []
-                for i, (style, item) in enumerate(text()):
-                    if i == self.pointed_at:
-                        choices.append((SELECTED_CLASS, item))
-                    else:
-                        choices.append((style, item))
-                return choices
+    def refresh(self) -> None:
+        self._items = self._get_items()
+        self.pointed_at = max(0, min(self.pointed_at, self.choice_count - 1))
 
-            return wrapper
-        return text
+    def create_content(self, width: int, height: int) -> UIContent:
+        self.refresh()
+        self._page_size = max(1, height)
+        items = self._items
+
+        def get_line(i: int) -> StyleAndTextTuples:
+            line: StyleAndTextTuples = [
+                (SELECTED_CLASS if i == self.pointed_at else ITEM_CLASS, items[i])
+            ]
+            if list_order.by_size:
+                usage = format_usage(self._choices.get(items[i]))
+                if usage:
+                    line.append((SIZE_CLASS, f"  {usage}"))
+            return line
+
+        return UIContent(
+            get_line=get_line,
+            line_count=len(items),
+            cursor_position=Point(x=0, y=self.pointed_at),
+            show_cursor=False,
+        )
+
+    def mouse_handler(self, mouse_event: MouseEvent) -> "NotImplementedOrNone":
+        if mouse_event.event_type == MouseEventType.MOUSE_UP:
+            self.pointed_at = mouse_event.position.y
+        elif mouse_event.event_type == MouseEventType.SCROLL_UP:
+            self.move_cursor_up()
+        elif mouse_event.event_type == MouseEventType.SCROLL_DOWN:
+            self.move_cursor_down()
+        else:
+            return NotImplemented
+        return None
 
     def move_cursor_up(self) -> None:
         self.pointed_at -= 1
@@ -81,9 +314,27 @@ class CustomFormattedTextControl(FormattedTextControl):
         self.pointed_at += 1
         self.pointed_at %= self.choice_count if self.choice_count > 0 else 1
 
-    def get_pointed_at(self) -> AnyFormattedText:
-        self.pointed_at = max(0, min(self.pointed_at, self.choice_count - 1))
-        return self._fragments[self.pointed_at][1] if self._fragments else None
+    def page_up(self) -> None:
+        self.pointed_at = max(0, self.pointed_at - self._page_size)
+
+    def page_down(self) -> None:
+        self.pointed_at = max(
+            0, min(self.pointed_at + self._page_size, self.choice_count - 1)
+        )
+
+    def set_choices(self, choices: Dict[str, Entry]) -> None:
+        self._choices = choices
+
+    def get_pointed_at(self) -> str:
+        self.refresh()
+        return self._items[self.pointed_at] if self._items else ""
+
+    def get_neighbors(self, radius: int) -> Tuple[List[str], int]:
+        start = max(0, self.pointed_at - radius)
+        return (
+            self._items[start : self.pointed_at + radius + 1],
+            self.pointed_at - start,
+        )
 
     def get_key_bindings(self) -> KeyBindingsBase:
         bindings = KeyBindings()
@@ -100,128 +351,439 @@ class CustomFormattedTextControl(FormattedTextControl):
         def _(event: KeyPressEvent) -> None:
             self.move_cursor_down()
 
-        @bindings.add(Keys.Right)
+        @bindings.add(Keys.PageUp)
         def _(event: KeyPressEvent) -> None:
-            entry = to_plain_text(self.get_pointed_at()).strip()
-            if entry:
-                event.app.exit(result=entry)
+            self.page_up()
 
-        @bindings.add(Keys.Left)
+        @bindings.add(Keys.PageDown)
         def _(event: KeyPressEvent) -> None:
-            entry = to_plain_text(self.get_pointed_at()).strip()
-            if entry:
-                event.app.exit(result="left")
+            self.page_down()
 
         @bindings.add(Keys.ControlP)
         def _(event: KeyPressEvent) -> None:
-            entry_name = to_plain_text(self.get_pointed_at()).strip()
-            entry = self._choices[entry_name]
+            entry_name = self.get_pointed_at()
+            entry = self._choices.get(entry_name)
             if entry:
                 event.app.clipboard.set_data(ClipboardData(entry.path()))
 
         @bindings.add(Keys.ControlD)
         def _(event: KeyPressEvent) -> None:
-            entry_name = to_plain_text(self.get_pointed_at()).strip()
-            entry = self._choices[entry_name]
+            entry_name = self.get_pointed_at()
+            entry = self._choices.get(entry_name)
             if entry:
-                gfs.download(
-                    entry.path(), ".", recursive=isinstance(entry, (Bucket, Directory))
-                )
+                download_manager.download(entry)
 
         @bindings.add(Keys.ControlR)
         def _(event: KeyPressEvent) -> None:
-            entry_name = to_plain_text(self.get_pointed_at()).strip()
-            entry = self._choices[entry_name]
+            entry_name = self.get_pointed_at()
+            entry = self._choices.get(entry_name)
             if entry and isinstance(entry, (Directory, Bucket)):
-                entry.load(force=True)
+                run_in_background(event, entry.load, True)
 
-        @bindings.add(Keys.Enter)
+        @bindings.add(Keys.ControlT)
         def _(event: KeyPressEvent) -> None:
-            content = self.get_pointed_at()
-            event.app.exit(result=content)
+            preview_loader.next_mode()
 
-        return (
-            bindings
-            if self.key_bindings is None
-            else merge_key_bindings([bindings, self.key_bindings])
+        @bindings.add(Keys.ControlO)
+        def _(event: KeyPressEvent) -> None:
+            list_order.toggle()
+
+        return bindings
+
+
+class View:
+    """One screen of the browser and where the user left it.
+
+    The names listed are those of `choices`, re-read from `source` when given so
+    that a listing still streaming in shows up as it arrives, or the names
+    `search` answers for the query, which it adds to `choices`. The query, cursor
+    and scroll are kept here while the view is not shown, and the matcher keeps
+    its results for the query, so showing the view again costs nothing.
+    """
+
+    def __init__(
+        self,
+        choices: Dict[str, Entry],
+        source: Optional[Container] = None,
+        search: Optional[Callable[[str], List[str]]] = None,
+    ) -> None:
+        self.choices = choices
+        self.source = source
+        self.search = search
+        self.matcher = Matcher(choices, pref.match_mode, pref.ignore_case)
+        self.query = ""
+        self.pointed_at = 0
+        self.scroll = 0
+
+    def filter_candidates(self, query: str) -> List[str]:
+        if self.search is not None:
+            return list_order.apply(self.search(query), self.choices)
+        if self.source is not None and self.source.children is not self.choices:
+            self.choices = self.source.children
+            self.matcher.set_items(self.choices)
+        elif self.source is None and list(self.choices) != self.matcher.items:
+            # buckets listed in the background join the cached ones in place
+            self.matcher.set_items(self.choices)
+        return list_order.apply(self.matcher.match(query), self.choices)
+
+
+class Browser:
+    """The prompt_toolkit application of a session, shown until a file is picked.
+
+    Opening a container or going back swaps the `View` the widgets read from
+    instead of building a new application. Views that are left are kept on a
+    history stack of up to `HISTORY_SIZE`, so going back restores one as it was
+    left, and the view last gone back from is restored if it is opened again.
+    Without `navigate` the application exits on the first pick with the picked
+    name, or with "left" or "search" for those keys.
+
+    While the source of the view is not loaded, the query is also sent to GCS
+    when it can be, see `listing_filter`, so that its matches show up before
+    the listing of a large prefix reaches them.
+    """
+
+    def __init__(
+        self,
+        view: View,
+        navigate: bool = True,
+        index: Optional[ObjectIndex] = None,
+        max_preview_height: int = 10,
+        **kwargs: Any,
+    ) -> None:
+        self.view = view
+        self.history: List[View] = []
+        self._render_start = 0.0
+        self._matching: Tuple[str, str] = ("", "")
+        self._matching_task: Optional["asyncio.Task[None]"] = None
+        self._forward: Optional[View] = None
+        self._navigate = navigate
+        self._index = index
+        self._root = view.choices if view.source is None else root_of(view.source)
+        self.text_area = TextArea(prompt="QUERY> ", multiline=False)
+        self.control = CandidateListControl(self._filter_candidates, view.choices)
+        self._list_window = Window(self.control)
+        candidates_display = ConditionalContainer(self._list_window, ~IsDone())
+        status_display = ConditionalContainer(
+            Window(FormattedTextControl(self._status), height=1, style="class:status"),
+            Condition(lambda: bool(self._status())) & ~IsDone(),
+        )
+        preview_display = ConditionalContainer(
+            Window(
+                FormattedTextControl(self._entry_info, focusable=False),
+                height=lambda: min(len(self.view.choices), max_preview_height),
+                wrap_lines=True,
+                ignore_content_width=True,
+            ),
+            ~IsDone(),
+        )
+        self.app: Application[AnyFormattedText] = Application(
+            layout=Layout(
+                HSplit(
+                    [
+                        self.text_area,
+                        VSplit([candidates_display, preview_display]),
+                        status_display,
+                    ]
+                )
+            ),
+            key_bindings=merge_key_bindings(
+                [self.control.get_key_bindings(), self._key_bindings()]
+            ),
+            style=merge_styles(
+                [
+                    style_from_pygments_cls(get_style_by_name("default")),
+                    Style(
+                        [
+                            ("item", ""),
+                            ("selected", "underline bg:#d980ff #ffffff"),
+                            ("status", "reverse"),
+                            ("size", "#888888"),
+                        ]
+                    ),
+                ]
+            ),
+            # pick up pages of a streaming listing and download progress
+            refresh_interval=STATUS_REFRESH_INTERVAL,
+            before_render=self._render_started,
+            after_render=self._render_finished,
+            erase_when_done=True,
+            clipboard=PyperclipClipboard(),
+            mouse_support=True,
+            **kwargs,
         )
 
+    def run(self) -> str:
+        return to_plain_text(self.app.run()).strip()
 
-def custom_select(
-    choices: Dict[str, Entry], max_preview_height: int = 10, **kwargs: Any
-) -> str:
-    text_area = TextArea(prompt="QUERY> ", multiline=False)
-
-    def filter_candidates(choices: List[str]) -> List[Tuple[str, str]]:
-        input_text = text_area.text
-        return [
-            (ITEM_CLASS, "".join((item, "\n")))
-            for item in choices
-            if re.search(input_text, item, flags=re.I if pref.ignore_case else 0)
-        ]
-
-    control = CustomFormattedTextControl(
-        partial(filter_candidates, choices), choices, focusable=True
-    )
+    def open(self, container: Container) -> None:
+        """Show the children of `container`, keeping this view to go back to."""
+        forward, self._forward = self._forward, None
+        if forward is not None and forward.source is container:
+            view = forward
+        else:
+            view = View(container.children, container)
+        self._push()
+        self._show(view)
+
+    def back(self) -> None:
+        """Show the view left last, or the parent of this one if none is left."""
+        if self.history:
+            view = self.history.pop()
+        else:
+            source = self.view.source
+            if source is None and self.view.search is None:
+                return
+            parent = getattr(source, "parent", None)
+            if isinstance(parent, Container):
+                view = View(parent.children, parent)
+            else:
+                view = View(self._root)
+        self._forward = self.view
+        self._show(view)
+
+    def search(self) -> None:
+        """Show the search of every indexed object, see `IndexSearch`."""
+        if self._index is None or self.view.search is not None:
+            return
+        search = IndexSearch(self._index, self._root)
+        self._push()
+        self._show(View(search.choices, search=search))
+
+    def _push(self) -> None:
+        self.history.append(self.view)
+        del self.history[:-HISTORY_SIZE]
+
+    def _show(self, view: View) -> None:
+        left = self.view
+        left.query = self.text_area.text
+        left.pointed_at = self.control.pointed_at
+        left.scroll = self._list_window.vertical_scroll
+        self.view = view
+        self.text_area.buffer.set_document(
+            Document(view.query, len(view.query)), bypass_readonly=True
+        )
+        self.control.pointed_at = view.pointed_at
+        # keys already typed move the cursor before the next render
+        self.control.refresh()
+        self._list_window.vertical_scroll = view.scroll
+        if view.source is not None:
+            load_in_background(view.source)
+
+    async def _open_found(self, view: View, path: str) -> None:
+        # the containers on the way to a hit may have to be listed first
+        container = await asyncio.get_running_loop().run_in_executor(
+            io_executor, locate, self._root, path
+        )
+        if container is not None and self.view is view:
+            self.open(container)
+
+    def _pick(self, event: KeyPressEvent, name: str) -> None:
+        if not self._navigate:
+            event.app.exit(result=name)
+            return
+        entry = self.view.choices.get(name)
+        if entry is None:
+            # nothing is pointed at, or the bucket list changed under the cursor
+            return
+        if self.view.search is not None:
+            event.app.create_background_task(self._open_found(self.view, name))
+        elif isinstance(entry, (Directory, Bucket)):
+            self.open(entry)
+        elif isinstance(entry, File):
+            event.app.exit(result=name)
 
-    candidates_display = ConditionalContainer(Window(control), ~IsDone())
+    def _key_bindings(self) -> KeyBindingsBase:
+        bindings = KeyBindings()
 
-    def get_entry_info() -> str:
-        entry_name = to_plain_text(control.get_pointed_at()).strip()
-        entry = choices.get(entry_name)
+        @bindings.add(Keys.Right)
+        def _(event: KeyPressEvent) -> None:
+            name = self.control.get_pointed_at()
+            if name:
+                self._pick(event, name)
+
+        @bindings.add(Keys.Enter)
+        def _(event: KeyPressEvent) -> None:
+            self._pick(event, self.control.get_pointed_at())
+
+        @bindings.add(Keys.Left)
+        def _(event: KeyPressEvent) -> None:
+            if self._navigate:
+                self.back()
+            else:
+                event.app.exit(result="left")
+
+        @bindings.add(Keys.ControlF)
+        def _(event: KeyPressEvent) -> None:
+            if self._navigate:
+                self.search()
+            else:
+                event.app.exit(result="search")
+
+        return bindings
+
+    def _render_started(self, app: Application[Any]) -> None:
+        self._render_start = time.perf_counter()
+
+    def _render_finished(self, app: Application[Any]) -> None:
+        profiler.record("render", time.perf_counter() - self._render_start)
+
+    def _list_matching(self, query: str) -> None:
+        source = self.view.source
+        if source is None or source.loaded or self.view.search is not None:
+            return
+        key = (source.path(), query)
+        if key == self._matching:
+            return
+        self._matching = key
+        if self._matching_task is not None:
+            self._matching_task.cancel()
+        listing = listing_filter(query, pref.match_mode) if query else None
+        if listing is not None:
+            app = get_app()
+            self._matching_task = app.create_background_task(
+                self._load_matching(source, *listing, app)
+            )
+
+    async def _load_matching(
+        self,
+        source: Container,
+        name_prefix: str,
+        match_glob: Optional[str],
+        app: Application[Any],
+    ) -> None:
+        await asyncio.sleep(LISTING_FILTER_DELAY)
+        load = partial(source.load_matching, name_prefix, match_glob)
+        try:
+            await asyncio.get_running_loop().run_in_executor(io_executor, load)
+        except Exception:
+            # the full listing of the source reports what is wrong with it
+            return
+        app.invalidate()
+
+    def _filter_candidates(self) -> List[str]:
+        query = self.text_area.text
+        with profiler.timer("filter"):
+            names = self.view.filter_candidates(query)
+        self._list_matching(query)
+        # a listing replaces the children of the source as it goes
+        self.control.set_choices(self.view.choices)
+        return names
+
+    def _status(self) -> str:
+        status = []
+        source = self.view.source
+        if source is not None and source.listing:
+            if source.loaded:
+                status.append(f"revalidating {source.path()}…")
+            else:
+                count = len(self.view.choices)
+                status.append(f"listing {source.path()}… {count} entries so far")
+        status.extend(
+            f"listing gs://{name} whole…"
+            for name, future in list(flat_listings.items())
+            if not future.done()
+        )
+        status.append(download_manager.status())
+        if pref.show_latency:
+            status.append(profiler.overlay())
+        return " | ".join(filter(None, status))
+
+    def _entry_info(self) -> AnyFormattedText:
+        choices = self.view.choices
+        entry = choices.get(self.control.get_pointed_at())
         if entry is None:
             return ""
+        names, index = self.control.get_neighbors(prefetcher.concurrency)
+        prefetcher.focus([choices[name] for name in names], index)
         content = ""
         if isinstance(entry, File):
-            content = "\n".join(entry.stat())
+            if preview_loader.mode != "stat":
+                preview = preview_loader.content(entry)
+                if preview is None:
+                    preview_loader.request(entry)
+                    return preview_loader.error(entry) or LOADING_TEXT
+                return cast(StyleAndTextTuples, preview)
+            if not entry.has_stat:
+                preview_loader.request(entry)
+                return preview_loader.error(entry) or LOADING_TEXT
+            content = "\n".join(
+                (*entry.stat(), f"{entry.size} bytes", entry.content_type)
+            )
         elif isinstance(entry, (Directory, Bucket)):
-            content = "\n".join(map(os.path.basename, entry.ls()[:10]))
+            if not entry.loaded:
+                preview_loader.request(entry)
+                return preview_loader.error(entry) or LOADING_TEXT
+            size, count, complete = entry.usage
+            if not complete and pref.measure_usage:
+                preview_loader.measure(entry)
+            usage = f"{format_size(size)} in {count} objects"
+            content = "\n".join(
+                (
+                    usage if complete else f"{usage} so far",
+                    *map(os.path.basename, entry.ls()[:10]),
+                )
+            )
         return content
 
-    preview_control = FormattedTextControl(get_entry_info, focusable=False)
-    preview_display = ConditionalContainer(
-        Window(
-            preview_control,
-            height=min(len(choices), max_preview_height),
-            wrap_lines=True,
-            ignore_content_width=True,
-        ),
-        ~IsDone(),
-    )
-    app: Application[AnyFormattedText] = Application(
-        layout=Layout(
-            HSplit([text_area, VSplit([candidates_display, preview_display])])
-        ),
-        key_bindings=control.get_key_bindings(),
-        style=Style([("item", ""), ("selected", "underline bg:#d980ff #ffffff")]),
-        erase_when_done=True,
-        clipboard=PyperclipClipboard(),
-        mouse_support=True,
+
+def custom_select(
+    choices: Dict[str, Entry],
+    max_preview_height: int = 10,
+    source: Optional[Container] = None,
+    search: Optional[Callable[[str], List[str]]] = None,
+    **kwargs: Any,
+) -> str:
+    """Let the user pick one of `choices`, see `View` for `source` and `search`."""
+    browser = Browser(
+        View(choices, source, search),
+        navigate=False,
+        max_preview_height=max_preview_height,
         **kwargs,
     )
-    return to_plain_text(app.run()).strip()
+    return browser.run()
 
 
-@error_handler
-def traverse_gcs(choices: Dict[str, Entry]) -> File:
-    result = custom_select(choices)
-    if result == "left":
-        entry = list(choices.values())[0]
-        if isinstance(entry, Bucket):
-            return traverse_gcs(entry.root)  # type: ignore
-        elif isinstance(entry, Directory):
-            parent = entry.parent
-            if isinstance(parent, Bucket):
-                return traverse_gcs(parent.root)  # type: ignore
-            return traverse_gcs(parent.parent.children)  # type: ignore
-        elif isinstance(entry, File):
-            return traverse_gcs(entry.parent.parent.children)  # type: ignore
-        else:
-            raise NotImplementedError
+def load_flat_in_background(bucket: Bucket) -> None:
+    """List `bucket` whole once, unless all of it is loaded already."""
+    future = flat_listings.get(bucket.name)
+    if (future is not None and not future.done()) or bucket.usage[2]:
+        return
+    flat_listings[bucket.name] = io_executor.submit(bucket.load_flat, flat_listing_stop)
 
-    entry = choices[result]
-    if isinstance(entry, File):
-        return entry
-    elif isinstance(entry, (Directory, Bucket)):
-        entry.load()
-    return traverse_gcs(entry.children)  # type: ignore
+
+def load_in_background(container: Container) -> None:
+    lru = get_lru()
+    if lru is not None:
+        lru.touch(container)
+    if isinstance(container, Bucket) and container.name in pref.flat_listing_buckets:
+        # shown level by level below, until the whole tree is in
+        load_flat_in_background(container)
+    if not container.loaded:
+        # the listing streams in while the next screen is already shown
+        io_executor.submit(container.load)
+    elif container.is_stale(pref.cache_ttl):
+        # the cached children are shown until the revalidated ones replace them
+        io_executor.submit(container.load, True)
+
+
+def root_of(entry: Entry) -> Dict[str, Entry]:
+    while not isinstance(entry, Bucket):
+        entry = entry.parent  # type: ignore
+    return entry.root
+
+
+@error_handler
+def traverse_gcs(
+    choices: Dict[str, Entry],
+    source: Optional[Container] = None,
+    index: Optional[ObjectIndex] = None,
+    search: bool = False,
+    **kwargs: Any,
+) -> Optional[File]:
+    """Browse from `choices` until a file is picked, in a single `Browser`."""
+    browser = Browser(View(choices, source), index=index, **kwargs)
+    if search:
+        browser.search()
+    result = browser.run()
+    entry = browser.view.choices.get(result)
+    return entry if isinstance(entry, File) else None
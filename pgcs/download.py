@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pgcs.file_system.backend import get_backend
+from pgcs.file_system.base import Entry
+from pgcs.file_system.entries import File
+
+PART_SUFFIX = ".pgcs-part"
+# completed chunk indices are appended here so that an interrupted download
+# restarts from the first missing chunk
+PROGRESS_SUFFIX = ".pgcs-part.progress"
+
+
+def local_path(dest: str, name: str) -> str:
+    """Where object `name`, relative to what is downloaded, is written in `dest`.
+
+    Object names may hold any characters, so names that would climb out of
+    `dest` ("..") are rejected and empty or "." segments are dropped.
+    """
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or ".." in parts:
+        raise ValueError(f"cannot download {name!r} into {dest}")
+    path = os.path.join(dest, *parts)
+    root = os.path.realpath(dest)
+    # a symlink already in dest may still point elsewhere
+    if os.path.commonpath((root, os.path.realpath(path))) != root:
+        raise ValueError(f"cannot download {name!r} into {dest}")
+    return path
+
+
+class _Download:
+    def __init__(
+        self, rpath: str, lpath: str, size: int, generation: str, chunk_size: int
+    ) -> None:
+        self.rpath = rpath
+        self.lpath = lpath
+        self.size = size
+        self.generation = generation
+        self.chunks = [
+            (start, min(start + chunk_size, size))
+            for start in range(0, size, chunk_size)
+        ] or [(0, 0)]
+        self.remaining: Set[int] = set()
+
+    @property
+    def part_path(self) -> str:
+        return self.lpath + PART_SUFFIX
+
+    @property
+    def progress_path(self) -> str:
+        return self.lpath + PROGRESS_SUFFIX
+
+    @property
+    def header(self) -> str:
+        return f"{self.size} {self.generation}\n"
+
+    def completed_chunks(self) -> Set[int]:
+        """Chunks already on disk from an earlier run of the same object version."""
+        try:
+            with open(self.progress_path) as f:
+                header, *done = f.readlines()
+        except (OSError, ValueError):
+            return set()
+        if header != self.header or not os.path.exists(self.part_path):
+            return set()
+        return {int(line) for line in done if line.strip().isdigit()}
+
+
+class DownloadManager:
+    """Downloads objects in background threads while the UI stays responsive.
+
+    Every object is split into ranged reads of `chunk_size` bytes which are
+    fetched by `concurrency` worker threads, so both directories with many
+    objects and single large objects are downloaded in parallel. Data goes to a
+    `.pgcs-part` file next to the target and is renamed into place once all
+    chunks are written.
+    """
+
+    def __init__(self, concurrency: int, chunk_size: int) -> None:
+        self._concurrency = max(1, concurrency)
+        self._chunk_size = max(1, chunk_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._files = 0
+        self._files_done = 0
+        self._bytes = 0
+        self._bytes_done = 0
+        self._errors: List[str] = []
+        self._cancelled = False
+
+    @property
+    def active(self) -> bool:
+        return self._pending > 0
+
+    @property
+    def errors(self) -> List[str]:
+        return list(self._errors)
+
+    def download(self, entry: Entry, dest: str = ".") -> None:
+        self._submit(self._expand, entry, dest)
+
+    def status(self) -> str:
+        with self._lock:
+            if not self._files and not self._errors:
+                return ""
+            text = (
+                f"downloaded {self._files_done}/{self._files} files, "
+                f"{self._bytes_done / 2**20:.1f}/{self._bytes / 2**20:.1f} MiB"
+            )
+            if self._errors:
+                text += f", {len(self._errors)} failed: {self._errors[-1]}"
+            return text
+
+    def wait(self) -> None:
+        """Block until every queued download has finished."""
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def cancel(self) -> None:
+        """Drop queued chunks; chunks already written are resumed by the next run."""
+        self._cancelled = True
+        self.wait()
+
+    def _submit(self, func: Any, *args: Any) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._concurrency, thread_name_prefix="pgcs-download"
+                )
+            self._pending += 1
+            self._executor.submit(self._run, func, *args)
+
+    def _run(self, func: Any, *args: Any) -> None:
+        try:
+            if not self._cancelled:
+                func(*args)
+        except Exception as e:
+            with self._lock:
+                self._errors.append(str(e))
+        finally:
+            with self._idle:
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def _expand(self, entry: Entry, dest: str) -> None:
+        if isinstance(entry, File):
+            objects: List[Tuple[str, str, Dict[str, Any]]] = [
+                (
+                    entry.path(),
+                    local_path(dest, entry.name),
+                    {"size": entry.size, "generation": entry.generation},
+                )
+            ]
+            if not entry.has_stat:
+                objects = [
+                    (entry.path(), objects[0][1], get_backend().stat(entry.path()))
+                ]
+        else:
+            root = entry.path()[len("gs://") :].rstrip("/")
+            objects = []
+            for name, info in get_backend().find(entry.path()).items():
+                if name.endswith("/"):
+                    continue
+                try:
+                    lpath = local_path(dest, f"{entry.name}/{name[len(root) + 1 :]}")
+                except ValueError as e:
+                    # one unsafe name does not stop the rest of the directory
+                    with self._lock:
+                        self._errors.append(str(e))
+                    continue
+                objects.append((f"gs://{name}", lpath, info))
+        for rpath, lpath, info in objects:
+            download = _Download(
+                rpath,
+                lpath,
+                int(info.get("size") or 0),
+                str(info.get("generation") or ""),
+                self._chunk_size,
+            )
+            self._start(download)
+
+    def _start(self, download: _Download) -> None:
+        os.makedirs(os.path.dirname(download.lpath) or ".", exist_ok=True)
+        done = download.completed_chunks()
+        if not done:
+            with open(download.part_path, "wb") as f:
+                f.truncate(download.size)
+            with open(download.progress_path, "w") as f:
+                f.write(download.header)
+        download.remaining = set(range(len(download.chunks))) - done
+        with self._lock:
+            self._files += 1
+            self._bytes += download.size
+            self._bytes_done += sum(
+                end - start
+                for i, (start, end) in enumerate(download.chunks)
+                if i in done
+            )
+        if not download.remaining:
+            self._finish(download)
+            return
+        for index in sorted(download.remaining):
+            self._submit(self._fetch_chunk, download, index)
+
+    def _fetch_chunk(self, download: _Download, index: int) -> None:
+        start, end = download.chunks[index]
+        data = get_backend().read(download.rpath, start, end) if end else b""
+        with open(download.part_path, "r+b") as f:
+            f.seek(start)
+            f.write(data)
+        with self._lock:
+            with open(download.progress_path, "a") as f:
+                f.write(f"{index}\n")
+            download.remaining.discard(index)
+            self._bytes_done += len(data)
+            finished = not download.remaining
+        if finished:
+            self._finish(download)
+
+    def _finish(self, download: _Download) -> None:
+        os.replace(download.part_path, download.lpath)
+        os.remove(download.progress_path)
+        with self._lock:
+            self._files_done += 1
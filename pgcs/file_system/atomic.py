@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None  # type: ignore[assignment]
+
+LOCK_SUFFIX = ".lock"
+
+FileVersion = Tuple[int, int, int]
+
+
+@contextmanager
+def atomic_write(path: Union[str, Path]) -> Iterator[IO[bytes]]:
+    """Write `path` through a temporary file that replaces it once complete.
+
+    Readers, and the next session after a crash or ctrl-c, see either the old
+    file or the new one, never a file cut short.
+    """
+    directory, name = os.path.split(os.fspath(path))
+    # bucket names never start with "." so this cannot collide with a bucket
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path: Union[str, Path]) -> Iterator[None]:
+    """Hold an exclusive lock on `path` across sessions, where flock exists."""
+    if fcntl is None:
+        yield
+        return
+    directory, name = os.path.split(os.fspath(path))
+    with open(os.path.join(directory, f".{name}{LOCK_SUFFIX}"), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_version(path: Union[str, Path]) -> Optional[FileVersion]:
+    """Identify what is at `path` now, None if nothing; a replace changes it."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import mimetypes
+import re
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from typing import (
+    Any,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    TypeVar,
+)
+
+from pgcs.profiling import profiler
+
+T = TypeVar("T")
+
+# requests in flight at once, shared by every thread using the backend
+DEFAULT_CONCURRENCY = 32
+# objects requested per page of the GCS list API, which caps it at 1000
+LIST_PAGE_SIZE = 1000
+
+
+def split_path(path: str) -> Tuple[str, str]:
+    """Split "gs://bucket/key" (or "bucket/key") into bucket and key."""
+    if path.startswith("gs://"):
+        path = path[len("gs://") :]
+    bucket, _, key = path.partition("/")
+    return bucket, key
+
+
+def glob_regex(glob: str) -> Pattern[str]:
+    """Compile a glob of the GCS list API, e.g. "logs/**/*.{json,txt}"."""
+    parts = []
+    i = 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**", i):
+            parts.append(".*")
+            i += 1
+        elif c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[" and "]" in glob[i + 2 :]:
+            end = glob.index("]", i + 2)
+            chars = glob[i + 1 : end]
+            negate = chars.startswith("!")
+            chars = re.escape(chars[1:] if negate else chars).replace("\\-", "-")
+            parts.append(f"[{'^' if negate else ''}{chars}]")
+            i = end
+        elif c == "{" and "}" in glob[i:]:
+            end = glob.index("}", i)
+            alternatives = glob[i + 1 : end].split(",")
+            parts.append(f"(?:{'|'.join(map(re.escape, alternatives))})")
+            i = end
+        elif c == "\\" and i + 1 < len(glob):
+            i += 1
+            parts.append(re.escape(glob[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return re.compile("".join(parts), re.DOTALL)
+
+
+class Backend(metaclass=ABCMeta):
+    """Storage operations used by the entry tree, downloads and the UI.
+
+    Backends implement the coroutines prefixed with "a". The blocking methods of
+    the same name run them on the backend's event loop and may be called from
+    any thread; every request waits for one of `concurrency` slots, so worker
+    threads and batched calls share one limit and one connection pool.
+    Listings and object info use the resource format of the GCS JSON API.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY) -> None:
+        self._concurrency = max(1, concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="pgcs-backend", daemon=True
+                ).start()
+                self._loop = loop
+        return self._loop
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """Run `coro` on the backend's loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(self._run(coro), self.loop).result()
+
+    async def _run(self, coro: Awaitable[T]) -> T:
+        return await coro
+
+    async def limit(self, coro: Awaitable[T]) -> T:
+        if self._semaphore is None:
+            # created on first use so that it belongs to the backend's loop
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        async with self._semaphore:
+            return await coro
+
+    @abstractmethod
+    async def abuckets(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    async def alist_page(
+        self,
+        bucket: str,
+        prefix: str,
+        delimiter: Optional[str] = "/",
+        page_token: Optional[str] = None,
+        match_glob: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """One page of objects under `prefix`: "items", "prefixes", "nextPageToken".
+
+        `match_glob` keeps the objects whose whole name matches it, with the glob
+        syntax of the GCS list API: "*" and "?" stop at "/" and "**" does not.
+        Pages may then come back empty with a "nextPageToken".
+        """
+
+    @abstractmethod
+    async def astat(self, path: str) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def aread(self, path: str, start: int, end: int) -> bytes:
+        pass
+
+    async def astat_many(self, paths: Iterable[str]) -> List[Dict[str, Any]]:
+        return list(
+            await asyncio.gather(*(self.limit(self.astat(path)) for path in paths))
+        )
+
+    async def afind(self, path: str) -> Dict[str, Dict[str, Any]]:
+        """Every object below `path`, keyed by "bucket/name"."""
+        bucket, key = split_path(path.rstrip("/"))
+        prefix = f"{key}/" if key else ""
+        found: Dict[str, Dict[str, Any]] = {}
+        page_token = None
+        while True:
+            page = await self.limit(self.alist_page(bucket, prefix, None, page_token))
+            for item in page.get("items", []):
+                found[f"{bucket}/{item['name']}"] = item
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return found
+
+    def buckets(self) -> List[str]:
+        with profiler.timer("gcs.buckets"):
+            return self.run(self.limit(self.abuckets()))
+
+    def list_page(
+        self,
+        bucket: str,
+        prefix: str,
+        delimiter: Optional[str] = "/",
+        page_token: Optional[str] = None,
+        match_glob: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        with profiler.timer("gcs.list_page"):
+            return self.run(
+                self.limit(
+                    self.alist_page(bucket, prefix, delimiter, page_token, match_glob)
+                )
+            )
+
+    def stat(self, path: str) -> Dict[str, Any]:
+        with profiler.timer("gcs.stat"):
+            return self.run(self.limit(self.astat(path)))
+
+    def stat_many(self, paths: Iterable[str]) -> List[Dict[str, Any]]:
+        with profiler.timer("gcs.stat_many"):
+            return self.run(self.astat_many(paths))
+
+    def find(self, path: str) -> Dict[str, Dict[str, Any]]:
+        with profiler.timer("gcs.find"):
+            return self.run(self.afind(path))
+
+    def read(self, path: str, start: int, end: int) -> bytes:
+        with profiler.timer("gcs.read"):
+            return self.run(self.limit(self.aread(path, start, end)))
+
+
+class GCSBackend(Backend):
+    """Google Cloud Storage through one gcsfs session.
+
+    The coroutines run on gcsfs' own loop, so every request shares its aiohttp
+    session and connection pool. gcsfs is imported and credentials are looked up
+    on the first request, so that commands and screens that never reach GCS do
+    not pay for them.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY) -> None:
+        super().__init__(concurrency)
+        self._gcsfs: Any = None
+
+    @property
+    def _fs(self) -> Any:
+        with self._loop_lock:
+            if self._gcsfs is None:
+                import gcsfs
+
+                self._gcsfs = gcsfs.GCSFileSystem()
+        return self._gcsfs
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._fs.loop  # type: ignore[no-any-return]
+
+    async def abuckets(self) -> List[str]:
+        return [bucket["name"] for bucket in await self._fs._list_buckets()]
+
+    async def alist_page(
+        self,
+        bucket: str,
+        prefix: str,
+        delimiter: Optional[str] = "/",
+        page_token: Optional[str] = None,
+        match_glob: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return await self._fs._call(  # type: ignore[no-any-return]
+            "GET",
+            "b/{}/o",
+            bucket,
+            json_out=True,
+            delimiter=delimiter,
+            prefix=prefix or None,
+            matchGlob=match_glob,
+            maxResults=LIST_PAGE_SIZE,
+            pageToken=page_token,
+        )
+
+    async def astat(self, path: str) -> Dict[str, Any]:
+        return await self._fs._info(path)  # type: ignore[no-any-return]
+
+    async def aread(self, path: str, start: int, end: int) -> bytes:
+        return await self._fs._cat_file(  # type: ignore[no-any-return]
+            path, start=start, end=end
+        )
+
+
+class MemoryBackend(Backend):
+    """Objects held in memory, for tests and offline benchmarks.
+
+    Listings page and group by delimiter like the GCS list API, `page_size`
+    entries at a time. Every request takes `latency` seconds more, within its
+    concurrency slot, like a round trip to GCS would.
+    """
+
+    def __init__(
+        self,
+        objects: Optional[Dict[str, bytes]] = None,
+        page_size: int = LIST_PAGE_SIZE,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        latency: float = 0.0,
+    ) -> None:
+        super().__init__(concurrency)
+        self.latency = latency
+        self._page_size = page_size
+        self._lock = threading.Lock()
+        self._names: Dict[str, List[str]] = {}
+        self._objects: Dict[Tuple[str, str], Tuple[bytes, Dict[str, Any]]] = {}
+        self._generation = 0
+        for path, data in (objects or {}).items():
+            self.put(path, data, sort=False)
+        # sorted once, inserting millions of names in order would be quadratic
+        for names in self._names.values():
+            names.sort()
+
+    def put(self, path: str, data: bytes = b"", sort: bool = True) -> None:
+        bucket, name = split_path(path)
+        now = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        with self._lock:
+            names = self._names.setdefault(bucket, [])
+            created = now
+            if (bucket, name) in self._objects:
+                created = self._objects[bucket, name][1]["timeCreated"]
+            elif sort:
+                bisect.insort(names, name)
+            else:
+                names.append(name)
+            self._generation += 1
+            self._objects[bucket, name] = (
+                data,
+                {
+                    "name": name,
+                    "bucket": bucket,
+                    "size": str(len(data)),
+                    "generation": str(self._generation),
+                    "timeCreated": created,
+                    "updated": now,
+                    "contentType": mimetypes.guess_type(name)[0]
+                    or "application/octet-stream",
+                },
+            )
+
+    async def _round_trip(self) -> None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    async def abuckets(self) -> List[str]:
+        await self._round_trip()
+        return sorted(self._names)
+
+    async def alist_page(
+        self,
+        bucket: str,
+        prefix: str,
+        delimiter: Optional[str] = "/",
+        page_token: Optional[str] = None,
+        match_glob: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        await self._round_trip()
+        names = self._names.get(bucket, [])
+        matches = None if match_glob is None else glob_regex(match_glob).fullmatch
+        i = bisect.bisect_left(names, page_token or prefix)
+        items: List[Dict[str, Any]] = []
+        prefixes: List[str] = []
+        while i < len(names) and names[i].startswith(prefix):
+            if len(items) + len(prefixes) == self._page_size:
+                page: Dict[str, Any] = {"nextPageToken": names[i]}
+                break
+            name = names[i]
+            if matches is not None and not matches(name):
+                i += 1
+                continue
+            cut = name.find(delimiter, len(prefix)) if delimiter else -1
+            if cut < 0:
+                items.append(dict(self._objects[bucket, name][1]))
+                i += 1
+            else:
+                # one prefix stands for every name below it
+                common = name[: cut + len(delimiter)]  # type: ignore[arg-type]
+                prefixes.append(common)
+                i = bisect.bisect_left(names, common + "\U0010ffff", i)
+        else:
+            page = {}
+        if items:
+            page["items"] = items
+        if prefixes:
+            page["prefixes"] = prefixes
+        return page
+
+    async def astat(self, path: str) -> Dict[str, Any]:
+        await self._round_trip()
+        bucket, name = split_path(path)
+        if (bucket, name) not in self._objects:
+            raise FileNotFoundError(path)
+        info = dict(self._objects[bucket, name][1])
+        info["name"] = f"{bucket}/{name}"
+        info["size"] = int(info["size"])
+        return info
+
+    async def aread(self, path: str, start: int, end: int) -> bytes:
+        await self._round_trip()
+        bucket, name = split_path(path)
+        if (bucket, name) not in self._objects:
+            raise FileNotFoundError(path)
+        return self._objects[bucket, name][0][start:end]
+
+
+_backend: Optional[Backend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> Backend:
+    """The backend shared by the whole process, GCS unless one was set."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = GCSBackend()
+        return _backend
+
+
+def set_backend(backend: Backend) -> None:
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -1,9 +1,54 @@
 from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, Iterable, Tuple
+
+
+@lru_cache(maxsize=None)
+def state_slots(cls: type) -> Tuple[str, ...]:
+    """Slots of `cls` that are pickled, base classes first."""
+    transient = set(getattr(cls, "_transient", ()))
+    return tuple(
+        slot
+        for klass in reversed(cls.__mro__)
+        for slot in klass.__dict__.get("__slots__", ())
+        if slot not in transient
+    )
+
+
+@lru_cache(maxsize=None)
+def positional_slots(cls: type) -> Tuple[str, ...]:
+    """Slots of `cls` held by bare tuple states, written before slots were named."""
+    named_only = set(getattr(cls, "_named_only", ()))
+    return tuple(slot for slot in state_slots(cls) if slot not in named_only)
+
+
+@lru_cache(maxsize=None)
+def slot_defaults(cls: type) -> Dict[str, Any]:
+    defaults: Dict[str, Any] = {}
+    for klass in reversed(cls.__mro__):
+        defaults.update(klass.__dict__.get("_defaults", {}))
+    return defaults
 
 
 class Entry(metaclass=ABCMeta):
+    """A node of the cached tree.
+
+    Nodes keep their attributes in `__slots__` and pickle them as the tuple of
+    `state_slots` names and a tuple of their values. The names are one shared
+    tuple per class, which pickle writes only once, and let a cache survive
+    slots being added, removed or reordered. Slots listed in `_transient` are
+    not pickled and, like slots missing from caches pickled by older versions,
+    are restored from `_defaults`. Slots added since are listed in
+    `_named_only` so that bare tuples of older caches still line up.
+    """
+
+    __slots__ = ("_name",)
+    _transient: ClassVar[Tuple[str, ...]] = ()
+    _named_only: ClassVar[Tuple[str, ...]] = ()
+    _defaults: ClassVar[Dict[str, Any]] = {}
+
     def __init__(self, name: str) -> None:
         self._name = name
 
@@ -14,6 +59,33 @@ class Entry(metaclass=ABCMeta):
     def __repr__(self) -> str:
         return self._name
 
+    def __getstate__(self) -> Tuple[Tuple[str, ...], Tuple[Any, ...]]:
+        slots = state_slots(type(self))
+        return slots, tuple(getattr(self, slot) for slot in slots)
+
+    def __setstate__(self, state: Any) -> None:
+        slots = state_slots(type(self))
+        for slot, value in slot_defaults(type(self)).items():
+            setattr(self, slot, value)
+        items: Iterable[Tuple[str, Any]]
+        if isinstance(state, dict):
+            # caches pickled while entries were still backed by a __dict__
+            items = state.items()
+        elif state and isinstance(state[0], tuple):
+            items = zip(*state)
+        else:
+            # caches pickled as bare values, in the order of the slots back then
+            items = zip(positional_slots(type(self)), state)
+        for slot, value in items:
+            # slots dropped since the cache was written are ignored
+            if slot in slots:
+                setattr(self, slot, value)
+
+    @property
+    @abstractmethod
+    def depth(self) -> int:
+        """Number of levels below the bucket, which is at depth 0."""
+
     @abstractmethod
     def path(self) -> str:
         pass
@@ -1,124 +1,822 @@
 from __future__ import annotations
 
 import os
-import pickle
-from typing import Dict, List, Optional, Tuple
-
-import gcsfs
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+from pgcs.file_system.atomic import FileVersion, atomic_write, file_lock, file_version
+from pgcs.file_system.backend import get_backend, split_path
 from pgcs.file_system.base import Entry
+from pgcs.file_system.lru import get_lru
+from pgcs.profiling import profiler
+
+if TYPE_CHECKING:
+    from pgcs.file_system.store import SQLiteTreeStore
+
+_LISTING_LOCK = threading.Lock()
+# how often `load_flat` checks whether a container it waits for is listed
+LISTING_POLL_INTERVAL = 0.05
+# totals are rolled up into ancestors shared by threads listing their siblings
+_USAGE_LOCK = threading.RLock()
+
+Usage = Tuple[int, int, bool]
+
+
+def list_objects(
+    path: str,
+    delimiter: Optional[str] = "/",
+    name_prefix: str = "",
+    match_glob: Optional[str] = None,
+) -> Iterator[Tuple[List[str], List[Tuple[str, Dict[str, Any]]]]]:
+    """Yield (directory names, [(file name, object resource)]) one page at a time.
+
+    Names are relative to `path`. Without a delimiter the listing is flat and
+    recursive, so file names may contain "/" and no directories are returned.
+    `name_prefix` and `match_glob` let GCS keep only the names relative to
+    `path` that start with or match them.
+    """
+    bucket, key = split_path(path)
+    prefix = f"{key}/" if key else ""
+    backend = get_backend()
+    options = {} if match_glob is None else {"match_glob": prefix + match_glob}
+    page_token = None
+    while True:
+        page = backend.list_page(
+            bucket, prefix + name_prefix, delimiter, page_token, **options
+        )
+        dirnames = [p[len(prefix) :].rstrip("/") for p in page.get("prefixes", [])]
+        files = [(item["name"][len(prefix) :], item) for item in page.get("items", [])]
+        yield dirnames, files
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return
 
-gfs = gcsfs.GCSFileSystem()
+
+def _recount_tree(container: Container) -> None:
+    """Total every loaded container below `container`, deepest first."""
+    stack: List[Container] = [container]
+    order: List[Container] = []
+    while stack:
+        entry = stack.pop()
+        if entry.loaded:
+            order.append(entry)
+            children = entry.children.values()
+            stack.extend(child for child in children if isinstance(child, Container))
+    for entry in reversed(order):
+        entry._recount()
+
+
+def bucket_of(entry: Entry) -> Optional[Bucket]:
+    """The bucket `entry` hangs off, None for a detached directory."""
+    node: Optional[Entry] = entry
+    while node is not None and not isinstance(node, Bucket):
+        node = getattr(node, "parent", None)
+    return node
 
 
 class File(Entry):
-    def __init__(self, name: str, parent: Entry) -> None:
+    __slots__ = (
+        "_parent",
+        "_created_at",
+        "_updated_at",
+        "_size",
+        "_generation",
+        "_content_type",
+    )
+    _defaults = {"_size": 0, "_generation": 0, "_content_type": ""}
+
+    def __init__(
+        self,
+        name: str,
+        parent: Entry,
+        created_at: str = "",
+        updated_at: str = "",
+        size: int = 0,
+        generation: str = "",
+        content_type: str = "",
+    ) -> None:
         super().__init__(name)
         self._parent = parent
-        self._created_at: str = ""
-        self._updated_at: str = ""
+        self._created_at = created_at
+        self._updated_at = updated_at
+        self._size = size
+        # generations are int64s, far smaller as an int than as a str
+        self._generation = int(generation or 0)
+        # a handful of content types is shared by millions of objects
+        self._content_type = sys.intern(content_type)
+
+    @classmethod
+    def from_info(cls, name: str, parent: Entry, info: Dict[str, Any]) -> File:
+        file = cls(name, parent)
+        file.update(info)
+        return file
 
     @property
     def parent(self) -> Entry:
         return self._parent
 
+    @property
+    def created_at(self) -> str:
+        return self._created_at
+
+    @property
+    def updated_at(self) -> str:
+        return self._updated_at
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def generation(self) -> str:
+        return str(self._generation) if self._generation else ""
+
+    @property
+    def content_type(self) -> str:
+        return self._content_type
+
+    @property
+    def depth(self) -> int:
+        return self._parent.depth + 1
+
     def path(self) -> str:
-        return "/".join((self._parent.path(), self._name))
+        # files are not worth a cached path each; their parent's is cached
+        return f"{self._parent.path()}/{self._name}"
 
     def add(self, entry: Entry) -> None:
         raise NotImplementedError
 
+    def update(self, info: Dict[str, Any]) -> None:
+        """Take the metadata from an object resource as returned by listings."""
+        self._created_at = info.get("timeCreated", "")
+        self._updated_at = info.get("updated", "")
+        self._size = int(info.get("size") or 0)
+        self._generation = int(info.get("generation") or 0)
+        self._content_type = sys.intern(info.get("contentType", ""))
+
+    @property
+    def has_stat(self) -> bool:
+        return bool(self._created_at and self._updated_at)
+
     def stat(self) -> Tuple[str, str]:
-        if self._created_at and self._updated_at:
-            return (self._created_at, self._updated_at)
-        file_stats = gfs.stat(self.path())
-        self._created_at = file_stats.get("timeCreated", "")
-        self._updated_at = file_stats.get("updated", "")
+        if not self.has_stat:
+            # files cached without metadata share one listing with their siblings
+            if isinstance(self._parent, Container):
+                self._parent.stat_children()
+            if not self.has_stat:
+                self.update(get_backend().stat(self.path()))
         return (self._created_at, self._updated_at)
 
 
-class Directory(Entry):
-    def __init__(self, name: str, parent: Entry) -> None:
+class Container(Entry):
+    """Common behaviour of entries that hold children, i.e. buckets and directories."""
+
+    __slots__ = (
+        "_children",
+        "_store",
+        "_loaded",
+        "_partial",
+        "_listing",
+        "_listed_at",
+        "_total_size",
+        "_total_count",
+        "_complete",
+        "_measured",
+    )
+    # the store is attached per session and a listing never outlives one
+    _transient: ClassVar[Tuple[str, ...]] = ("_store", "_listing")
+    _named_only: ClassVar[Tuple[str, ...]] = (
+        "_total_size",
+        "_total_count",
+        "_complete",
+        "_measured",
+        "_partial",
+    )
+    _defaults = {
+        "_store": None,
+        "_loaded": False,
+        "_partial": False,
+        "_listing": False,
+        "_listed_at": 0.0,
+        "_total_size": 0,
+        "_total_count": 0,
+        "_complete": False,
+        "_measured": None,
+    }
+
+    def __init__(self, name: str, store: Optional[SQLiteTreeStore] = None) -> None:
         super().__init__(name)
-        self._parent = parent
         self._children: Dict[str, Entry] = {}
-
-    @property
-    def parent(self) -> Entry:
-        return self._parent
+        self._store = store
+        self._loaded = False
+        self._partial = False
+        self._listing = False
+        self._listed_at = 0.0
+        self._total_size = 0
+        self._total_count = 0
+        self._complete = False
+        self._measured: Optional[Tuple[int, int]] = None
 
     @property
     def children(self) -> Dict[str, Entry]:
         return self._children
 
-    def path(self) -> str:
-        return "/".join((self._parent.path(), self._name))
+    @property
+    def loaded(self) -> bool:
+        return self._loaded or (
+            bool(self._children) and not self._listing and not self._partial
+        )
+
+    @property
+    def listing(self) -> bool:
+        return self._listing
+
+    @property
+    def store(self) -> Optional[SQLiteTreeStore]:
+        return self._store
+
+    @property
+    def listed_at(self) -> float:
+        """Epoch seconds of the listing the children come from, 0 if unknown."""
+        return self._listed_at
+
+    @property
+    def usage(self) -> Usage:
+        """Bytes and objects below this container, and whether they are exact.
+
+        Totals cover the listings loaded so far and are rolled up into the
+        ancestors as pages arrive. Until the whole subtree is loaded, the result
+        of `measure` stands in for them.
+        """
+        if self._complete or self._measured is None:
+            return self._total_size, self._total_count, self._complete
+        return (*self._measured, True)
+
+    def is_stale(self, ttl: float) -> bool:
+        """Whether loaded children are older than `ttl` seconds; 0 never expires."""
+        return ttl > 0 and self.loaded and time.time() - self._listed_at > ttl
 
     def get(self, entry_name: str, default: Optional[Entry] = None) -> Optional[Entry]:
         return self._children.get(entry_name, default)
 
     def add(self, entry: Entry) -> None:
-        if entry.name and entry.path().startswith(self.path()):
-            if entry.name not in self._children:
+        if entry.name and entry.name not in self._children:
+            # entries made for this container skip building and comparing paths
+            if getattr(entry, "parent", None) is self or entry.path().startswith(
+                self.path()
+            ):
                 self._children[entry.name] = entry
 
     def load(self, force: bool = False) -> None:
-        if force:
+        """List the children, from the tree store when it has them.
+
+        Forcing the load of a loaded container revalidates it, see `_merge`.
+        """
+        with _LISTING_LOCK:
+            if self._listing or (self.loaded and not force):
+                return
+            revalidate = self.loaded
+            self._listing = True
+        try:
+            listing = None
+            if not force:
+                with profiler.timer("cache.read"):
+                    listing = self._cached_listing()
+            if listing is not None:
+                profiler.count("cache.hit")
+                entries, self._listed_at = listing
+                self._children = self._keep_containers(
+                    {entry.name: entry for entry in entries if entry.name}
+                )
+            else:
+                profiler.count("cache.miss")
+                listed_at = time.time()
+                if revalidate:
+                    self._merge()
+                else:
+                    # directories found by `load_matching` may be open already
+                    self._children = {
+                        name: entry
+                        for name, entry in self._children.items()
+                        if isinstance(entry, Container)
+                    }
+                    self._recount()
+                    for page in self._list_pages():
+                        listed = {entry.name: entry for entry in page if entry.name}
+                        # copy on write so that readers on other threads (prefetch,
+                        # rendering) can iterate children while pages keep arriving;
+                        # `load_matching` may add some of them meanwhile
+                        with _LISTING_LOCK:
+                            listed = self._keep_containers(listed)
+                            self._children = {**self._children, **listed}
+                        files = [entry for entry in page if isinstance(entry, File)]
+                        self._add_usage(sum(f.size for f in files), len(files))
+                self._listed_at = listed_at
+                self._changed()
+            self._loaded = True
+            self._partial = False
+            self._recount()
+        finally:
+            self._listing = False
+        lru = get_lru()
+        if lru is not None:
+            lru.admit(self)
+
+    def _keep_containers(self, listed: Dict[str, Entry]) -> Dict[str, Entry]:
+        """`listed` with the containers among the children in place of new ones."""
+        for name, entry in listed.items():
+            current = self._children.get(name)
+            if isinstance(entry, Container) and isinstance(current, Container):
+                listed[name] = current
+        return listed
+
+    def unload(self) -> bool:
+        """Drop the children to free memory; the next `load` brings them back.
+
+        The totals in `usage` are kept. Returns False, leaving the children in
+        place, while the container is being listed.
+        """
+        with _LISTING_LOCK:
+            if self._listing:
+                return False
             self._children = {}
-        if not self._children:
-            for _, dirnames, filenames in gfs.walk(self.path(), maxdepth=1):
+            self._loaded = False
+            self._partial = False
+        bucket = bucket_of(self)
+        if bucket is not None:
+            # saving it keeps what was dropped from its cache file, see `save`
+            bucket._unloaded = True
+        return True
+
+    def _cached_listing(self) -> Optional[Tuple[List[Entry], float]]:
+        return None if self._store is None else self._store.children(self)
+
+    def measure(self, stop: Optional[threading.Event] = None) -> Optional[Usage]:
+        """Total the whole subtree with one flat listing of its prefix.
+
+        This takes a request per thousand objects below the container, however
+        deep they are, instead of one per directory. The totals are kept until
+        the subtree is loaded far enough to be exact by itself. Setting `stop`
+        abandons the listing between pages and returns None.
+        """
+        size = count = 0
+        for _, files in list_objects(self.path(), delimiter=None):
+            if stop is not None and stop.is_set():
+                return None
+            size += sum(int(info.get("size") or 0) for _, info in files)
+            count += len(files)
+        with _USAGE_LOCK:
+            before = self.usage
+            self._measured = (size, count)
+            self._roll_up(before)
+            usage = self.usage
+        self._changed()
+        return usage
+
+    def load_matching(
+        self, name_prefix: str = "", match_glob: Optional[str] = None, pages: int = 1
+    ) -> None:
+        """Add the children GCS finds by `name_prefix` or `match_glob`, see
+        `list_objects`, from up to `pages` pages.
+
+        Meant for a container whose listing has not reached what the user looks
+        for yet. The container stays partial, i.e. not loaded, so that caches do
+        not take its children for a complete listing and the next `load` lists
+        everything. A glob listing is flat: "*" never crosses a "/", so it only
+        finds files directly in the container.
+        """
+        delimiter = "/" if match_glob is None else None
+        listing = list_objects(self.path(), delimiter, name_prefix, match_glob)
+        for _, (dirnames, files) in zip(range(pages), listing):
+            found: Dict[str, Entry] = {name: Directory(name, self) for name in dirnames}
+            found.update(
+                (name, File.from_info(name, self, info))
+                for name, info in files
+                if name and "/" not in name
+            )
+            found.pop("", None)
+            with _LISTING_LOCK:
+                if self.loaded:
+                    return
+                # what is there already may be loaded below
+                self._children = {**found, **self._children}
+                self._partial = True
+        self._recount()
+        self._changed()
+
+    @property
+    def partial(self) -> bool:
+        """Whether some children were found by `load_matching` but not all listed."""
+        return self._partial and not self._loaded
+
+    def load_flat(self, stop: Optional[threading.Event] = None) -> bool:
+        """Load the whole subtree from one flat listing of its prefix.
+
+        Like `measure`, this takes a request per thousand objects below the
+        container instead of one per directory. Containers already loaded keep
+        their children, gain those they lack and have changed files replaced;
+        the others are loaded with what was listed below them. Nothing changes
+        until the listing completes, then containers being listed meanwhile are
+        waited for. Setting `stop` abandons it and returns False.
+        """
+        listed_at = time.time()
+        tree = _FlatListing()
+        for _, files in list_objects(self.path(), delimiter=None):
+            if stop is not None and stop.is_set():
+                return False
+            for name, info in files:
+                *dirnames, basename = name.split("/")
+                node = tree
                 for dirname in dirnames:
-                    self.add(Directory(dirname, self))
-                for filename in filenames:
-                    self.add(File(filename, self))
+                    node = node.dirs.setdefault(dirname, _FlatListing())
+                # "dir/" placeholders only make their directory exist
+                if basename:
+                    node.files[basename] = info
+        # top down, into whichever nodes the tree holds by then
+        installed: List[Container] = []
+        stack: List[Tuple[Container, _FlatListing]] = [(self, tree)]
+        while stack:
+            container, node = stack.pop()
+            while not container._take_listing(node, listed_at):
+                if stop is not None and stop.is_set():
+                    return False
+                time.sleep(LISTING_POLL_INTERVAL)
+            installed.append(container)
+            for dirname, below in node.dirs.items():
+                child = container.get(dirname)
+                if isinstance(child, Container):
+                    stack.append((child, below))
+        # deepest last, so totalled first from exact children
+        for container in reversed(installed):
+            container._recount()
+            container._changed()
+        lru = get_lru()
+        if lru is not None:
+            lru.admit(self)
+        return True
+
+    def _take_listing(self, node: _FlatListing, listed_at: float) -> bool:
+        """Merge in the children listed by `load_flat`; False while listing."""
+        with _LISTING_LOCK:
+            if self._listing:
+                return False
+            current = self._children
+            # children found by `load_matching` are replaced by the full listing
+            children = dict(current) if self.loaded else {}
+            for name in node.dirs:
+                entry = current.get(name)
+                children[name] = (
+                    entry if isinstance(entry, Container) else Directory(name, self)
+                )
+            for name, info in node.files.items():
+                entry = current.get(name)
+                if isinstance(entry, Container) and self.loaded:
+                    continue
+                if not (
+                    isinstance(entry, File)
+                    and entry.generation
+                    and entry.generation == str(info.get("generation") or "")
+                ):
+                    entry = File.from_info(name, self, info)
+                children[name] = entry
+            self._children = children
+            if not self.loaded:
+                self._listed_at = listed_at
+                self._loaded = True
+                self._partial = False
+        return True
+
+    def _add_usage(self, size: int, count: int) -> None:
+        with _USAGE_LOCK:
+            before = self.usage
+            self._total_size += size
+            self._total_count += count
+            self._roll_up(before)
+
+    def _recount(self) -> None:
+        """Total the children again, e.g. after they were replaced or merged."""
+        with _USAGE_LOCK:
+            before = self.usage
+            size = count = 0
+            complete = self.loaded
+            for entry in self._children.values():
+                if isinstance(entry, File):
+                    size += entry.size
+                    count += 1
+                elif isinstance(entry, Container):
+                    child_size, child_count, child_complete = entry.usage
+                    size += child_size
+                    count += child_count
+                    complete = complete and child_complete
+            self._total_size, self._total_count = size, count
+            self._complete = complete
+            if complete:
+                self._measured = None
+            self._roll_up(before)
+
+    def _roll_up(self, before: Usage) -> None:
+        """Pass the change of `usage` since `before` on to the ancestors.
+
+        Only the path to the bucket is visited; siblings are recounted only
+        when a child becomes exact, which happens once per container.
+        """
+        entry: Container = self
+        while True:
+            after = entry.usage
+            parent = getattr(entry, "parent", None)
+            # containers built outside of a listing are not part of the totals
+            if (
+                after == before
+                or not isinstance(parent, Container)
+                or parent.get(entry.name) is not entry
+            ):
+                return
+            parent_before = parent.usage
+            parent._total_size += after[0] - before[0]
+            parent._total_count += after[1] - before[1]
+            if after[2] != before[2]:
+                parent._complete = (
+                    after[2]
+                    and parent.loaded
+                    and all(
+                        child.usage[2]
+                        for child in parent._children.values()
+                        if isinstance(child, Container)
+                    )
+                )
+                if parent._complete:
+                    parent._measured = None
+            entry, before = parent, parent_before
+
+    def _merge(self) -> None:
+        """Relist the children and merge the listing into the current ones.
+
+        Directories still listed keep their loaded subtrees and files whose
+        generation did not change keep their metadata. The current children stay
+        visible until the listing completes.
+        """
+        current = self._children
+        children: Dict[str, Entry] = {}
+        for dirnames, files in list_objects(self.path()):
+            for dirname in dirnames:
+                entry = current.get(dirname)
+                if not isinstance(entry, Directory):
+                    entry = Directory(dirname, self)
+                children[dirname] = entry
+            for name, info in files:
+                file = current.get(name)
+                if not isinstance(file, File):
+                    file = File.from_info(name, self, info)
+                elif not file.generation or file.generation != str(
+                    info.get("generation") or ""
+                ):
+                    file.update(info)
+                children[name] = file
+        children.pop("", None)
+        self._children = children
+        if self._store is not None:
+            for name, entry in current.items():
+                if isinstance(entry, Container) and children.get(name) is not entry:
+                    self._store.invalidate(entry.path())
+
+    def _list_pages(self) -> Iterator[List[Entry]]:
+        for dirnames, files in list_objects(self.path()):
+            page: List[Entry] = [Directory(dirname, self) for dirname in dirnames]
+            page.extend(File.from_info(name, self, info) for name, info in files)
+            yield page
+
+    def stat_children(self) -> None:
+        """Fill in metadata of children cached without it using a single listing."""
+        files = {
+            name: entry
+            for name, entry in self._children.items()
+            if isinstance(entry, File) and not entry.has_stat
+        }
+        if not files:
+            return
+        for _, infos in list_objects(self.path()):
+            for name, info in infos:
+                file = files.get(name)
+                if file is not None:
+                    file.update(info)
+        self._recount()
+        self._changed()
+
+    def _changed(self) -> None:
+        """Note that the children differ from what the caches on disk hold."""
+        if self._store is not None:
+            self._store.mark_dirty(self)
+        bucket = bucket_of(self)
+        if bucket is not None:
+            bucket._dirty = True
 
     def ls(self) -> List[str]:
-        return [entry.path() for entry in self._children.values()]
+        prefix = f"{self.path()}/"
+        return [prefix + name for name in self._children]
 
 
-class Bucket(Entry):
-    def __init__(self, name: str, root: Dict[str, Entry]) -> None:
-        super().__init__(name)
+class Directory(Container):
+    __slots__ = ("_parent", "_path", "_depth")
+    # both are derived from the parent and built again on first use
+    _transient = (*Container._transient, "_path", "_depth")
+    _defaults = {"_path": "", "_depth": -1}
+
+    def __init__(self, name: str, parent: Entry) -> None:
+        # directory names such as "checkpoints" repeat all over a bucket
+        super().__init__(sys.intern(name), getattr(parent, "store", None))
+        self._parent = parent
+        self._path = ""
+        self._depth = -1
+
+    @property
+    def parent(self) -> Entry:
+        return self._parent
+
+    @property
+    def depth(self) -> int:
+        if self._depth < 0:
+            self._depth = self._parent.depth + 1
+        return self._depth
+
+    def path(self) -> str:
+        # every child path starts with this one, so it is built only once
+        if not self._path:
+            self._path = f"{self._parent.path()}/{self._name}"
+        return self._path
+
+
+class _FlatListing:
+    """Names found below one directory by a flat listing, see `load_flat`."""
+
+    __slots__ = ("dirs", "files")
+
+    def __init__(self) -> None:
+        self.dirs: Dict[str, _FlatListing] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+
+def _graft(ours: Container, theirs: Container) -> None:
+    """Fill containers not loaded in `ours` with the loaded ones of `theirs`.
+
+    Where both trees have a container loaded, `ours` is kept as the newer one.
+    """
+    stack = [(ours, theirs)]
+    while stack:
+        mine, other = stack.pop()
+        for name, their_child in other.children.items():
+            child = mine.get(name)
+            if not (
+                isinstance(child, Container)
+                and isinstance(their_child, Container)
+                and their_child.loaded
+            ):
+                continue
+            if child.loaded:
+                stack.append((child, their_child))
+                continue
+            for grandchild in their_child.children.values():
+                grandchild._parent = child  # type: ignore[attr-defined]
+            child._children = dict(their_child.children)
+            child._listed_at = their_child.listed_at
+            child._loaded = True
+            child._recount()
+
+
+class Bucket(Container):
+    __slots__ = ("_root", "_cache_dir", "_dirty", "_disk_version", "_unloaded")
+    # the root holds every other bucket, which are saved on their own
+    _transient = (
+        *Container._transient,
+        "_root",
+        "_cache_dir",
+        "_dirty",
+        "_disk_version",
+        "_unloaded",
+    )
+    _defaults = {
+        "_cache_dir": None,
+        "_dirty": False,
+        "_disk_version": None,
+        "_unloaded": False,
+    }
+
+    def __init__(
+        self,
+        name: str,
+        root: Dict[str, Entry],
+        store: Optional[SQLiteTreeStore] = None,
+        cache_dir: Optional[Union[str, Path]] = None,
+    ) -> None:
+        """`cache_dir` holds the bucket saved by `save`, read on the first load."""
+        super().__init__(name, store)
         self._root = root
-        self._children: Dict[str, Entry] = {}
+        self._cache_dir = cache_dir
+        self._dirty = False
+        # the cache file as it was when read, to tell whether another session saved
+        self._disk_version: Optional[FileVersion] = None
+        # whether listings read from the cache file were unloaded since
+        self._unloaded = False
 
     @property
     def root(self) -> Dict[str, Entry]:
         return self._root
 
     @property
-    def children(self) -> Dict[str, Entry]:
-        return self._children
+    def cache_dir(self) -> Optional[Union[str, Path]]:
+        return self._cache_dir
+
+    @property
+    def dirty(self) -> bool:
+        """Whether anything was listed since the bucket was read or saved."""
+        return self._dirty
+
+    def _cached_listing(self) -> Optional[Tuple[List[Entry], float]]:
+        listing = super()._cached_listing()
+        if listing is not None or self._cache_dir is None:
+            return listing
+        cached = self._read_cache(os.path.join(self._cache_dir, self.name))
+        if cached is None:
+            return None
+        # the whole file is in memory again
+        self._unloaded = False
+        children = list(cached.children.values())
+        for child in children:
+            # deeper entries hang off these and keep pointing at them
+            child._parent = self  # type: ignore[attr-defined]
+        return children, cached.listed_at
+
+    def __setstate__(self, state: Any) -> None:
+        super().__setstate__(state)
+        # caches from older versions carry a stale copy of the root; the caller
+        # attaches the live one
+        self._root = {}
+
+    @property
+    def depth(self) -> int:
+        return 0
 
     def path(self) -> str:
         return f"gs://{self._name}"
 
-    def get(self, entry_name: str, default: Optional[Entry] = None) -> Optional[Entry]:
-        return self._children.get(entry_name, default)
+    def _read_cache(self, file_path: str) -> Optional[Bucket]:
+        from pgcs.file_system.serialize import load_tree
 
-    def add(self, entry: Entry) -> None:
-        if entry.name and entry.path().startswith(self.path()):
-            if entry.name not in self._children:
-                self._children[entry.name] = entry
+        version = file_version(file_path)
+        if version is None:
+            return None
+        with open(file_path, "rb") as f:
+            cached, legacy = load_tree(f)
+        self._disk_version = version
+        if cached is None or not cached.loaded:
+            return None
+        if legacy:
+            # raw pickles of older versions are written again in the flat format
+            self._dirty = True
+            if not cached._total_count:
+                # and the oldest of them have no totals
+                _recount_tree(cached)
+        return cached
 
-    def load(self, force: bool = False) -> None:
-        if force:
-            self._children = {}
-        if not self._children:
-            for _, dirnames, filenames in gfs.walk(self.path(), maxdepth=1):
-                for dirname in dirnames:
-                    if dirname:
-                        self.add(Directory(dirname, self))
-                for filename in filenames:
-                    if filename:
-                        self.add(File(filename, self))
+    def save(self, save_dir: Union[str, Path], force: bool = False) -> None:
+        """Write the bucket into `save_dir`, replacing the file atomically.
 
-    def ls(self) -> List[str]:
-        return [entry.path() for entry in self._children.values()]
+        The file is in the flat format of `pgcs.file_system.serialize`.
+        Sessions saving the same bucket take turns. If another one saved it
+        since it was read here, what that session listed and this one did not
+        is merged in first, see `_graft`. Directories unloaded to bound memory,
+        see `SubtreeLRU`, are written as the file had them.
+        """
+        from pgcs.file_system.serialize import dump_tree
 
-    def save(self, save_dir: str, force: bool = False) -> None:
         os.makedirs(save_dir, exist_ok=True)
         file_path = os.path.join(save_dir, self.name)
-        if force or not os.path.exists(file_path):
-            with open(file_path, "wb") as f:
-                pickle.dump(self, f)
+        with file_lock(file_path):
+            version = file_version(file_path)
+            if version is not None and not force:
+                return
+            theirs = None
+            if version is not None and (
+                version != self._disk_version or self._unloaded
+            ):
+                changed = version != self._disk_version
+                theirs = self._read_cache(file_path)
+                if theirs is not None and changed:
+                    _graft(self, theirs)
+            # listings arriving while pickling make the bucket dirty again
+            self._dirty = False
+            with atomic_write(file_path) as f:
+                dump_tree(self, f, fallback=theirs)
+            self._disk_version = file_version(file_path)
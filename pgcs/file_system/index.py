@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from pgcs.file_system.base import Entry
+from pgcs.file_system.entries import Bucket, Container, Directory, File, list_objects
+from pgcs.file_system.store import _descendant_range
+
+INDEX_FILE_NAME = "index.sqlite3"
+# bump whenever the tables change; older indexes are dropped and rebuilt
+INDEX_SCHEMA_VERSION = 1
+SEARCH_LIMIT = 1000
+GLOB_CHARS = "*?["
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY,
+    parent TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS objects_parent ON objects (parent);
+"""
+# a trigram index answers LIKE '%...%' without scanning every path; sqlite
+# builds without fts5 or the trigram tokenizer (< 3.34) fall back to a scan
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS paths USING fts5(
+    path, content='objects', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS objects_insert AFTER INSERT ON objects BEGIN
+    INSERT INTO paths (rowid, path) VALUES (new.id, new.path);
+END;
+CREATE TRIGGER IF NOT EXISTS objects_delete AFTER DELETE ON objects BEGIN
+    INSERT INTO paths (paths, rowid, path) VALUES ('delete', old.id, old.path);
+END;
+"""
+
+
+def is_glob(query: str) -> bool:
+    return any(c in GLOB_CHARS for c in query)
+
+
+def to_glob(query: str) -> str:
+    """Turn a search query into a GLOB pattern over full `gs://` paths.
+
+    Queries with glob characters match the end of a path from a "/" on, e.g.
+    "model_*.ckpt" or "train/*/model_final.ckpt", unless they start with "*"
+    or "gs://"; anything else matches as a substring.
+    """
+    if not is_glob(query):
+        return f"*{query}*"
+    if query.startswith(("*", "gs://")):
+        return query
+    return f"*/{query}"
+
+
+def glob_to_like(pattern: str) -> str:
+    """Loosen a GLOB pattern into a LIKE pattern matching a superset of it.
+
+    The LIKE pattern is what the trigram index can answer; the GLOB is then
+    checked on the few rows it returns.
+    """
+    like = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "*":
+            like.append("%")
+        elif c == "[":
+            # a character class matches one character, like "_"
+            like.append("_")
+            end = pattern.find("]", i + 2)
+            if end >= 0:
+                i = end
+        elif c in "?%_":
+            like.append("_")
+        else:
+            like.append(c)
+        i += 1
+    return "".join(like)
+
+
+class ObjectIndex:
+    """On-disk index of every known object path across buckets.
+
+    It is kept in sync with the containers listed while traversing and can be
+    rebuilt per bucket from a flat (recursive) listing. Searches match full
+    paths by substring or glob and only read the matching rows.
+    """
+
+    def __init__(self, db_path: Union[str, Path]) -> None:
+        os.makedirs(os.path.dirname(os.fspath(db_path)) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(os.fspath(db_path), check_same_thread=False)
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version != INDEX_SCHEMA_VERSION:
+            self._conn.executescript(
+                "DROP TRIGGER IF EXISTS objects_insert;"
+                "DROP TRIGGER IF EXISTS objects_delete;"
+                "DROP TABLE IF EXISTS paths; DROP TABLE IF EXISTS objects;"
+            )
+            self._conn.execute(f"PRAGMA user_version = {INDEX_SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self._table = "paths"
+        except sqlite3.OperationalError:
+            self._table = "objects"
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT count(*) FROM objects").fetchone()
+        return int(count)
+
+    def update(self, container: Container) -> None:
+        """Sync the files directly under a listed container.
+
+        Only the difference to what is indexed is written, so that re-indexing
+        an unchanged tree costs reads only.
+        """
+        parent = container.path()
+        files = {
+            entry.path()
+            for entry in container.children.values()
+            if isinstance(entry, File)
+        }
+        with self._lock, self._conn:
+            indexed: Set[str] = {
+                path
+                for (path,) in self._conn.execute(
+                    "SELECT path FROM objects WHERE parent = ?", (parent,)
+                )
+            }
+            self._conn.executemany(
+                "DELETE FROM objects WHERE path = ?",
+                ((path,) for path in indexed - files),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO objects (parent, path) VALUES (?, ?)",
+                ((parent, path) for path in files - indexed),
+            )
+
+    def update_tree(self, container: Container) -> None:
+        """Index every listed container below and including `container`.
+
+        Containers that were never listed are skipped rather than loaded.
+        """
+        if not container.loaded:
+            return
+        self.update(container)
+        for child in list(container.children.values()):
+            if isinstance(child, Container):
+                self.update_tree(child)
+
+    def refresh(self, bucket_path: str) -> int:
+        """Replace what is indexed for a bucket with a flat listing of it."""
+        low, high = _descendant_range(bucket_path)
+        count = 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM objects WHERE path >= ? AND path < ?", (low, high)
+            )
+            for _, files in list_objects(bucket_path, delimiter=None):
+                rows: List[Tuple[str, str]] = []
+                for name, _ in files:
+                    # zero byte "directory" placeholders are not objects to find
+                    if name and not name.endswith("/"):
+                        path = f"{bucket_path}/{name}"
+                        rows.append((path.rpartition("/")[0], path))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO objects (parent, path) VALUES (?, ?)", rows
+                )
+                count += len(rows)
+        return count
+
+    def search(
+        self, query: str, limit: int = SEARCH_LIMIT, ignore_case: bool = True
+    ) -> List[str]:
+        if not query:
+            return []
+        pattern = to_glob(query)
+        target = "path"
+        if ignore_case:
+            pattern = pattern.lower()
+            target = "lower(path)"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path FROM {self._table} "
+                f"WHERE path LIKE ? AND {target} GLOB ? ORDER BY path LIMIT ?",
+                (glob_to_like(pattern), pattern, limit),
+            ).fetchall()
+        # ordered before the limit, so a truncated result is the first paths
+        return [path for (path,) in rows]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def find_bucket(root: Dict[str, Entry], name: str) -> Optional[Bucket]:
+    # the root may be refreshed from another thread meanwhile
+    for bucket in list(root.values()):
+        if isinstance(bucket, Bucket) and bucket.name == name:
+            return bucket
+    return None
+
+
+def resolve(root: Dict[str, Entry], path: str) -> File:
+    """Build a `File` for an indexed path on top of the cached tree.
+
+    Cached entries are reused along the way and missing ones are created
+    without being added to their parents, so nothing is listed and the tree is
+    left untouched.
+    """
+    bucket_name, _, key = path[len("gs://") :].partition("/")
+    parent: Entry = find_bucket(root, bucket_name) or Bucket(bucket_name, root)
+    *dirnames, filename = key.split("/")
+    for dirname in dirnames:
+        child = parent.get(dirname) if isinstance(parent, Container) else None
+        parent = child if isinstance(child, Directory) else Directory(dirname, parent)
+    cached = parent.get(filename) if isinstance(parent, Container) else None
+    return cached if isinstance(cached, File) else File(filename, parent)
+
+
+def locate(root: Dict[str, Entry], path: str) -> Optional[Container]:
+    """Return the deepest container of the tree on the way to `path`.
+
+    Containers along the way are listed as needed, from the tree store when
+    there is one; a stale path stops at the last container that still exists.
+    """
+    bucket_name, _, key = path[len("gs://") :].partition("/")
+    container: Optional[Container] = find_bucket(root, bucket_name)
+    if container is None:
+        return None
+    for dirname in key.split("/")[:-1]:
+        if not container.loaded:
+            container.load()
+        child = container.get(dirname)
+        if not isinstance(child, Directory):
+            break
+        container = child
+    return container
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from pgcs.file_system.entries import Container
+
+
+class SubtreeLRU:
+    """Keeps the loaded tree under `budget` entries by unloading cold subtrees.
+
+    Loaded containers are tracked in the order they were last visited or
+    listed. Once the children of all of them add up to more than `budget`, the
+    least recently used ones are unloaded, except for the visited container and
+    its ancestors. What an unloaded container held is kept on disk where there
+    is a cache for it. The tree store reads it back on the next `load`. The
+    cache file of a bucket keeps it for the next session, see `Bucket.save`,
+    but only reads back whole buckets, so unloaded directories are listed
+    again when revisited.
+    """
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_nodes = 0
+        self._sizes: OrderedDict[int, int] = OrderedDict()
+        self._containers: Dict[int, Container] = {}
+        self._nodes = 0
+        self._focus = ""
+        # containers are listed, and so admitted, from worker threads
+        self._lock = threading.RLock()
+
+    @property
+    def nodes(self) -> int:
+        """Entries held by the tracked containers."""
+        return self._nodes
+
+    def stats(self) -> str:
+        visits = self.hits + self.misses
+        hit_rate = f"{self.hits / visits:.0%}" if visits else "-"
+        return (
+            f"{self._nodes} entries in memory, {hit_rate} of {visits} visits cached, "
+            f"{self.evictions} subtrees ({self.evicted_nodes} entries) evicted"
+        )
+
+    def touch(self, container: Container) -> None:
+        """Record a visit, which protects `container` and its ancestors."""
+        with self._lock:
+            self._focus = container.path()
+            if container.loaded:
+                self.hits += 1
+                if id(container) in self._sizes:
+                    self._sizes.move_to_end(id(container))
+            else:
+                self.misses += 1
+
+    def admit(self, container: Container) -> None:
+        """Track a container that was just loaded, then evict down to the budget."""
+        if not _attached(container):
+            # e.g. listed by a prefetch after an ancestor was evicted
+            return
+        with self._lock:
+            for entry in _loaded_subtree(container, self._sizes):
+                self._track(entry)
+            # what was just listed is not thrown away before it is seen
+            self._evict(container.path())
+
+    def _track(self, container: Container) -> None:
+        key = id(container)
+        self._nodes += len(container.children) - self._sizes.pop(key, 0)
+        self._sizes[key] = len(container.children)
+        self._containers[key] = container
+
+    def _forget(self, container: Container) -> int:
+        key = id(container)
+        self._containers.pop(key, None)
+        size = self._sizes.pop(key, 0)
+        self._nodes -= size
+        return size
+
+    def _evict(self, admitted: str) -> None:
+        if self.budget <= 0:
+            return
+        for key in list(self._sizes):
+            if self._nodes <= self.budget:
+                return
+            container = self._containers.get(key)
+            if container is None:
+                continue
+            path = container.path()
+            if _on_path(path, self._focus) or _on_path(path, admitted):
+                continue
+            self._unload(container)
+
+    def _unload(self, container: Container) -> None:
+        from pgcs.file_system.entries import bucket_of
+
+        subtree = _loaded_subtree(container, {})
+        bucket = bucket_of(container)
+        if container.store is not None:
+            container.store.flush()
+        elif bucket is not None and bucket.cache_dir is not None and bucket.dirty:
+            # the file keeps what is unloaded when the bucket is saved again
+            bucket.save(bucket.cache_dir, force=True)
+        if not container.unload():
+            return
+        freed = sum(self._forget(entry) for entry in subtree)
+        self.evictions += 1
+        self.evicted_nodes += freed
+
+
+def _loaded_subtree(container: Container, skip: Dict[int, int]) -> List[Container]:
+    """Loaded containers from `container` down, not descending into `skip`."""
+    from pgcs.file_system.entries import Container
+
+    found: List[Container] = []
+    stack = [container]
+    while stack:
+        entry = stack.pop()
+        found.append(entry)
+        for child in list(entry.children.values()):
+            if isinstance(child, Container) and child.loaded and id(child) not in skip:
+                stack.append(child)
+    return found
+
+
+def _on_path(path: str, to: str) -> bool:
+    """Whether `path` is `to` or one of its ancestors."""
+    return to == path or to.startswith(f"{path}/")
+
+
+def _attached(container: Container) -> bool:
+    """Whether `container` can still be reached from its bucket."""
+    entry = container
+    while True:
+        parent = getattr(entry, "parent", None)
+        if parent is None:
+            return True
+        if parent.get(entry.name) is not entry:
+            return False
+        entry = parent
+
+
+_lru: Optional[SubtreeLRU] = None
+
+
+def get_lru() -> Optional[SubtreeLRU]:
+    """The LRU of the browsing session, None where the tree is not bounded."""
+    return _lru
+
+
+def set_lru(lru: Optional[SubtreeLRU]) -> None:
+    global _lru
+    _lru = lru
@@ -0,0 +1,193 @@
+"""Flat, versioned format of the bucket caches.
+
+A bucket is saved as one tuple of plain values: a header with the format
+version and the bucket's own fields, then its directories and files as
+columns. Directories are numbered breadth first, the bucket being 0, and every
+row points at its parent by number, so the tree is rebuilt in one pass without
+recursion. Only builtin types are stored and the unpickler refuses every class
+but the entries of caches written before this format, which are migrated.
+"""
+
+from __future__ import annotations
+
+import pickle
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from pgcs.file_system.base import Entry
+from pgcs.file_system.entries import Bucket, Container, Directory, File
+
+MAGIC = "pgcs-tree"
+# bump whenever the columns change; caches of other versions are listed again
+FORMAT_VERSION = 1
+# the classes raw pickles of older versions are made of
+_LEGACY_CLASSES = {
+    ("pgcs.file_system.entries", "Bucket"): Bucket,
+    ("pgcs.file_system.entries", "Directory"): Directory,
+    ("pgcs.file_system.entries", "File"): File,
+}
+
+_DIR_COLUMNS = (
+    "parent",
+    "name",
+    "loaded",
+    "listed_at",
+    "total_size",
+    "total_count",
+    "complete",
+    "measured_size",
+    "measured_count",
+)
+_FILE_COLUMNS = (
+    "parent",
+    "name",
+    "created_at",
+    "updated_at",
+    "size",
+    "generation",
+    "content_type",
+)
+
+
+class _Unpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str) -> Any:
+        cls = _LEGACY_CLASSES.get((module, name))
+        if cls is None:
+            raise pickle.UnpicklingError(f"{module}.{name} is not a cache entry")
+        return cls
+
+
+def _container_state(container: Container) -> Tuple[Any, ...]:
+    measured = container._measured or (-1, -1)
+    return (
+        container.loaded,
+        container.listed_at,
+        container._total_size,
+        container._total_count,
+        container._complete,
+        *measured,
+    )
+
+
+def _restore(container: Container, state: Tuple[Any, ...]) -> None:
+    (
+        container._loaded,
+        container._listed_at,
+        container._total_size,
+        container._total_count,
+        container._complete,
+        measured_size,
+        measured_count,
+    ) = state
+    if measured_size >= 0:
+        container._measured = (measured_size, measured_count)
+
+
+def _written(
+    ours: Container, theirs: Optional[Entry]
+) -> Tuple[Container, Optional[Container]]:
+    """The container to write for `ours` and its counterpart to fall back on."""
+    if not isinstance(theirs, Container):
+        return ours, None
+    if ours.loaded or not theirs.loaded:
+        return ours, theirs
+    return theirs, None
+
+
+def dump_tree(bucket: Bucket, f: IO[bytes], fallback: Optional[Bucket] = None) -> None:
+    """Write `bucket` and everything loaded below it to `f`.
+
+    Containers not loaded in `bucket` but loaded in `fallback`, i.e. the tree
+    last read from `f`, are written as `fallback` has them.
+    """
+    dirs: Dict[str, List[Any]] = {column: [] for column in _DIR_COLUMNS}
+    files: Dict[str, List[Any]] = {column: [] for column in _FILE_COLUMNS}
+    # a handful of content types is shared by millions of objects
+    content_types: Dict[str, int] = {}
+    root, root_fallback = _written(bucket, fallback)
+    containers: List[Container] = [root]
+    fallbacks: List[Optional[Container]] = [root_fallback]
+    i = 0
+    while i < len(containers):
+        container, theirs = containers[i], fallbacks[i]
+        # children still streaming in, or found by `load_matching` alone, are
+        # listed again next time
+        children = container.children if container.loaded else {}
+        # children dicts are replaced, not changed, while pages arrive
+        for child in list(children.values()):
+            if isinstance(child, File):
+                row = (
+                    i,
+                    child.name,
+                    child.created_at,
+                    child.updated_at,
+                    child.size,
+                    child._generation,
+                    content_types.setdefault(child.content_type, len(content_types)),
+                )
+                for column, value in zip(_FILE_COLUMNS, row):
+                    files[column].append(value)
+            elif isinstance(child, Directory):
+                counterpart = None if theirs is None else theirs.get(child.name)
+                written, below = _written(child, counterpart)
+                containers.append(written)
+                fallbacks.append(below)
+                row = (i, child.name, *_container_state(written))
+                for column, value in zip(_DIR_COLUMNS, row):
+                    dirs[column].append(value)
+        i += 1
+    header = (MAGIC, FORMAT_VERSION, bucket.name, _container_state(root))
+    state = (
+        header,
+        tuple(dirs[column] for column in _DIR_COLUMNS),
+        tuple(files[column] for column in _FILE_COLUMNS),
+        list(content_types),
+    )
+    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_tree(f: IO[bytes]) -> Tuple[Optional[Bucket], bool]:
+    """Read a bucket saved by `dump_tree`, detached from any root.
+
+    Returns the bucket, None if the cache is unreadable or of another format
+    version, and whether it came from a raw pickle of an older version and so
+    is worth saving again.
+    """
+    try:
+        state = _Unpickler(f).load()
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None, False
+    if isinstance(state, Bucket):
+        return state, True
+    try:
+        (magic, version, name, bucket_state), dirs, files, content_types = state
+    except (TypeError, ValueError):
+        return None, False
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None, False
+    bucket = Bucket(name, {})
+    _restore(bucket, bucket_state)
+    containers: List[Container] = [bucket]
+    children: List[Dict[str, Entry]] = [{}]
+    for parent, dirname, *container_state in zip(*dirs):
+        directory = Directory(dirname, containers[parent])
+        _restore(directory, tuple(container_state))
+        children[parent][directory.name] = directory
+        containers.append(directory)
+        children.append({})
+    for parent, filename, created_at, updated_at, size, generation, type_id in zip(
+        *files
+    ):
+        file = File(
+            filename,
+            containers[parent],
+            created_at,
+            updated_at,
+            size,
+            "",
+            content_types[type_id],
+        )
+        file._generation = generation
+        children[parent][filename] = file
+    for container, entries in zip(containers, children):
+        container._children = entries
+    return bucket, False
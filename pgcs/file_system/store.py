@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from pgcs.file_system.base import Entry
+from pgcs.file_system.entries import Container, Directory, File
+
+SQLITE_FILE_NAME = "tree.sqlite3"
+# bump whenever the tables change; older stores are dropped since they are a cache
+SCHEMA_VERSION = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    path TEXT PRIMARY KEY,
+    listed_at REAL NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 1
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    created_at TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL DEFAULT 0,
+    generation TEXT NOT NULL DEFAULT '',
+    content_type TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (parent, name)
+) WITHOUT ROWID;
+"""
+
+Row = Tuple[str, int, str, str, int, str, str]
+
+
+def _descendant_range(path: str) -> Tuple[str, str]:
+    # every descendant path sorts in [path + "/", path + "0") since "0" follows "/"
+    return (f"{path}/", f"{path}0")
+
+
+class SQLiteTreeStore:
+    """On-disk cache of directory listings keyed by the listed path.
+
+    Listings are read one directory at a time when a `Container` is loaded, and
+    only the containers listed from GCS during the session are written back.
+    Partial containers, see `Container.load_matching`, are written as such and
+    never read back as a listing.
+    """
+
+    def __init__(self, db_path: Union[str, Path]) -> None:
+        os.makedirs(os.path.dirname(os.fspath(db_path)) or ".", exist_ok=True)
+        # listings are also read and marked dirty from prefetch worker threads
+        self._conn = sqlite3.connect(os.fspath(db_path), check_same_thread=False)
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            self._conn.executescript(
+                "DROP TABLE IF EXISTS listings; DROP TABLE IF EXISTS entries;"
+            )
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._dirty: Dict[str, Container] = {}
+
+    def children(self, container: Container) -> Optional[Tuple[List[Entry], float]]:
+        """Return the cached children of `container` and when they were listed."""
+        path = container.path()
+        with self._lock:
+            listing = self._conn.execute(
+                "SELECT listed_at FROM listings WHERE path = ? AND complete", (path,)
+            ).fetchone()
+            if listing is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT name, is_dir, created_at, updated_at, size, generation, "
+                "content_type FROM entries WHERE parent = ?",
+                (path,),
+            ).fetchall()
+        entries: List[Entry] = [
+            Directory(name, container) if is_dir else File(name, container, *metadata)
+            for name, is_dir, *metadata in rows
+        ]
+        return entries, listing[0]
+
+    def mark_dirty(self, container: Container) -> None:
+        with self._lock:
+            self._dirty[container.path()] = container
+
+    def invalidate(self, path: str) -> None:
+        low, high = _descendant_range(path)
+        with self._lock:
+            self._dirty.pop(path, None)
+            self._conn.execute(
+                "DELETE FROM listings WHERE path = ? OR (path >= ? AND path < ?)",
+                (path, low, high),
+            )
+            self._conn.execute(
+                "DELETE FROM entries WHERE parent = ? OR (parent >= ? AND parent < ?)",
+                (path, low, high),
+            )
+
+    def flush(self) -> None:
+        with self._lock, self._conn:
+            for path, container in self._dirty.items():
+                self._conn.execute("DELETE FROM entries WHERE parent = ?", (path,))
+                self._conn.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((path, *row) for row in _rows(container)),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO listings VALUES (?, ?, ?)",
+                    (path, container.listed_at, container.loaded),
+                )
+            self._dirty = {}
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+
+def _rows(container: Container) -> List[Row]:
+    rows: List[Row] = []
+    for entry in container.children.values():
+        if isinstance(entry, File):
+            rows.append(
+                (
+                    entry.name,
+                    0,
+                    entry.created_at,
+                    entry.updated_at,
+                    entry.size,
+                    entry.generation,
+                    entry.content_type,
+                )
+            )
+        else:
+            rows.append((entry.name, 1, "", "", 0, "", ""))
+    return rows
@@ -1,51 +1,319 @@
 import argparse
 import os
-import pickle
-from typing import Dict
+import sys
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
 
-import gcsfs
-
-from pgcs.custom_select import traverse_gcs
-from pgcs.file_system.base import Entry
-from pgcs.file_system.entries import Bucket
 from pgcs.preferences import PREF_FILE_PATH, GCSPref
 
-gfs = gcsfs.GCSFileSystem()
+if TYPE_CHECKING:
+    from pgcs.file_system.base import Entry
+    from pgcs.file_system.index import ObjectIndex
+    from pgcs.file_system.store import SQLiteTreeStore
+
+# bucket names of the last listing, shown right away on the next start; bucket
+# names never start with "." so this cannot collide with a saved bucket
+BUCKETS_FILE_NAME = ".buckets"
+
+
+def read_bucket_names(cache_dir: Path) -> List[str]:
+    try:
+        return (cache_dir / BUCKETS_FILE_NAME).read_text().split()
+    except OSError:
+        return []
+
+
+def list_bucket_names(cache_dir: Path) -> List[str]:
+    from pgcs.file_system.atomic import atomic_write
+    from pgcs.file_system.backend import get_backend
+
+    names = [bucket.rstrip("/") for bucket in get_backend().buckets()]
+    os.makedirs(cache_dir, exist_ok=True)
+    with atomic_write(cache_dir / BUCKETS_FILE_NAME) as f:
+        f.write("\n".join(names).encode())
+    return names
+
+
+def sync_buckets(
+    root: Dict[str, "Entry"], make_bucket: Callable[[str], "Entry"], names: List[str]
+) -> None:
+    """Make `root` hold the buckets in `names`, keeping the ones it has.
+
+    `root` is changed in place one key at a time so that the UI can keep
+    showing it while the bucket list is refreshed in the background.
+    """
+    for name in names:
+        if name not in root:
+            root[name] = make_bucket(name)
+    for name in set(root) - set(names):
+        root.pop(name, None)
+
+
+def shutdown_background_work() -> None:
+    from pgcs.custom_select import (
+        download_manager,
+        flat_listing_stop,
+        io_executor,
+        prefetcher,
+        preview_loader,
+    )
+
+    prefetcher.shutdown()
+    # a measurement may be a flat listing of a whole bucket
+    preview_loader.close()
+    flat_listing_stop.set()
+    io_executor.shutdown(wait=True)
+    if download_manager.active:
+        print("waiting for downloads to finish, ctrl-c to resume them later")
+    try:
+        download_manager.wait()
+    except KeyboardInterrupt:
+        download_manager.cancel()
+    for error in download_manager.errors:
+        print(f"download failed: {error}")
+
+
+def update_index(index: "ObjectIndex", root: Dict[str, "Entry"]) -> None:
+    from pgcs.file_system.entries import Bucket
+
+    for bucket in root.values():
+        if isinstance(bucket, Bucket):
+            index.update_tree(bucket)
+
+
+def open_tree(
+    pref: GCSPref,
+) -> Tuple[Dict[str, "Entry"], Optional["SQLiteTreeStore"], Callable[[], None]]:
+    """Connect to GCS and build the root from the bucket names of the last listing.
+
+    The returned callable lists the buckets again and updates the root in place.
+    """
+    from pgcs.file_system.backend import GCSBackend, set_backend
+    from pgcs.file_system.entries import Bucket
+    from pgcs.file_system.store import SQLITE_FILE_NAME, SQLiteTreeStore
+
+    set_backend(GCSBackend(pref.gcs_concurrency))
+    store = None
+    if pref.cache_backend == "sqlite":
+        store = SQLiteTreeStore(pref.cache_dir / SQLITE_FILE_NAME)
+    root: Dict[str, Entry] = {}
+
+    def make_bucket(name: str) -> Bucket:
+        # cache files are read when their bucket is first opened
+        cache_dir = pref.cache_dir if store is None else None
+        return Bucket(name, root, store=store, cache_dir=cache_dir)
+
+    def refresh_buckets() -> None:
+        sync_buckets(root, make_bucket, list_bucket_names(pref.cache_dir))
+
+    sync_buckets(root, make_bucket, read_bucket_names(pref.cache_dir))
+    return root, store, refresh_buckets
+
+
+def save_tree(
+    pref: GCSPref,
+    root: Dict[str, "Entry"],
+    store: Optional["SQLiteTreeStore"],
+    index: Optional["ObjectIndex"] = None,
+) -> None:
+    """Index what was listed, save what changed and close the caches."""
+    from pgcs.file_system.index import INDEX_FILE_NAME, ObjectIndex
+
+    if index is None:
+        index = ObjectIndex(pref.cache_dir / INDEX_FILE_NAME)
+    update_index(index, root)
+    index.close()
+    flush_tree(pref, root, store)
+    if store is not None:
+        store.close()
+
+
+def flush_tree(
+    pref: GCSPref, root: Dict[str, "Entry"], store: Optional["SQLiteTreeStore"]
+) -> None:
+    """Write what was listed since the last flush to the on-disk cache."""
+    from pgcs.file_system.entries import Bucket
+    from pgcs.profiling import profiler
+
+    with profiler.timer("cache.save"):
+        if store is not None:
+            store.flush()
+            return
+        for entry in list(root.values()):
+            # buckets that were only read keep their cache file as it is
+            if isinstance(entry, Bucket) and entry.loaded and entry.dirty:
+                entry.save(pref.cache_dir, force=True)
+
+
+def flush_periodically(interval: float, flush: Callable[[], None]) -> threading.Event:
+    """Call `flush` every `interval` seconds until the returned event is set.
+
+    A crash then loses at most `interval` seconds of listings.
+    """
+    stop = threading.Event()
+
+    def run() -> None:
+        while not stop.wait(interval):
+            try:
+                flush()
+            except (OSError, RuntimeError):
+                # e.g. a listing resized a dict being saved; the next one retries
+                pass
+
+    if interval > 0:
+        threading.Thread(target=run, name="pgcs-flush", daemon=True).start()
+    return stop
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the latency histogram of GCS requests and local work at exit",
+    )
     subparsers = parser.add_subparsers(dest="cmd")
     parser_traverse = subparsers.add_parser(
         "traverse", help="default positional argument `pg` == `pg traverse`"
     )
+    parser_search = subparsers.add_parser(
+        "search", help="search object paths of every bucket in the local index"
+    )
+    parser_search.add_argument(
+        "query", nargs="?", help="substring or glob; opens the search UI if omitted"
+    )
+    parser_search.add_argument(
+        "--refresh",
+        nargs="*",
+        metavar="BUCKET",
+        help="rebuild the index of the buckets (all if none) from a flat listing",
+    )
+    parser_search.add_argument("--limit", type=int)
+    parser_ls = subparsers.add_parser(
+        "ls", help="print the children of paths (the buckets if none)"
+    )
+    parser_ls.add_argument("paths", nargs="*", metavar="PATH")
+    parser_ls.add_argument("-r", "--recursive", action="store_true")
+    parser_find = subparsers.add_parser(
+        "find", help="print paths below PATHs (every bucket if none) matching a regex"
+    )
+    parser_find.add_argument("pattern")
+    parser_find.add_argument("paths", nargs="*", metavar="PATH")
+    parser_du = subparsers.add_parser(
+        "du", help="print bytes, object count and path of PATHs (every bucket if none)"
+    )
+    parser_du.add_argument("paths", nargs="*", metavar="PATH")
+    parser_du.add_argument("-H", "--human", action="store_true")
+    for batch_parser in (parser_ls, parser_find, parser_du):
+        batch_parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="list again what is answered from the cache otherwise",
+        )
+        batch_parser.add_argument(
+            "-j", "--jobs", type=int, help="directories listed at once"
+        )
     parser_pref = subparsers.add_parser("pref", help="set pref")
     parser_pref.add_argument("--init", action="store_true")
     parser_pref.add_argument("key", nargs="?")
     parser_pref.add_argument("value", nargs="?")
     parser.set_defaults(cmd="traverse")
     args = parser.parse_args()
+    # without a query or a refresh `pg search` is a session opened on the search UI
+    start_search = args.cmd == "search" and not args.query and args.refresh is None
+    if start_search:
+        args.cmd = "traverse"
+
+    if args.profile:
+        import atexit
+
+        from pgcs.profiling import profiler
+
+        # printed after `sys.exit` of the batch commands too
+        atexit.register(lambda: print(profiler.report(), file=sys.stderr))
 
     pref = GCSPref.read() if PREF_FILE_PATH.exists() else GCSPref()
     if args.cmd == "traverse":
-        root: Dict[str, Entry] = {}
-        for bucket in gfs.buckets:
-            if os.path.exists(pref.cache_dir / bucket.rstrip("/")):
-                with open(pref.cache_dir / bucket.rstrip("/"), "rb") as f:
-                    root[bucket] = pickle.load(f)
-            else:
-                root[bucket] = Bucket(bucket.rstrip("/"), root)
-        traverse_gcs(root)
-        for bucket in root.values():
-            bucket.save(pref.cache_dir, force=True)
+        # GCS, the UI and the caches are imported by the commands that use them
+        from pgcs.custom_select import io_executor, traverse_gcs
+        from pgcs.file_system.index import INDEX_FILE_NAME, ObjectIndex
+        from pgcs.file_system.lru import SubtreeLRU, set_lru
+
+        root, store, refresh_buckets = open_tree(pref)
+        lru = SubtreeLRU(pref.cache_node_budget)
+        set_lru(lru)
+        if root:
+            io_executor.submit(refresh_buckets)
+        else:
+            refresh_buckets()
+        index = ObjectIndex(pref.cache_dir / INDEX_FILE_NAME)
+        stop_flushing = flush_periodically(
+            pref.cache_flush_interval, lambda: flush_tree(pref, root, store)
+        )
+        traverse_gcs(root, index=index, search=start_search)  # type: ignore
+        stop_flushing.set()
+        shutdown_background_work()
+        set_lru(None)
+        if lru.evictions:
+            print(f"cache: {lru.stats()}", file=sys.stderr)
+        save_tree(pref, root, store, index)
+
+    elif args.cmd in ("ls", "find", "du"):
+        from pgcs import batch
+
+        root, store, refresh_buckets = open_tree(pref)
+        if args.refresh or not root:
+            refresh_buckets()
+        exit_code = 0
+        options = dict(refresh=args.refresh, jobs=args.jobs or batch.WALK_CONCURRENCY)
+        lines: Iterator[str]
+        if args.cmd == "ls":
+            lines = batch.ls(root, args.paths, args.recursive, **options)
+        elif args.cmd == "find":
+            lines = batch.find(
+                root, args.pattern, args.paths, pref.ignore_case, **options
+            )
+        else:
+            lines = batch.du(root, args.paths, args.human, **options)
+        try:
+            for line in lines:
+                print(line)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # e.g. `pg find ... | head`; what was listed is still cached
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        except FileNotFoundError as e:
+            print(f"pg {args.cmd}: {e}: no such path", file=sys.stderr)
+            exit_code = 1
+        save_tree(pref, root, store)
+        sys.exit(exit_code)
+
+    elif args.cmd == "search":
+        from pgcs.file_system.backend import GCSBackend, set_backend
+        from pgcs.file_system.index import INDEX_FILE_NAME, SEARCH_LIMIT, ObjectIndex
+
+        set_backend(GCSBackend(pref.gcs_concurrency))
+        index = ObjectIndex(pref.cache_dir / INDEX_FILE_NAME)
+        if args.refresh is not None:
+            for bucket in args.refresh or list_bucket_names(pref.cache_dir):
+                bucket = bucket.rstrip("/")
+                count = index.refresh(f"gs://{bucket}")
+                print(f"indexed {count} objects in gs://{bucket}", file=sys.stderr)
+        if args.query:
+            limit = args.limit or SEARCH_LIMIT
+            for path in index.search(args.query, limit, pref.ignore_case):
+                print(path)
+        index.close()
 
     elif args.cmd == "pref":
         if args.init:
             new_pref = GCSPref()
         elif args.key and args.value:
-            if args.value in ("True", "False"):
-                args.value = bool(args.value)
-            new_pref = pref.model_copy(update={args.key: args.value})
+            # validated from the string as typed, e.g. "False" or "8"
+            new_pref = GCSPref.model_validate(
+                {**pref.model_dump(), args.key: args.value}
+            )
         else:
             raise ValueError
         new_pref.write()
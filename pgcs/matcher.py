@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Iterable, List, Literal, Match, Optional, Pattern, Tuple
+
+MatchMode = Literal["regex", "fuzzy"]
+
+# results kept per query so that deleting characters does not rescan everything
+RESULT_CACHE_SIZE = 16
+# fuzzy results larger than this keep listing order; ranking them costs more than
+# a keystroke is worth and the top of such a list is not meaningful anyway
+RANK_LIMIT = 50_000
+BOUNDARY_CHARS = "/_-. "
+REGEX_META_CHARS = "\\.^$*+?{}[]|()"
+# characters with a meaning in the globs of the GCS list API
+GLOB_CHARS = "*?[]{}\\"
+
+
+@lru_cache(maxsize=256)
+def compile_query(query: str, mode: MatchMode, ignore_case: bool) -> Pattern[str]:
+    if mode == "fuzzy":
+        # fuzzy queries run against case folded names, see `Matcher`
+        # "abc" -> "a[^b]*b[^c]*c": each char matches at its earliest position
+        parts = [re.escape(query[0])]
+        for c in query[1:]:
+            parts.append(f"[^{re.escape(c)}]*{re.escape(c)}")
+        return re.compile("".join(parts))
+    flags = re.I if ignore_case else 0
+    try:
+        return re.compile(query, flags)
+    except re.error:
+        # half-typed patterns such as "[a" are searched for literally
+        return re.compile(re.escape(query), flags)
+
+
+def is_literal(query: str) -> bool:
+    return not any(c in REGEX_META_CHARS for c in query)
+
+
+def _regex_literal(regex: str) -> Optional[str]:
+    """The text matched by a regex without metacharacters but "." and escapes.
+
+    "." is read as itself, so every name starting with the text matches the
+    regex. Escapes of letters and digits, e.g. "\\d", are not literals.
+    """
+    chars = []
+    i = 0
+    while i < len(regex):
+        c = regex[i]
+        if c == "\\":
+            if i + 1 == len(regex) or regex[i + 1].isalnum():
+                return None
+            i += 1
+            c = regex[i]
+        elif c in REGEX_META_CHARS and c != ".":
+            return None
+        chars.append(c)
+        i += 1
+    return "".join(chars)
+
+
+def listing_filter(query: str, mode: MatchMode) -> Optional[Tuple[str, Optional[str]]]:
+    """Name prefix and glob of a listing that finds names matching `query`.
+
+    They let GCS look for the matches of a query in a listing that has not
+    reached them yet. A literal query, or a literal anchored with "^", lists
+    the names starting with it, directories included. Literals joined by ".*",
+    and fuzzy queries, whose characters match in order, become a glob over the
+    files. What is found matches the query but not every match is found, e.g.
+    names in another case. None when the query cannot be put so.
+    """
+    if mode == "fuzzy":
+        if not query or any(c in GLOB_CHARS or c == "/" for c in query):
+            return None
+        return "", "*" + "*".join(query) + "*"
+    anchored = query.startswith("^")
+    ends = query.endswith("$") and not query.endswith("\\$")
+    literals = [
+        _regex_literal(part) for part in query[anchored : len(query) - ends].split(".*")
+    ]
+    parts = [part for part in literals if part is not None]
+    if len(parts) < len(literals) or any("/" in part for part in parts):
+        return None
+    if len(parts) == 1 and not ends:
+        return (parts[0], None) if parts[0] else None
+    pieces = [part for part in parts if part]
+    if not pieces or any(c in GLOB_CHARS for piece in pieces for c in piece):
+        return None
+    glob = "*".join(pieces)
+    if not (anchored and parts[0]):
+        glob = f"*{glob}"
+    if not (ends and parts[-1]):
+        glob = f"{glob}*"
+    return (parts[0] if anchored else ""), glob
+
+
+def is_subsequence(short: str, long: str) -> bool:
+    chars = iter(long)
+    return all(c in chars for c in short)
+
+
+class Matcher:
+    """Filters candidate names for the QUERY> prompt.
+
+    Results are kept as indices into the candidate list. When a query extends
+    the previous one in a way that can only remove matches (a literal that
+    contains the previous literal, or any extension in fuzzy mode) only the
+    previous result is rescanned. Literal and fuzzy queries run against names
+    case folded once up front, so that the hot loop is plain substring or
+    case sensitive regex matching. In fuzzy mode results are ranked fzf-style:
+    shortest match span first, then matches starting at a word boundary, then
+    earlier and shorter names.
+    """
+
+    def __init__(
+        self, items: Iterable[str], mode: MatchMode = "regex", ignore_case: bool = True
+    ) -> None:
+        self._mode = mode
+        self._ignore_case = ignore_case
+        self._results: OrderedDict[str, List[int]] = OrderedDict()
+        self._items: List[str] = []
+        self._folded: List[str] = []
+        self._last: Optional[str] = None
+        self._last_names: List[str] = []
+        self.set_items(items)
+
+    @property
+    def items(self) -> List[str]:
+        return self._items
+
+    def set_items(self, items: Iterable[str]) -> None:
+        items = list(items)
+        n = len(self._items)
+        if n and len(items) >= n and items[:n] == self._items:
+            self._extend(items[n:])
+            return
+        self._items = items
+        self._folded = [item.lower() for item in items] if self._ignore_case else items
+        self._results.clear()
+        self._last = None
+
+    def _extend(self, items: List[str]) -> None:
+        """Append names, e.g. the next page of a streaming listing.
+
+        Only the current query's result is kept; it is brought up to date by
+        filtering just the appended names.
+        """
+        start = len(self._items)
+        self._items.extend(items)
+        if self._ignore_case:
+            self._folded.extend(item.lower() for item in items)
+        last = self._last
+        kept = self._results.get(last) if last is not None else None
+        self._results.clear()
+        if last is None or kept is None:
+            self._last = None
+            return
+        new = range(start, len(self._items))
+        result = kept + self._filter(last, new)
+        if self._mode == "fuzzy":
+            result = self._filter(last, result)
+        self._results[last] = result
+        self._last_names = [self._items[i] for i in result]
+
+    def match(self, query: str) -> List[str]:
+        if not query:
+            return self._items
+        if query == self._last:
+            return self._last_names
+        result = self._results.get(query)
+        if result is None:
+            result = self._filter(query, self._base(query))
+            self._results[query] = result
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        else:
+            self._results.move_to_end(query)
+        items = self._items
+        self._last = query
+        self._last_names = [items[i] for i in result]
+        return self._last_names
+
+    def _fold(self, query: str) -> str:
+        return query.lower() if self._ignore_case else query
+
+    def _base(self, query: str) -> Iterable[int]:
+        last = self._last
+        if last is not None and last in self._results:
+            if self._mode == "fuzzy" and is_subsequence(
+                self._fold(last), self._fold(query)
+            ):
+                return self._results[last]
+            if is_literal(last) and is_literal(query) and last in query:
+                return self._results[last]
+        return range(len(self._items))
+
+    def _filter(self, query: str, base: Iterable[int]) -> List[int]:
+        folded = self._folded
+        if self._mode == "regex" and not is_literal(query):
+            # folding a regex would change its escapes, e.g. "\D" into "\d"
+            items = self._items
+            search = compile_query(query, self._mode, self._ignore_case).search
+            return [i for i in base if search(items[i])]
+        query = self._fold(query)
+        if self._mode == "regex" or len(query) == 1:
+            return [i for i in base if query in folded[i]]
+        search = compile_query(query, self._mode, self._ignore_case).search
+        result = [i for i in base if search(folded[i])]
+        if len(result) <= RANK_LIMIT:
+            result.sort(key=lambda i: self._score(folded[i], search))
+        return result
+
+    @staticmethod
+    def _score(
+        name: str, search: Callable[[str], Optional[Match[str]]]
+    ) -> Tuple[int, bool, int, int]:
+        m = search(name)
+        assert m is not None
+        start = m.start()
+        boundary = start == 0 or name[start - 1] in BOUNDARY_CHARS
+        return (m.end() - start, not boundary, start, len(name))
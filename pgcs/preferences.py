@@ -1,7 +1,10 @@
 import json
 from pathlib import Path
+from typing import Any, Literal, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+
+from pgcs.matcher import MatchMode
 
 PREF_FILE_PATH = Path(__file__).parent / ".preference"
 PREF_CACHE_DIR = Path(__file__).parent / ".cache"
@@ -9,7 +12,40 @@ PREF_CACHE_DIR = Path(__file__).parent / ".cache"
 
 class GCSPref(BaseModel, frozen=True):
     ignore_case: bool = True
+    match_mode: MatchMode = "regex"
     cache_dir: Path = PREF_CACHE_DIR
+    cache_backend: Literal["pickle", "sqlite"] = "pickle"
+    # seconds before a cached listing is revalidated on entry, 0 trusts it forever
+    cache_ttl: float = 60 * 60
+    # entries kept in memory before cold subtrees are unloaded, 0 keeps them all
+    cache_node_budget: int = 2_000_000
+    # seconds between background saves of what was listed, 0 saves only on exit
+    cache_flush_interval: float = 5 * 60
+    gcs_concurrency: int = 32
+    # what the preview pane shows for files; ctrl-t cycles through them
+    preview_mode: Literal["stat", "head", "tail"] = "stat"
+    preview_bytes: int = 16 * 2**10
+    preview_cache_size: int = 16 * 2**20
+    # candidates ordered as listed or by size, largest first; ctrl-o toggles
+    sort_by: Literal["name", "size"] = "name"
+    # total the highlighted directory with a flat listing when it is not loaded
+    measure_usage: bool = True
+    # buckets loaded whole with one flat listing in the background when opened
+    flat_listing_buckets: Tuple[str, ...] = ()
+    # show the latency of the last GCS request and the cache hit rate
+    show_latency: bool = False
+    prefetch_depth: int = 1
+    prefetch_concurrency: int = 4
+    download_concurrency: int = 8
+    download_chunk_size: int = 32 * 2**20
+
+    @field_validator("flat_listing_buckets", mode="before")
+    @classmethod
+    def _split_bucket_names(cls, value: Any) -> Any:
+        # as typed on the command line, e.g. "bucket-a,bucket-b"
+        if isinstance(value, str):
+            return tuple(name for name in value.split(",") if name)
+        return value
 
     def write(self) -> None:
         PREF_FILE_PATH.write_text(self.model_dump_json())
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from pgcs.file_system.base import Entry
+from pgcs.file_system.entries import Container
+
+
+class Prefetcher:
+    """Speculatively lists containers in background threads.
+
+    `depth` is how many levels below a scheduled entry are listed and
+    `concurrency` is the number of worker threads; a concurrency of 0 disables
+    prefetching entirely.
+    """
+
+    def __init__(self, depth: int, concurrency: int) -> None:
+        self._depth = depth
+        self._concurrency = concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[str, Future[None]] = {}
+        # cancelling a future forgets it from a callback run by the canceller
+        self._lock = threading.RLock()
+        self._focus: Optional[Entry] = None
+        self._closed = False
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency
+
+    @property
+    def enabled(self) -> bool:
+        return self._depth > 0 and self._concurrency > 0
+
+    def schedule(self, entry: Entry, depth: Optional[int] = None) -> None:
+        depth = self._depth if depth is None else depth
+        if not self.enabled or depth <= 0 or not isinstance(entry, Container):
+            return
+        if entry.loaded:
+            self._schedule_children(entry, depth)
+            return
+        with self._lock:
+            if self._closed or entry.path() in self._futures:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._concurrency, thread_name_prefix="pgcs-prefetch"
+                )
+            path = entry.path()
+            future = self._executor.submit(self._load, entry, depth)
+            self._futures[path] = future
+        # only queued and running listings are kept, so a path is listed again
+        # once its entry has been replaced, e.g. by a revalidation
+        future.add_done_callback(lambda future: self._forget(path, future))
+
+    def focus(self, entries: List[Entry], index: int) -> None:
+        """Prefetch the highlighted entry first, then its nearest siblings.
+
+        Queued work for a previously highlighted entry that has not started yet
+        is dropped so that the budget follows the cursor.
+        """
+        if not self.enabled or not 0 <= index < len(entries):
+            return
+        if entries[index] is self._focus:
+            return
+        self._focus = entries[index]
+        with self._lock:
+            for future in list(self._futures.values()):
+                future.cancel()
+        self.schedule(entries[index])
+        for offset in range(1, self._concurrency + 1):
+            for i in (index + offset, index - offset):
+                if 0 <= i < len(entries):
+                    self.schedule(entries[i])
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            for future in list(self._futures.values()):
+                future.cancel()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _forget(self, path: str, future: Future[None]) -> None:
+        with self._lock:
+            if self._futures.get(path) is future:
+                del self._futures[path]
+
+    def _load(self, entry: Container, depth: int) -> None:
+        entry.load()
+        self._schedule_children(entry, depth)
+
+    def _schedule_children(self, entry: Container, depth: int) -> None:
+        if depth > 1:
+            for child in list(entry.children.values()):
+                self.schedule(child, depth - 1)
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import bz2
+import lzma
+import os
+import string
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pgcs.file_system.backend import get_backend
+from pgcs.file_system.entries import File
+
+# prompt_toolkit's (style, text) fragments, without importing prompt_toolkit
+Fragments = List[Tuple[str, str]]
+
+PARQUET_MAGIC = b"PAR1"
+# footers larger than this are not worth a preview
+MAX_PARQUET_FOOTER = 4 * 2**20
+# decompressed heads are cut here; a preview shows a few lines of them
+MAX_DECODED = 64 * 2**10
+# binary content is shown as a hex dump of this many lines
+HEX_LINES = 32
+PRINTABLE = frozenset(string.printable.encode()) - frozenset(b"\t\n\r\x0b\x0c")
+
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".xz")
+# magic number -> (name, decoder of a stream's first bytes, suffix it goes by)
+_DECOMPRESSORS: Dict[bytes, Tuple[str, Callable[[bytes], bytes], str]] = {
+    b"\x1f\x8b": (
+        "gzip",
+        lambda data: zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(
+            data, MAX_DECODED
+        ),
+        ".gz",
+    ),
+    b"BZh": (
+        "bzip2",
+        lambda data: bz2.BZ2Decompressor().decompress(data, MAX_DECODED),
+        ".bz2",
+    ),
+    b"\xfd7zXZ\x00": (
+        "xz",
+        lambda data: lzma.LZMADecompressor().decompress(data, MAX_DECODED),
+        ".xz",
+    ),
+}
+
+
+class PreviewCache:
+    """Rendered previews, evicting the least recently used beyond `max_chars`."""
+
+    def __init__(self, max_chars: int) -> None:
+        self._max_chars = max_chars
+        self._chars = 0
+        self._previews: OrderedDict[Tuple[str, ...], Fragments] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._previews)
+
+    def get(self, key: Tuple[str, ...]) -> Optional[Fragments]:
+        with self._lock:
+            preview = self._previews.get(key)
+            if preview is not None:
+                self._previews.move_to_end(key)
+            return preview
+
+    def put(self, key: Tuple[str, ...], preview: Fragments) -> None:
+        chars = sum(len(text) for _, text in preview)
+        with self._lock:
+            old = self._previews.pop(key, None)
+            if old is not None:
+                self._chars -= sum(len(text) for _, text in old)
+            self._previews[key] = preview
+            self._chars += chars
+            while self._chars > self._max_chars and len(self._previews) > 1:
+                _, evicted = self._previews.popitem(last=False)
+                self._chars -= sum(len(text) for _, text in evicted)
+
+
+def fetch_preview(file: File, mode: str, max_bytes: int) -> Fragments:
+    """Read the head or tail of `file` with one ranged read and render it.
+
+    Compressed heads are decoded as far as the bytes read allow and parquet
+    files are described from their footer, so whole objects are never fetched.
+    """
+    if not file.has_stat:
+        file.stat()
+    size = file.size
+    path = file.path()
+    backend = get_backend()
+    if file.name.endswith(".parquet"):
+        return [("", describe_parquet(read_parquet_footer(path, size, max_bytes)))]
+
+    start = max(0, size - max_bytes) if mode == "tail" else 0
+    end = min(size, start + max_bytes)
+    data = backend.read(path, start, end) if end > start else b""
+    name = file.name
+    head_cut, tail_cut = start > 0, end < size
+    compression = next(
+        (value for magic, value in _DECOMPRESSORS.items() if data.startswith(magic)),
+        None,
+    )
+    if compression is not None and start == 0:
+        label, decompress, suffix = compression
+        try:
+            data = decompress(data)
+        except (zlib.error, OSError, EOFError, lzma.LZMAError) as e:
+            return [("", f"{label}: {e}")]
+        # the decoded stream is almost always cut somewhere
+        tail_cut = True
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    elif mode == "tail" and os.path.splitext(name)[1] in COMPRESSED_SUFFIXES:
+        return [("", "the tail of a compressed object cannot be decoded")]
+    return highlight(to_text(data, head_cut, tail_cut), name, file.content_type)
+
+
+def to_text(data: bytes, head_cut: bool = False, tail_cut: bool = False) -> str:
+    """Decode `data`, dropping lines cut by the range it was read from."""
+    if b"\0" in data[:1024]:
+        return hexdump(data)
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    if head_cut and len(lines) > 1:
+        lines = lines[1:]
+    if tail_cut and len(lines) > 1:
+        lines = lines[:-1]
+    return "\n".join(lines)
+
+
+def hexdump(data: bytes, lines: int = HEX_LINES) -> str:
+    rows = []
+    for offset in range(0, min(len(data), lines * 16), 16):
+        chunk = data[offset : offset + 16]
+        text = "".join(chr(b) if b in PRINTABLE else "." for b in chunk)
+        rows.append(f"{offset:08x}  {chunk.hex(' '):<47}  |{text}|")
+    return "\n".join(rows)
+
+
+def highlight(text: str, name: str, content_type: str = "") -> Fragments:
+    """Split `text` into fragments styled like prompt_toolkit's PygmentsLexer."""
+    from pygments.lexers import get_lexer_for_filename, get_lexer_for_mimetype
+    from pygments.lexers.special import TextLexer
+    from pygments.util import ClassNotFound
+
+    try:
+        lexer = get_lexer_for_filename(name, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        try:
+            lexer = get_lexer_for_mimetype(content_type, stripnl=False, ensurenl=False)
+        except ClassNotFound:
+            return [("", text)]
+    if isinstance(lexer, TextLexer):
+        return [("", text)]
+    return [
+        ("class:" + ".".join(("pygments", *token)).lower(), value)
+        for token, value in lexer.get_tokens(text)
+    ]
+
+
+def read_parquet_footer(path: str, size: int, max_bytes: int) -> bytes:
+    """The thrift encoded `FileMetaData` at the end of a parquet file.
+
+    The tail read for a preview usually holds the whole footer; larger ones
+    take a second read of exactly their range.
+    """
+    backend = get_backend()
+    if size < 12:
+        raise ValueError("not a parquet file")
+    tail = backend.read(path, max(0, size - max(max_bytes, 8)), size)
+    if tail[-4:] != PARQUET_MAGIC:
+        raise ValueError("not a parquet file")
+    (length,) = struct.unpack("<I", tail[-8:-4])
+    if length > MAX_PARQUET_FOOTER or length + 12 > size:
+        raise ValueError(f"parquet footer of {length} bytes")
+    if length + 8 <= len(tail):
+        return tail[-8 - length : -8]
+    return backend.read(path, size - 8 - length, size - 8)
+
+
+PARQUET_TYPES = (
+    "BOOLEAN",
+    "INT32",
+    "INT64",
+    "INT96",
+    "FLOAT",
+    "DOUBLE",
+    "BYTE_ARRAY",
+    "FIXED_LEN_BYTE_ARRAY",
+)
+
+
+def describe_parquet(footer: bytes) -> str:
+    """Rows, row groups and the schema tree of a parquet footer."""
+    reader = _CompactReader(footer)
+    schema: List[Dict[int, Any]] = []
+    num_rows = row_groups = 0
+    for field, kind in reader.fields():
+        if field == 2 and kind == _LIST:
+            for _ in range(reader.list_header()[1]):
+                schema.append(reader.struct({1: _I32, 4: _BINARY, 5: _I32}))
+        elif field == 3 and kind == _I64:
+            num_rows = reader.integer()
+        elif field == 4 and kind == _LIST:
+            etype, row_groups = reader.list_header()
+            for _ in range(row_groups):
+                reader.skip(etype)
+        else:
+            reader.skip(kind)
+
+    lines = [f"parquet  {num_rows} rows  {row_groups} row groups"]
+    # the first element is the root; children follow their parent depth first
+    remaining = [int(schema[0].get(5, 0))] if schema else []
+    for element in schema[1:]:
+        while remaining and remaining[-1] == 0:
+            remaining.pop()
+        if remaining:
+            remaining[-1] -= 1
+        name = element.get(4, b"").decode("utf-8", errors="replace")
+        indent = "  " * (len(remaining) - 1)
+        children = element.get(5, 0)
+        if children:
+            lines.append(f"{indent}{name}")
+            remaining.append(children)
+        else:
+            kind = element.get(1, -1)
+            type_name = PARQUET_TYPES[kind] if 0 <= kind < len(PARQUET_TYPES) else "?"
+            lines.append(f"{indent}{name}: {type_name}")
+    return "\n".join(lines)
+
+
+# thrift compact protocol types
+_TRUE, _FALSE, _BYTE, _I16, _I32, _I64, _DOUBLE, _BINARY = 1, 2, 3, 4, 5, 6, 7, 8
+_LIST, _SET, _MAP, _STRUCT = 9, 10, 11, 12
+
+
+class _CompactReader:
+    """Just enough of the thrift compact protocol to read parquet footers."""
+
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+        self._pos = 0
+
+    def byte(self) -> int:
+        if self._pos >= len(self._data):
+            raise ValueError("truncated parquet footer")
+        value = self._data[self._pos]
+        self._pos += 1
+        return value
+
+    def varint(self) -> int:
+        result = shift = 0
+        while True:
+            b = self.byte()
+            result |= (b & 0x7F) << shift
+            if not b & 0x80:
+                return result
+            shift += 7
+
+    def integer(self) -> int:
+        n = self.varint()
+        return (n >> 1) ^ -(n & 1)
+
+    def binary(self) -> bytes:
+        n = self.varint()
+        value = self._data[self._pos : self._pos + n]
+        self._pos += n
+        return value
+
+    def list_header(self) -> Tuple[int, int]:
+        header = self.byte()
+        size = header >> 4
+        return header & 0x0F, self.varint() if size == 15 else size
+
+    def fields(self) -> Iterator[Tuple[int, int]]:
+        field = 0
+        while True:
+            header = self.byte()
+            if header == 0:
+                return
+            delta = header >> 4
+            field = field + delta if delta else self.integer()
+            yield field, header & 0x0F
+
+    def struct(self, wanted: Dict[int, int]) -> Dict[int, Any]:
+        values: Dict[int, Any] = {}
+        for field, kind in self.fields():
+            if wanted.get(field) == kind:
+                values[field] = self.binary() if kind == _BINARY else self.integer()
+            else:
+                self.skip(kind)
+        return values
+
+    def skip(self, kind: int) -> None:
+        if kind in (_TRUE, _FALSE):
+            return
+        if kind == _BYTE:
+            self._pos += 1
+        elif kind in (_I16, _I32, _I64):
+            self.varint()
+        elif kind == _DOUBLE:
+            self._pos += 8
+        elif kind == _BINARY:
+            self.binary()
+        elif kind in (_LIST, _SET):
+            etype, size = self.list_header()
+            for _ in range(size):
+                self.skip_element(etype)
+        elif kind == _MAP:
+            size = self.varint()
+            if size:
+                types = self.byte()
+                for _ in range(size):
+                    self.skip_element(types >> 4)
+                    self.skip_element(types & 0x0F)
+        elif kind == _STRUCT:
+            for _, field_kind in self.fields():
+                self.skip(field_kind)
+        else:
+            raise ValueError(f"unknown thrift type {kind}")
+
+    def skip_element(self, kind: int) -> None:
+        if kind in (_TRUE, _FALSE):
+            # booleans in containers take a byte each, unlike boolean fields
+            self._pos += 1
+        else:
+            self.skip(kind)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# operations named with this prefix are requests to GCS, the rest is local work
+REQUEST_PREFIX = "gcs."
+# upper bounds of the histogram buckets in seconds: 1 ms, 2 ms, ... 16 s, above
+BUCKET_BOUNDS = tuple(2.0**i / 1000 for i in range(15))
+HISTOGRAM_WIDTH = 40
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.0f} ms"
+    return f"{seconds:.2f} s"
+
+
+class OperationStats:
+    """Count, total and histogram of the durations of one operation."""
+
+    __slots__ = ("count", "total", "max", "last", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        for i, bound in enumerate(BUCKET_BOUNDS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKET_BOUNDS)
+        self.buckets[i] += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, at most `max`."""
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS, self.buckets):
+            seen += count
+            if seen >= q * self.count:
+                return min(bound, self.max)
+        return self.max
+
+
+class Profiler:
+    """Timers and counters around the hot paths of a session.
+
+    Timings are kept per operation in a histogram of power of two buckets, so
+    recording one costs a lock and a few additions and the profiler can stay on
+    for the whole session. `report` tells time spent waiting on GCS apart from
+    local work such as reading caches, filtering and rendering.
+    """
+
+    def __init__(self) -> None:
+        self._stats: Dict[str, OperationStats] = {}
+        self._counters: Dict[str, int] = {}
+        self._last_request: Optional[Tuple[str, float]] = None
+        # operations are timed from the UI, worker threads and the backend loop
+        self._lock = threading.Lock()
+
+    @property
+    def last_request(self) -> Optional[Tuple[str, float]]:
+        """Name and duration of the latest request to GCS, if any."""
+        return self._last_request
+
+    def record(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._stats.get(operation)
+            if stats is None:
+                stats = self._stats[operation] = OperationStats()
+            stats.add(seconds)
+            if operation.startswith(REQUEST_PREFIX):
+                self._last_request = (operation, seconds)
+
+    @contextmanager
+    def timer(self, operation: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(operation, time.perf_counter() - start)
+
+    def count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def stats(self, operation: str) -> Optional[OperationStats]:
+        return self._stats.get(operation)
+
+    def counter(self, counter: str) -> int:
+        return self._counters.get(counter, 0)
+
+    def hit_rate(self) -> Optional[float]:
+        """Share of container listings read from the on-disk cache, not GCS."""
+        hits, misses = self.counter("cache.hit"), self.counter("cache.miss")
+        return hits / (hits + misses) if hits + misses else None
+
+    def overlay(self) -> str:
+        """One line for the status bar: the last request and the cache hit rate."""
+        parts = []
+        if self._last_request is not None:
+            operation, seconds = self._last_request
+            parts.append(f"{operation} {format_duration(seconds)}")
+        hit_rate = self.hit_rate()
+        if hit_rate is not None:
+            parts.append(f"cache {hit_rate:.0%} hit")
+        return ", ".join(parts)
+
+    def report(self) -> str:
+        """Per operation counts, latencies and histograms, slowest total first."""
+        with self._lock:
+            stats = sorted(self._stats.items(), key=lambda item: -item[1].total)
+            counters = dict(self._counters)
+        lines = [
+            f"{'operation':<20}{'count':>8}{'total':>10}{'mean':>10}"
+            f"{'p50':>10}{'p90':>10}{'max':>10}"
+        ]
+        for operation, op in stats:
+            lines.append(
+                f"{operation:<20}{op.count:>8}{format_duration(op.total):>10}"
+                + "".join(
+                    f"{format_duration(seconds):>10}"
+                    for seconds in (
+                        op.mean,
+                        op.percentile(0.5),
+                        op.percentile(0.9),
+                        op.max,
+                    )
+                )
+            )
+        for operation, op in stats:
+            lines.append("")
+            lines.append(operation)
+            lines.extend(_histogram(op))
+        network = sum(op.total for name, op in stats if name.startswith(REQUEST_PREFIX))
+        local = sum(op.total for name, op in stats) - network
+        lines.append("")
+        lines.append(
+            f"waiting on GCS {format_duration(network)}, "
+            f"local work {format_duration(local)}"
+        )
+        hit_rate = self.hit_rate()
+        if hit_rate is not None:
+            lines.append(
+                f"listings read from the on-disk cache: {hit_rate:.0%} of "
+                f"{counters.get('cache.hit', 0) + counters.get('cache.miss', 0)}"
+            )
+        return "\n".join(lines)
+
+
+def _histogram(op: OperationStats) -> List[str]:
+    peak = max(op.buckets)
+    used = [i for i, count in enumerate(op.buckets) if count]
+    lines = []
+    for i in range(used[0], used[-1] + 1) if used else ():
+        if i < len(BUCKET_BOUNDS):
+            label = f"≤ {format_duration(BUCKET_BOUNDS[i])}"
+        else:
+            label = f"> {format_duration(BUCKET_BOUNDS[-1])}"
+        bar = "#" * round(HISTOGRAM_WIDTH * op.buckets[i] / peak)
+        lines.append(f"  {label:>10} {op.buckets[i]:>8} {bar}")
+    return lines
+
+
+profiler = Profiler()
@@ -11,3 +11,11 @@ def error_handler(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
             pass
 
     return wrapper
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
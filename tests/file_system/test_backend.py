@@ -0,0 +1,125 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from pgcs.file_system.backend import MemoryBackend, get_backend, glob_regex, set_backend
+from pgcs.file_system.entries import Bucket
+
+OBJECTS = {
+    "test_bucket/a/1": b"1",
+    "test_bucket/a/2": b"22",
+    "test_bucket/b/c/3": b"333",
+    "test_bucket/d": b"4444",
+    "test_bucket/e.json": b"{}",
+}
+
+
+def test_memory_backend_list_page():
+    backend = MemoryBackend(OBJECTS)
+    assert backend.buckets() == ["test_bucket"]
+    page = backend.list_page("test_bucket", "")
+    assert page["prefixes"] == ["a/", "b/"]
+    assert [item["name"] for item in page["items"]] == ["d", "e.json"]
+    assert page["items"][1]["contentType"] == "application/json"
+    assert "nextPageToken" not in page
+
+    page = backend.list_page("test_bucket", "b/")
+    assert page == {"prefixes": ["b/c/"]}
+    page = backend.list_page("test_bucket", "", delimiter=None)
+    assert [item["name"] for item in page["items"]] == sorted(
+        name.partition("/")[2] for name in OBJECTS
+    )
+
+
+def test_glob_regex():
+    assert glob_regex("a/*.json").fullmatch("a/b.json")
+    assert not glob_regex("a/*.json").fullmatch("a/b/c.json")
+    assert glob_regex("a/**.json").fullmatch("a/b/c.json")
+    assert glob_regex("?[!x]{1,2}").fullmatch("ab2")
+    assert not glob_regex("?[!x]{1,2}").fullmatch("ax1")
+    assert glob_regex(r"\*").fullmatch("*")
+
+
+def test_memory_backend_match_glob():
+    backend = MemoryBackend(OBJECTS)
+    page = backend.list_page("test_bucket", "a/", None, match_glob="a/*2")
+    assert [item["name"] for item in page["items"]] == ["a/2"]
+    page = backend.list_page("test_bucket", "", None, match_glob="*.json")
+    assert [item["name"] for item in page["items"]] == ["e.json"]
+
+
+def test_memory_backend_pages():
+    backend = MemoryBackend(OBJECTS, page_size=2)
+    pages = []
+    page_token = None
+    while True:
+        page = backend.list_page("test_bucket", "", "/", page_token)
+        pages.append(
+            page.get("prefixes", []) + [item["name"] for item in page.get("items", [])]
+        )
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            break
+    assert pages == [["a/", "b/"], ["d", "e.json"]]
+
+
+def test_memory_backend_objects():
+    backend = MemoryBackend(OBJECTS)
+    assert backend.read("gs://test_bucket/d", 1, 3) == b"44"
+    info = backend.stat("gs://test_bucket/d")
+    assert info["name"] == "test_bucket/d"
+    assert info["size"] == 4
+    assert [
+        info["size"]
+        for info in backend.stat_many(["test_bucket/a/1", "test_bucket/a/2"])
+    ] == [1, 2]
+    assert sorted(backend.find("gs://test_bucket/a")) == [
+        "test_bucket/a/1",
+        "test_bucket/a/2",
+    ]
+    with pytest.raises(FileNotFoundError):
+        backend.stat("gs://test_bucket/missing")
+
+    generation = info["generation"]
+    backend.put("gs://test_bucket/d", b"changed")
+    assert backend.stat("gs://test_bucket/d")["generation"] != generation
+
+
+def test_backend_limits_concurrency():
+    backend = MemoryBackend(OBJECTS, concurrency=2)
+    in_flight = []
+    peak = 0
+
+    async def astat(path):
+        nonlocal peak
+        in_flight.append(path)
+        peak = max(peak, len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(path)
+        return {"name": path}
+
+    backend.astat = astat
+    assert len(backend.stat_many([f"test_bucket/{i}" for i in range(10)])) == 10
+    assert peak == 2
+
+
+def test_memory_backend_latency():
+    backend = MemoryBackend(OBJECTS, concurrency=4, latency=0.05)
+    start = time.perf_counter()
+    backend.stat_many([f"test_bucket/{name}" for name in ("d", "e.json")] * 2)
+    # the four requests wait for their round trips at once
+    assert 0.05 <= time.perf_counter() - start < 0.15
+    backend.put("gs://test_bucket/a/0")
+    assert backend.list_page("test_bucket", "a/")["items"][0]["name"] == "a/0"
+
+
+@patch("pgcs.file_system.backend._backend", None)
+def test_entries_use_shared_backend():
+    set_backend(MemoryBackend(OBJECTS))
+    bucket = Bucket("test_bucket", {})
+    bucket.load()
+    assert sorted(bucket.children) == ["a", "b", "d", "e.json"]
+    assert bucket.get("d").size == 4
+    assert get_backend() is get_backend()
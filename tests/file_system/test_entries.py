@@ -1,10 +1,14 @@
 import os
 import pickle
+import threading
 from unittest.mock import patch
 
 import pytest
 
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.base import Entry, state_slots
 from pgcs.file_system.entries import Bucket, Directory, File
+from pgcs.file_system.serialize import load_tree
 
 
 def test_bucket_init():
@@ -58,28 +62,65 @@ def test_bucket_ls():
     ]
 
 
-@patch("pgcs.file_system.entries.os")
-def test_bucket_save(mock_os):
+def test_bucket_save(tmp_path):
     root = {}
     bucket = Bucket("test_bucket", root)
     new_dir = Directory("test_entry", bucket)
     bucket.add(new_dir)
 
-    mock_os.path.exists.return_value = False
-    mock_os.path.join.return_value = "save_dir/test_bucket"
+    bucket.save(tmp_path, force=True)
+    saved = tmp_path / "test_bucket"
+    with saved.open("rb") as f:
+        loaded, _ = load_tree(f)
+    assert loaded.get("test_entry").name == "test_entry"
+    # the pickle replaces the file in one go, through a hidden temporary file
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        ".test_bucket.lock",
+        "test_bucket",
+    ]
+
+    before = saved.read_bytes()
+    bucket.add(Directory("other", bucket))
+    bucket.save(tmp_path, force=False)
+    assert saved.read_bytes() == before
+
 
-    with patch("pgcs.file_system.entries.open") as mock_open:
-        bucket.save("save_dir", force=True)
-        mock_os.makedirs.assert_called_once_with("save_dir", exist_ok=True)
-        mock_open.assert_called_once_with("save_dir/test_bucket", "wb")
-        mock_open().__enter__().write.assert_called_once_with(pickle.dumps(bucket))
+def test_bucket_save_is_atomic(tmp_path):
+    bucket = Bucket("test_bucket", {})
+    bucket.save(tmp_path)
+    before = (tmp_path / "test_bucket").read_bytes()
+    with patch("pgcs.file_system.serialize.pickle.dump", side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            bucket.save(tmp_path, force=True)
+    # an interrupted save leaves the previous cache and no temporary file
+    assert (tmp_path / "test_bucket").read_bytes() == before
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        ".test_bucket.lock",
+        "test_bucket",
+    ]
 
-    mock_os.path.exists.return_value = True
 
-    with patch("pgcs.file_system.entries.open") as mock_open:
-        bucket.save("save_dir", force=False)
-        mock_os.makedirs.assert_called_with("save_dir", exist_ok=True)
-        mock_open.assert_not_called()
+def test_bucket_save_merges_other_session(tmp_path):
+    backend = MemoryBackend({"gs://b/d1/x": b"x", "gs://b/d2/y": b"yy"})
+    with patch("pgcs.file_system.backend._backend", backend):
+        first = Bucket("b", {}, cache_dir=tmp_path)
+        first.load()
+        first.save(tmp_path, force=True)
+        # two sessions start from the same cache and list different directories
+        sessions = [Bucket("b", {}, cache_dir=tmp_path) for _ in range(2)]
+        for session, name in zip(sessions, ("d1", "d2")):
+            session.load()
+            assert not session.dirty
+            session.get(name).load()
+            assert session.dirty
+            session.save(tmp_path, force=True)
+            assert not session.dirty
+
+    merged = Bucket("b", {}, cache_dir=tmp_path)
+    merged.load()
+    assert merged.get("d1").get("x").path() == "gs://b/d1/x"
+    assert merged.get("d2").get("y").size == 2
+    assert merged.usage == (3, 2, True)
 
 
 def test_file_init():
@@ -153,3 +194,375 @@ def test_directory_ls():
         "gs://test_bucket/test_parent/test_directory/test_entry1",
         "gs://test_bucket/test_parent/test_directory/test_entry2",
     ]
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_directory_load_keeps_metadata(mock_backend):
+    info = {
+        "name": "file",
+        "timeCreated": "created",
+        "updated": "updated",
+        "size": "42",
+        "generation": 1700000000000000,
+        "contentType": "text/plain",
+    }
+    mock_backend.list_page.return_value = {"prefixes": ["dir/"], "items": [info]}
+    bucket = Bucket("test_bucket", {})
+    bucket.load()
+    file = bucket.get("file")
+    assert isinstance(bucket.get("dir"), Directory)
+    assert file.stat() == ("created", "updated")
+    assert file.size == 42
+    assert file.generation == "1700000000000000"
+    assert file.content_type == "text/plain"
+    mock_backend.stat.assert_not_called()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_file_stat_batches_siblings(mock_backend):
+    bucket = Bucket("test_bucket", {})
+    for name in ("a", "b"):
+        bucket.add(File(name, bucket))
+    mock_backend.list_page.return_value = {
+        "items": [
+            {"name": name, "updated": "u", "timeCreated": "c"} for name in ("a", "b")
+        ]
+    }
+    assert bucket.get("a").stat() == ("c", "u")
+    assert bucket.get("b").stat() == ("c", "u")
+    mock_backend.list_page.assert_called_once()
+    mock_backend.stat.assert_not_called()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_bucket_load_streams_pages(mock_backend):
+    bucket = Bucket("test_bucket", {})
+    seen = []
+
+    def list_objects(bucket_name, prefix, delimiter, page_token):
+        seen.append((bucket.listing, sorted(bucket.children)))
+        if page_token is None:
+            return {"prefixes": ["dir/"], "nextPageToken": "next"}
+        return {"items": [{"name": "file"}]}
+
+    mock_backend.list_page.side_effect = list_objects
+    bucket.load()
+    # the first page is visible while the second one is requested
+    assert seen == [(True, []), (True, ["dir"])]
+    assert not bucket.listing
+    assert bucket.loaded
+    assert sorted(bucket.children) == ["dir", "file"]
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_bucket_revalidate_merges(mock_backend):
+    bucket = Bucket("test_bucket", {})
+    mock_backend.list_page.return_value = {
+        "prefixes": ["dir/", "gone/"],
+        "items": [
+            {"name": "same", "generation": "1", "updated": "u1"},
+            {"name": "changed", "generation": "1", "updated": "u1"},
+        ],
+    }
+    bucket.load()
+    directory = bucket.get("dir")
+    directory.add(File("nested", directory))
+    same = bucket.get("same")
+
+    mock_backend.list_page.return_value = {
+        "prefixes": ["dir/"],
+        "items": [
+            {"name": "same", "generation": "1", "updated": "u1"},
+            {"name": "changed", "generation": "2", "updated": "u2"},
+            {"name": "new", "generation": "1"},
+        ],
+    }
+    bucket.load(force=True)
+    assert sorted(bucket.children) == ["changed", "dir", "new", "same"]
+    # descendants of directories that are still there survive the reload
+    assert bucket.get("dir") is directory
+    assert sorted(directory.children) == ["nested"]
+    assert bucket.get("same") is same
+    assert bucket.get("changed").generation == "2"
+    assert bucket.get("changed").updated_at == "u2"
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_bucket_is_stale(mock_backend):
+    mock_backend.list_page.return_value = {"items": [{"name": "file"}]}
+    bucket = Bucket("test_bucket", {})
+    assert not bucket.is_stale(60)
+    bucket.load()
+    assert not bucket.is_stale(60)
+    assert not bucket.is_stale(0)
+    with patch(
+        "pgcs.file_system.entries.time.time", return_value=bucket.listed_at + 61
+    ):
+        assert bucket.is_stale(60)
+        assert not bucket.is_stale(0)
+
+
+def test_entries_pickle_roundtrip():
+    root = {}
+    bucket = Bucket("test_bucket", root)
+    root["test_bucket"] = bucket
+    directory = Directory("dir", bucket)
+    bucket.add(directory)
+    directory.add(File.from_info("file", directory, {"size": "3", "generation": "17"}))
+    bucket._loaded = True
+
+    loaded = pickle.loads(pickle.dumps(bucket))
+    # the root with the other buckets is left to the caller to attach
+    assert loaded.root == {}
+    assert loaded.loaded
+    assert not loaded.listing
+    assert loaded.store is None
+    file = loaded.get("dir").get("file")
+    assert file.path() == "gs://test_bucket/dir/file"
+    assert file.size == 3
+    assert file.generation == "17"
+    assert not hasattr(file, "__dict__")
+
+
+def test_entries_load_dict_state():
+    # caches pickled before entries had slots restore from a plain dict
+    file = File.__new__(File)
+    file.__setstate__(
+        {"_name": "file", "_parent": None, "_created_at": "c", "_updated_at": "u"}
+    )
+    assert file.stat() == ("c", "u")
+    assert file.size == 0
+    assert file.generation == ""
+    bucket = Bucket.__new__(Bucket)
+    bucket.__setstate__({"_name": "bucket", "_children": {}, "_root": {"a": None}})
+    assert bucket.root == {}
+    assert bucket.listed_at == 0.0
+
+
+def test_entries_load_positional_state():
+    # caches pickled with bare values in slot order, before slots were named
+    file = File.__new__(File)
+    file.__setstate__(("file", None, "c", "u", 3, 17, "text/plain"))
+    assert file.stat() == ("c", "u")
+    assert file.size == 3
+    assert file.generation == "17"
+
+
+def test_entries_load_renamed_slots():
+    original = Directory("dir", None)
+    original._listed_at = 1.0
+    slots, values = original.__getstate__()
+    state = dict(zip(slots, values))
+    # slots added since the cache was written fall back to their defaults and
+    # slots removed since are ignored
+    del state["_listed_at"]
+    state["_gone"] = "x"
+    directory = Directory.__new__(Directory)
+    directory.__setstate__((tuple(reversed(state)), tuple(reversed(state.values()))))
+    assert directory.name == "dir"
+    assert directory.listed_at == 0.0
+    assert not hasattr(directory, "_gone")
+
+
+def test_directory_path_is_cached():
+    bucket = Bucket("test_bucket", {})
+    parent = Directory("test_parent", bucket)
+    directory = Directory("test_directory", parent)
+    file = File("test_file", directory)
+    assert file.path() == "gs://test_bucket/test_parent/test_directory/test_file"
+    assert (bucket.depth, parent.depth, directory.depth, file.depth) == (0, 1, 2, 3)
+    with patch.object(Directory, "path", side_effect=AssertionError) as mock_path:
+        # children made for a directory are added without building any path
+        directory.add(file)
+        mock_path.assert_not_called()
+    assert directory.children == {"test_file": file}
+
+    # cached paths are not pickled but built again
+    loaded = pickle.loads(pickle.dumps(directory))
+    assert loaded.path() == directory.path()
+    assert loaded.depth == 2
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_bucket_reads_pickle_on_load(mock_backend, tmp_path):
+    mock_backend.list_page.return_value = {"prefixes": ["dir/"]}
+    bucket = Bucket("test_bucket", {})
+    bucket.load()
+    bucket.get("dir").add(File("file", bucket.get("dir")))
+    bucket.save(tmp_path)
+
+    root = {}
+    lazy = Bucket("test_bucket", root, cache_dir=tmp_path)
+    root["test_bucket"] = lazy
+    assert not lazy.loaded
+    mock_backend.list_page.reset_mock()
+    lazy.load()
+    mock_backend.list_page.assert_not_called()
+    assert lazy.listed_at == bucket.listed_at
+    directory = lazy.get("dir")
+    assert directory.path() == "gs://test_bucket/dir"
+    assert directory.get("file").path() == "gs://test_bucket/dir/file"
+    assert lazy.root is root
+
+    # without a pickle the bucket is listed as usual
+    Bucket("other_bucket", root, cache_dir=tmp_path).load()
+    mock_backend.list_page.assert_called_once()
+
+
+def usage_tree():
+    backend = MemoryBackend(
+        {"gs://b/a": b"abc", "gs://b/d/x": b"abcd", "gs://b/d/e/y": b"abcde"}
+    )
+    return backend, Bucket("b", {})
+
+
+def test_container_usage_rolls_up():
+    backend, bucket = usage_tree()
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+        assert bucket.usage == (3, 1, False)
+        directory = bucket.get("d")
+        directory.load()
+        assert directory.usage == (4, 1, False)
+        assert bucket.usage == (7, 2, False)
+        directory.get("e").load()
+    # the deepest listing makes every ancestor exact
+    assert directory.usage == (9, 2, True)
+    assert bucket.usage == (12, 3, True)
+
+    # revalidating recounts the merged children and passes the change on
+    backend.put("gs://b/d/z", b"z" * 10)
+    with patch("pgcs.file_system.backend._backend", backend):
+        directory.load(force=True)
+    assert directory.usage == (19, 3, True)
+    assert bucket.usage == (22, 4, True)
+
+
+def test_container_measure_until_loaded():
+    backend, bucket = usage_tree()
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+        directory = bucket.get("d")
+        assert directory.measure() == (9, 2, True)
+        assert bucket.usage == (12, 3, True)
+        # listings below keep the measured totals until they are exact on their own
+        directory.load()
+        assert directory.usage == (9, 2, True)
+        directory.get("e").load()
+    assert directory._measured is None
+    assert directory.usage == (9, 2, True)
+    assert bucket.usage == (12, 3, True)
+
+
+def test_container_measure_stops():
+    backend, bucket = usage_tree()
+    stop = threading.Event()
+    stop.set()
+    with patch("pgcs.file_system.backend._backend", backend):
+        assert bucket.measure(stop) is None
+    assert bucket.usage == (0, 0, False)
+
+
+def test_container_load_flat():
+    backend, bucket = usage_tree()
+    backend.put("gs://b/f/")
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+        directory = bucket.get("d")
+        # changed and deleted since the bucket was listed
+        backend.put("gs://b/a", b"changed")
+        bucket.add(File("gone", bucket, size=1))
+        with patch.object(backend, "alist_page", wraps=backend.alist_page) as list_page:
+            assert bucket.load_flat()
+        assert list_page.call_count == 1
+        assert list_page.call_args.args[2] is None
+    # loaded nodes are kept and merged into
+    assert bucket.get("d") is directory
+    assert bucket.get("gone").size == 1
+    assert bucket.get("a").size == 7
+    nested = directory.get("e")
+    assert nested.loaded
+    assert nested.get("y").size == 5
+    assert nested.get("y").path() == "gs://b/d/e/y"
+    assert nested.get("y").content_type
+    # placeholders of empty directories
+    assert bucket.get("f").loaded
+    assert bucket.get("f").children == {}
+    # the whole tree is in, so its totals are exact
+    assert bucket.usage == (17, 4, True)
+
+
+def test_container_load_matching():
+    backend, bucket = usage_tree()
+    backend.put("gs://b/da")
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load_matching("d")
+        assert sorted(bucket.children) == ["d", "da"]
+        assert bucket.partial and not bucket.loaded
+        directory = bucket.get("d")
+        # a glob finds the files directly in the container only
+        bucket.load_matching(match_glob="*a*")
+        assert bucket.get("a").size == 3
+        assert bucket.get("d") is directory
+        directory.load_matching(match_glob="*")
+        assert sorted(directory.children) == ["x"]
+        # the next load lists everything
+        bucket.load()
+    assert bucket.loaded and not bucket.partial
+    assert sorted(bucket.children) == ["a", "d", "da"]
+
+
+def test_container_load_keeps_directories_found_by_matching():
+    backend, bucket = usage_tree()
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load_matching("d")
+        directory = bucket.get("d")
+        # opened before the listing of its parent reaches it
+        directory.load()
+        bucket.load()
+    assert bucket.get("d") is directory
+    assert directory.loaded
+    assert directory.parent is bucket
+    assert bucket.usage == (7, 2, False)
+
+
+def test_container_load_flat_stops():
+    backend, bucket = usage_tree()
+    stop = threading.Event()
+    stop.set()
+    with patch("pgcs.file_system.backend._backend", backend):
+        assert not bucket.load_flat(stop)
+    assert not bucket.loaded
+
+
+def test_bucket_reads_pickle_of_unnamed_slots(tmp_path):
+    # layouts of bare tuple states, written before slots were named and before
+    # containers kept usage totals
+    old_slots = {
+        File: state_slots(File),
+        Directory: ("_name", "_children", "_loaded", "_listed_at", "_parent"),
+        Bucket: ("_name", "_children", "_loaded", "_listed_at"),
+    }
+
+    def positional_state(self):
+        return tuple(getattr(self, slot) for slot in old_slots[type(self)])
+
+    backend, bucket = usage_tree()
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+        bucket.get("d").load()
+    with patch.object(Entry, "__getstate__", positional_state):
+        # buckets were saved as raw pickles of the tree
+        (tmp_path / "b").write_bytes(pickle.dumps(bucket))
+
+    lazy = Bucket("b", {}, cache_dir=tmp_path)
+    with patch("pgcs.file_system.backend._backend", MemoryBackend()):
+        lazy.load()
+    nested = lazy.get("d").get("e")
+    assert nested.path() == "gs://b/d/e"
+    assert not nested.loaded
+    assert lazy.get("d").get("x").size == 4
+    # totals missing from the cache are counted again
+    assert lazy.usage == (7, 2, False)
+    # and the cache is rewritten in the current format
+    assert lazy.dirty
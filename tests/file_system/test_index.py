@@ -0,0 +1,89 @@
+from unittest.mock import patch
+
+from pgcs.file_system.entries import Bucket, Directory, File
+from pgcs.file_system.index import ObjectIndex, glob_to_like, locate, resolve, to_glob
+
+
+def make_tree():
+    root = {}
+    bucket = Bucket("test_bucket", root)
+    root["test_bucket"] = bucket
+    bucket.add(Directory("train", bucket))
+    bucket.add(File("README.md", bucket))
+    train = bucket.get("train")
+    train.add(File("model_final.ckpt", train))
+    train.add(File("model_1.ckpt", train))
+    return root, bucket
+
+
+def test_to_glob():
+    assert to_glob("final") == "*final*"
+    assert to_glob("*/model_final.ckpt") == "*/model_final.ckpt"
+    assert to_glob("model_*.ckpt") == "*/model_*.ckpt"
+    assert to_glob("gs://b/*") == "gs://b/*"
+    # the LIKE prefilter matches at least what the GLOB does
+    assert glob_to_like("*/x[ab]_%?") == "%/x____"
+
+
+def test_index_update_and_search(tmp_path):
+    root, bucket = make_tree()
+    index = ObjectIndex(tmp_path / "index.sqlite3")
+    index.update_tree(bucket)
+    assert len(index) == 3
+    assert index.search("final") == ["gs://test_bucket/train/model_final.ckpt"]
+    assert index.search("model_*.ckpt") == [
+        "gs://test_bucket/train/model_1.ckpt",
+        "gs://test_bucket/train/model_final.ckpt",
+    ]
+    assert index.search("readme") == ["gs://test_bucket/README.md"]
+    assert index.search("readme", ignore_case=False) == []
+    # the limit keeps the first matches in path order
+    assert index.search("ckpt", limit=1) == ["gs://test_bucket/train/model_1.ckpt"]
+
+    # removed objects drop out, unlisted directories are left alone
+    train = bucket.get("train")
+    del train.children["model_1.ckpt"]
+    train.add(Directory("unlisted", train))
+    index.update_tree(bucket)
+    assert index.search("ckpt") == ["gs://test_bucket/train/model_final.ckpt"]
+    index.close()
+
+    index = ObjectIndex(tmp_path / "index.sqlite3")
+    assert len(index) == 2
+    index.close()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_index_refresh(mock_backend, tmp_path):
+    root, bucket = make_tree()
+    index = ObjectIndex(tmp_path / "index.sqlite3")
+    index.update_tree(bucket)
+    mock_backend.list_page.return_value = {
+        "items": [{"name": "a/"}, {"name": "a/b/model_final.ckpt"}, {"name": "c"}]
+    }
+    assert index.refresh("gs://test_bucket") == 2
+    assert mock_backend.list_page.call_args.args[2] is None
+    assert index.search("*/model_final.ckpt") == [
+        "gs://test_bucket/a/b/model_final.ckpt"
+    ]
+    assert len(index) == 2
+    index.close()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_resolve_and_locate(mock_backend):
+    root, bucket = make_tree()
+    cached = resolve(root, "gs://test_bucket/train/model_final.ckpt")
+    assert cached is bucket.get("train").get("model_final.ckpt")
+
+    file = resolve(root, "gs://test_bucket/other/nested/file")
+    assert file.path() == "gs://test_bucket/other/nested/file"
+    assert bucket.get("other") is None
+    mock_backend.list_page.assert_not_called()
+
+    assert locate(root, "gs://test_bucket/train/model_final.ckpt") is bucket.get(
+        "train"
+    )
+    # a stale path stops at the last container that exists
+    assert locate(root, "gs://test_bucket/gone/file") is bucket
+    assert locate(root, "gs://unknown_bucket/file") is None
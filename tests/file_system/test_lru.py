@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+import pytest
+
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.entries import Bucket
+from pgcs.file_system.lru import SubtreeLRU, set_lru
+from pgcs.file_system.store import SQLiteTreeStore
+
+OBJECTS = {f"gs://b/{d}/{i}": b"x" for d in ("d1", "d2", "d3") for i in range(4)}
+
+
+@pytest.fixture
+def backend():
+    backend = MemoryBackend(OBJECTS)
+    with patch("pgcs.file_system.backend._backend", backend):
+        yield backend
+
+
+@pytest.fixture
+def lru():
+    lru = SubtreeLRU(budget=10)
+    set_lru(lru)
+    yield lru
+    set_lru(None)
+
+
+def test_lru_evicts_cold_subtrees(backend, lru):
+    bucket = Bucket("b", {})
+    bucket.load()
+    assert lru.nodes == 3
+    for name in ("d1", "d2"):
+        lru.touch(bucket.get(name))
+        bucket.get(name).load()
+    # the bucket is an ancestor of the visited d2, so the cold d1 goes
+    assert bucket.loaded
+    assert bucket.get("d2").loaded
+    assert not bucket.get("d1").loaded
+    assert lru.nodes == 7
+    assert (lru.evictions, lru.evicted_nodes) == (1, 4)
+    # totals of an evicted directory are kept
+    assert bucket.get("d1").usage == (4, 4, True)
+
+    lru.touch(bucket.get("d1"))
+    bucket.get("d1").load()
+    assert not bucket.get("d2").loaded
+    lru.touch(bucket.get("d1"))
+    assert (lru.hits, lru.misses) == (1, 3)
+    assert "2 subtrees (8 entries) evicted" in lru.stats()
+
+
+def test_lru_evicts_to_store(backend, lru, tmp_path):
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("b", {}, store=store)
+    bucket.load()
+    lru.touch(bucket.get("d3"))
+    for name in ("d1", "d2", "d3"):
+        bucket.get(name).load()
+    assert not bucket.get("d1").loaded
+    with patch.object(backend, "alist_page", side_effect=AssertionError):
+        # evicted listings come back from the store
+        bucket.get("d1").load()
+    assert sorted(bucket.get("d1").children) == ["0", "1", "2", "3"]
+    store.close()
+
+
+def test_lru_evicts_bucket_to_pickle(backend, lru, tmp_path):
+    lru.budget = 2
+    root = {}
+    buckets = [Bucket(name, root, cache_dir=tmp_path) for name in ("b", "c")]
+    backend.put("gs://c/x", b"")
+    buckets[0].load()
+    lru.touch(buckets[1])
+    buckets[1].load()
+    assert not buckets[0].loaded
+    assert (tmp_path / "b").exists()
+    lru.touch(buckets[0])
+    with patch.object(backend, "alist_page", side_effect=AssertionError):
+        buckets[0].load()
+    assert sorted(buckets[0].children) == ["d1", "d2", "d3"]
+
+
+def test_lru_keeps_unloaded_directories_in_pickle(lru, tmp_path):
+    backend = MemoryBackend(
+        {f"gs://b/d{d:02}/{i}": b"x" for d in range(20) for i in range(10)}
+    )
+    with patch("pgcs.file_system.backend._backend", backend):
+        set_lru(None)
+        bucket = Bucket("b", {}, cache_dir=tmp_path)
+        bucket.load()
+        for directory in bucket.children.values():
+            directory.load()
+        bucket.save(tmp_path)
+
+        set_lru(lru)
+        lru.budget = 50
+        cached = Bucket("b", {}, cache_dir=tmp_path)
+        cached.load()
+        assert sum(d.loaded for d in cached.children.values()) < 20
+        # revalidating makes the bucket dirty, its next save drops nothing
+        cached.load(force=True)
+        cached.save(tmp_path, force=True)
+
+        set_lru(None)
+        again = Bucket("b", {}, cache_dir=tmp_path)
+        with patch.object(backend, "alist_page", side_effect=AssertionError):
+            again.load()
+    assert all(d.loaded for d in again.children.values())
+    assert again.usage == (200, 200, True)
+
+
+def test_lru_unbounded(backend):
+    lru = SubtreeLRU(budget=0)
+    set_lru(lru)
+    try:
+        bucket = Bucket("b", {})
+        bucket.load()
+        for name in ("d1", "d2", "d3"):
+            bucket.get(name).load()
+    finally:
+        set_lru(None)
+    assert lru.nodes == 15
+    assert not lru.evictions
@@ -0,0 +1,133 @@
+import io
+import os
+import pickle
+from unittest.mock import patch
+
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.entries import Bucket, Directory, File
+from pgcs.file_system.serialize import FORMAT_VERSION, MAGIC, dump_tree, load_tree
+
+
+def roundtrip(bucket):
+    f = io.BytesIO()
+    dump_tree(bucket, f)
+    f.seek(0)
+    return load_tree(f)
+
+
+def test_tree_roundtrip():
+    backend = MemoryBackend(
+        {"gs://b/a.txt": b"abc", "gs://b/d/x.png": b"x" * 4, "gs://b/d/e/y": b"yy"}
+    )
+    bucket = Bucket("b", {})
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+        bucket.get("d").load()
+        bucket.get("d").measure()
+
+    loaded, legacy = roundtrip(bucket)
+    assert not legacy
+    assert loaded.name == "b"
+    assert loaded.loaded
+    assert loaded.listed_at == bucket.listed_at
+    assert loaded.ls() == bucket.ls()
+    d = loaded.get("d")
+    assert d.parent is loaded
+    assert d.loaded
+    assert d.usage == bucket.get("d").usage
+    assert d._measured == bucket.get("d")._measured
+    assert loaded.usage == bucket.usage
+    x = d.get("x.png")
+    original = bucket.get("d").get("x.png")
+    assert (x.size, x.created_at, x.updated_at, x._generation, x.content_type) == (
+        original.size,
+        original.created_at,
+        original.updated_at,
+        original._generation,
+        original.content_type,
+    )
+    # directories that were not listed stay lazy
+    e = d.get("e")
+    assert e.path() == "gs://b/d/e"
+    assert not e.loaded
+
+
+def test_tree_drops_partial_listings():
+    backend = MemoryBackend({"gs://b/a.txt": b"abc", "gs://b/d/x": b"x"})
+    bucket = Bucket("b", {})
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+        bucket.get("d").load_matching("x")
+    assert bucket.get("d").partial
+
+    loaded, _ = roundtrip(bucket)
+    assert sorted(loaded.children) == ["a.txt", "d"]
+    assert not loaded.get("d").loaded
+    assert loaded.get("d").children == {}
+
+
+def test_tree_drops_listings_in_progress():
+    backend = MemoryBackend({f"gs://b/d/{i}": b"x" for i in range(5)}, page_size=2)
+    bucket = Bucket("b", {})
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+        directory = bucket.get("d")
+        pages = directory._list_pages()
+        # saved by a periodic flush after the first page
+        directory._listing = True
+        directory._children = {entry.name: entry for entry in next(pages)}
+        loaded, _ = roundtrip(bucket)
+    # not taken for the whole listing on the next start
+    assert not loaded.get("d").loaded
+    assert loaded.get("d").children == {}
+
+
+def test_load_tree_refuses_other_versions():
+    bucket = Bucket("b", {})
+    f = io.BytesIO()
+    with patch("pgcs.file_system.serialize.FORMAT_VERSION", FORMAT_VERSION + 1):
+        dump_tree(bucket, f)
+    f.seek(0)
+    assert load_tree(f) == (None, False)
+    # neither a truncated nor a foreign file is loaded
+    assert load_tree(io.BytesIO(b"")) == (None, False)
+    assert load_tree(io.BytesIO(pickle.dumps(("other", 1)))) == (None, False)
+    assert load_tree(io.BytesIO(pickle.dumps(((MAGIC,), (), (), ())))) == (None, False)
+
+
+def test_load_tree_refuses_other_classes():
+    class Payload:
+        def __reduce__(self):
+            return os.system, ("echo unsafe",)
+
+    data = pickle.dumps(Payload())
+    with patch("os.system") as system:
+        assert load_tree(io.BytesIO(data)) == (None, False)
+    system.assert_not_called()
+
+
+def test_load_tree_migrates_raw_pickles():
+    bucket = Bucket("b", {})
+    directory = Directory("d", bucket)
+    bucket.add(directory)
+    directory.add(File("f", directory, size=3))
+
+    loaded, legacy = load_tree(io.BytesIO(pickle.dumps(bucket)))
+    assert legacy
+    assert loaded.get("d").get("f").size == 3
+
+
+def test_load_tree_of_deep_tree():
+    bucket = Bucket("b", {})
+    container = bucket
+    for i in range(5000):
+        directory = Directory(f"d{i}", container)
+        container.add(directory)
+        container = directory
+    container.add(File("leaf", container, size=1))
+
+    loaded, _ = roundtrip(bucket)
+    entry = loaded
+    for i in range(5000):
+        entry = entry.get(f"d{i}")
+    assert entry.get("leaf").size == 1
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.entries import Bucket, Directory, File
+from pgcs.file_system.store import SQLiteTreeStore
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_store_roundtrip(mock_backend, tmp_path):
+    mock_backend.list_page.return_value = {
+        "prefixes": ["dir/"],
+        "items": [{"name": "file", "size": "3", "updated": "updated"}],
+    }
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    bucket.load()
+    assert isinstance(bucket.get("dir"), Directory)
+    assert isinstance(bucket.get("file"), File)
+    store.close()
+
+    mock_backend.list_page.reset_mock()
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    bucket.load()
+    mock_backend.list_page.assert_not_called()
+    assert sorted(bucket.children) == ["dir", "file"]
+    assert bucket.get("dir").store is store
+    assert bucket.get("file").size == 3
+    assert bucket.get("file").updated_at == "updated"
+
+    # unlisted directories still go to GCS
+    mock_backend.list_page.return_value = {"items": [{"name": "dir/nested"}]}
+    bucket.get("dir").load()
+    mock_backend.list_page.assert_called_once()
+    store.close()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_store_writes_only_dirty(mock_backend, tmp_path):
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    bucket.add(Directory("dir", bucket))
+    store.flush()
+
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    assert store.children(bucket) is None
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_store_invalidate_removed_on_force_load(mock_backend, tmp_path):
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    mock_backend.list_page.return_value = {"prefixes": ["dir/"]}
+    bucket.load()
+    mock_backend.list_page.return_value = {"items": [{"name": "dir/file"}]}
+    bucket.get("dir").load()
+    store.flush()
+
+    # directories that are still listed keep their cached listing
+    directory = bucket.get("dir")
+    mock_backend.list_page.return_value = {"prefixes": ["dir/"]}
+    bucket.load(force=True)
+    assert bucket.get("dir") is directory
+    assert store.children(directory) is not None
+
+    mock_backend.list_page.return_value = {"prefixes": ["other/"]}
+    bucket.load(force=True)
+    assert store.children(directory) is None
+    store.close()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_store_keeps_listed_at(mock_backend, tmp_path):
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    mock_backend.list_page.return_value = {"prefixes": ["dir/"]}
+    bucket.load()
+    store.close()
+
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    cached = Bucket("test_bucket", {}, store=store)
+    cached.load()
+    assert cached.listed_at == bucket.listed_at > 0
+    store.close()
+
+
+def test_store_skips_partial_listings(tmp_path):
+    backend = MemoryBackend(
+        {"gs://test_bucket/dir/file": b"1", "gs://test_bucket/x": b""}
+    )
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load_matching("d")
+    assert bucket.partial
+    store.flush()
+    store.close()
+
+    store = SQLiteTreeStore(tmp_path / "tree.sqlite3")
+    bucket = Bucket("test_bucket", {}, store=store)
+    assert store.children(bucket) is None
+    with patch("pgcs.file_system.backend._backend", backend):
+        bucket.load()
+    assert sorted(bucket.children) == ["dir", "x"]
+    store.close()
@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+import pytest
+
+from pgcs.batch import du, find, lookup, ls, walk
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.entries import Bucket
+
+OBJECTS = {
+    "gs://b/a.txt": b"abc",
+    "gs://b/d/x.csv": b"abcd",
+    "gs://b/d/e/y.csv": b"abcde",
+    "gs://c/z": b"",
+}
+
+
+@pytest.fixture
+def backend():
+    backend = MemoryBackend(OBJECTS)
+    with patch("pgcs.file_system.backend._backend", backend):
+        yield backend
+
+
+@pytest.fixture
+def root():
+    root = {}
+    for name in ("b", "c"):
+        root[name] = Bucket(name, root)
+    return root
+
+
+def test_ls(backend, root):
+    assert list(ls(root, [])) == ["gs://b", "gs://c"]
+    assert list(ls(root, ["gs://b"])) == ["gs://b/d", "gs://b/a.txt"]
+    assert list(ls(root, ["b/d/x.csv"])) == ["gs://b/d/x.csv"]
+    assert sorted(ls(root, ["gs://b/d"], recursive=True)) == [
+        "gs://b/d/e",
+        "gs://b/d/e/y.csv",
+        "gs://b/d/x.csv",
+    ]
+    with pytest.raises(FileNotFoundError):
+        list(ls(root, ["gs://b/missing"]))
+
+
+def test_find(backend, root):
+    assert sorted(find(root, r"\.CSV$", [])) == ["gs://b/d/e/y.csv", "gs://b/d/x.csv"]
+    assert list(find(root, r"\.CSV$", [], ignore_case=False)) == []
+    assert list(find(root, "z", ["gs://c"])) == ["gs://c/z"]
+
+
+def test_du(backend, root):
+    assert list(du(root, ["gs://b/d", "gs://b/a.txt"])) == [
+        "9\t2\tgs://b/d",
+        "3\t1\tgs://b/a.txt",
+    ]
+    assert list(du(root, [], human=True)) == ["12 B\t3\tgs://b", "0 B\t1\tgs://c"]
+
+
+def test_walk_answers_from_cache(backend, root):
+    assert len(list(walk([root["b"]], jobs=2))) == 5
+    with patch.object(backend, "alist_page", side_effect=AssertionError):
+        assert len(list(walk([root["b"]]))) == 5
+    # a refresh lists again and picks up new objects
+    backend.put("gs://b/d/new", b"")
+    assert len(list(walk([root["b"]], refresh=True))) == 6
+    assert lookup(root, "gs://b/d/new").size == 0
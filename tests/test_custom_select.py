@@ -1,3 +1,5 @@
+import threading
+import time
 from unittest.mock import patch
 
 import pytest
@@ -6,13 +8,25 @@ from prompt_toolkit.input.defaults import create_pipe_input
 from prompt_toolkit.keys import Keys
 from prompt_toolkit.output import DummyOutput
 
-from pgcs.custom_select import custom_select
+from pgcs.custom_select import (
+    Browser,
+    CandidateListControl,
+    IndexSearch,
+    ListOrder,
+    View,
+    custom_select,
+    flat_listings,
+    format_usage,
+    load_in_background,
+    traverse_gcs,
+)
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.entries import Bucket, Directory, File
+from pgcs.file_system.index import ObjectIndex
+from pgcs.preferences import GCSPref
 
 
-@patch("pgcs.custom_select.gfs")
-def test_custom_select(mock_gfs):
-    mock_gfs.isfile.return_value = False
-    mock_gfs.ls.return_value = []
+def test_custom_select(memory_backend):
     with create_pipe_input() as pipe_input:
         pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Enter])
         selected = custom_select({}, input=pipe_input, output=DummyOutput())
@@ -25,10 +39,7 @@ def test_custom_select(mock_gfs):
         assert selected == "a"
 
 
-@patch("pgcs.custom_select.gfs")
-def test_custom_select_move_cursor(mock_gfs):
-    mock_gfs.isfile.return_value = False
-    mock_gfs.ls.return_value = []
+def test_custom_select_move_cursor(memory_backend):
     with create_pipe_input() as pipe_input:
         pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Enter])
         selected = custom_select(
@@ -109,10 +120,7 @@ def test_custom_select_move_cursor(mock_gfs):
         assert selected == "a"
 
 
-@patch("pgcs.custom_select.gfs")
-def test_custom_select_using_filter(mock_gfs):
-    mock_gfs.isfile.return_value = False
-    mock_gfs.ls.return_value = []
+def test_custom_select_using_filter(memory_backend):
     with create_pipe_input() as pipe_input, patch(
         "prompt_toolkit.widgets.TextArea.text", "a"
     ):
@@ -151,3 +159,260 @@ def test_custom_select_using_filter(mock_gfs):
             dict(a="a", b="b", c="c", aa="aa"), input=pipe_input, output=DummyOutput()
         )
         assert selected == ""
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_custom_select_preview_does_not_block(mock_backend):
+    stat_started = threading.Event()
+    release = threading.Event()
+
+    def slow_stat(*args, **kwargs):
+        stat_started.set()
+        release.wait(5)
+        return {"items": [{"name": "file", "timeCreated": "c", "updated": "u"}]}
+
+    mock_backend.list_page.side_effect = slow_stat
+    bucket = Bucket("test_bucket", {})
+    file = File("file", bucket)
+    bucket.add(file)
+    with create_pipe_input() as pipe_input:
+        pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Down])
+        threading.Timer(
+            0.5,
+            lambda: pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Enter]),
+        ).start()
+        selected = custom_select(
+            dict(file=file), input=pipe_input, output=DummyOutput()
+        )
+        assert selected == "file"
+    # the stat was issued in the background and the UI answered meanwhile
+    assert stat_started.is_set()
+    release.set()
+
+
+def test_candidate_list_control_is_virtualized():
+    items = [str(i) for i in range(1_000_000)]
+    control = CandidateListControl(lambda: items, {})
+    content = control.create_content(width=80, height=10)
+    assert content.line_count == len(items)
+    # rows are only formatted when the window asks for them
+    assert content.get_line(3) == [("class:item", "3")]
+    assert content.get_line(0) == [("class:selected", "0")]
+
+    control.page_down()
+    assert control.get_pointed_at() == "10"
+    control.page_up()
+    control.page_up()
+    assert control.get_pointed_at() == "0"
+    control.pointed_at = len(items) - 5
+    control.page_down()
+    assert control.get_pointed_at() == str(len(items) - 1)
+
+
+def test_custom_select_page_keys(memory_backend):
+    choices = {str(i): str(i) for i in range(1000)}
+    with create_pipe_input() as pipe_input:
+        pipe_input.send_text(
+            "".join(
+                (
+                    REVERSE_ANSI_SEQUENCES[Keys.PageDown],
+                    REVERSE_ANSI_SEQUENCES[Keys.Enter],
+                )
+            )
+        )
+        selected = custom_select(choices, input=pipe_input, output=DummyOutput())
+        assert int(selected) > 0
+
+        pipe_input.send_text(
+            "".join(
+                (
+                    REVERSE_ANSI_SEQUENCES[Keys.PageDown],
+                    REVERSE_ANSI_SEQUENCES[Keys.PageUp],
+                    REVERSE_ANSI_SEQUENCES[Keys.Enter],
+                )
+            )
+        )
+        selected = custom_select(choices, input=pipe_input, output=DummyOutput())
+        assert selected == "0"
+
+
+def test_custom_select_index_search(tmp_path):
+    root = {}
+    bucket = Bucket("test_bucket", root)
+    root["test_bucket"] = bucket
+    bucket.add(File("model_final.ckpt", bucket))
+    index = ObjectIndex(tmp_path / "index.sqlite3")
+    index.update_tree(bucket)
+    search = IndexSearch(index, root)
+    with create_pipe_input() as pipe_input, patch(
+        "prompt_toolkit.widgets.TextArea.text", "final"
+    ):
+        pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Enter])
+        selected = custom_select(
+            search.choices, search=search, input=pipe_input, output=DummyOutput()
+        )
+    assert selected == "gs://test_bucket/model_final.ckpt"
+    assert search.choices[selected] is bucket.get("model_final.ckpt")
+    index.close()
+
+
+def test_list_order():
+    bucket = Bucket("test_bucket", {})
+    choices = {
+        "small": File("small", bucket, size=1),
+        "big": File("big", bucket, size=10),
+        "dir": Directory("dir", bucket),
+    }
+    choices["dir"]._total_size = 5
+    order = ListOrder("name")
+    names = ["small", "dir", "big"]
+    assert order.apply(names, choices) == names
+    order.toggle()
+    assert order.apply(names, choices) == ["big", "dir", "small"]
+    assert format_usage(choices["big"]) == "10 B"
+    # totals of a subtree that is not loaded yet are marked
+    assert format_usage(choices["dir"]) == "5 B+"
+
+
+def test_custom_select_toggle_order(memory_backend):
+    bucket = Bucket("test_bucket", {})
+    choices = {
+        name: File(name, bucket, "c", "u", size=size)
+        for name, size in (("small", 1), ("big", 10))
+    }
+    with create_pipe_input() as pipe_input, patch(
+        "pgcs.custom_select.list_order", ListOrder("name")
+    ) as order:
+        pipe_input.send_text(
+            "".join(
+                (
+                    REVERSE_ANSI_SEQUENCES[Keys.ControlO],
+                    REVERSE_ANSI_SEQUENCES[Keys.Enter],
+                )
+            )
+        )
+        selected = custom_select(choices, input=pipe_input, output=DummyOutput())
+        assert selected == "big"
+        assert order.by_size
+
+
+@pytest.fixture
+def memory_backend():
+    # the cached tree is revalidated as directories are entered
+    backend = MemoryBackend({"gs://test_bucket/d/x": b"", "gs://test_bucket/f1": b""})
+    with patch("pgcs.file_system.backend._backend", backend):
+        yield backend
+
+
+def browsed_tree():
+    root = {}
+    bucket = Bucket("test_bucket", root)
+    root[bucket.name] = bucket
+    directory = Directory("d", bucket)
+    for entry in (File("f1", bucket), directory, File("f2", bucket)):
+        bucket.add(entry)
+    directory.add(File("x", directory))
+    bucket._loaded = directory._loaded = True
+    bucket._listed_at = directory._listed_at = time.time()
+    return root, bucket, directory
+
+
+def test_traverse_gcs_restores_cursor_on_back(memory_backend):
+    root, bucket, _ = browsed_tree()
+    keys = (Keys.Right, Keys.Down, Keys.Right, Keys.Left, Keys.Down, Keys.Enter)
+    with create_pipe_input() as pipe_input:
+        pipe_input.send_text("".join(REVERSE_ANSI_SEQUENCES[key] for key in keys))
+        # without the cursor kept on "d", Enter would open it and wait for more
+        timer = threading.Timer(
+            5, lambda: pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.ControlC])
+        )
+        timer.start()
+        picked = traverse_gcs(root, input=pipe_input, output=DummyOutput())
+        timer.cancel()
+    assert picked is bucket.get("f2")
+
+
+def test_browser_history(memory_backend):
+    root, bucket, directory = browsed_tree()
+    browser = Browser(View(root), output=DummyOutput())
+    browser.open(bucket)
+    browser.text_area.text = "d"
+    browser.control.pointed_at = 0
+    bucket_view = browser.view
+    browser.open(directory)
+    assert browser.view.source is directory
+    assert browser.text_area.text == ""
+    assert browser.history == [browser.history[0], bucket_view]
+
+    browser.back()
+    # the query and cursor come back with the view, results are not filtered again
+    assert browser.view is bucket_view
+    assert browser.text_area.text == "d"
+    assert browser.control.get_pointed_at() == "d"
+    # going into the directory again finds it as it was left
+    directory_view = browser._forward
+    browser.open(directory)
+    assert browser.view is directory_view
+
+    # with no history left, back goes to the parent
+    browser.history.clear()
+    browser.back()
+    assert browser.view.source is bucket
+    browser.back()
+    assert browser.view.source is None
+    assert browser.view.choices is root
+    browser.back()
+    assert browser.view.choices is root
+
+
+def test_browser_search(memory_backend, tmp_path):
+    root, bucket, directory = browsed_tree()
+    index = ObjectIndex(tmp_path / "index.sqlite3")
+    index.update_tree(bucket)
+    with create_pipe_input() as pipe_input, patch(
+        "prompt_toolkit.widgets.TextArea.text", "x"
+    ):
+        pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Enter])
+        timer = threading.Timer(
+            0.5, lambda: pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Enter])
+        )
+        timer.start()
+        # the hit opens its directory, where "x" is picked
+        picked = traverse_gcs(
+            root, index=index, search=True, input=pipe_input, output=DummyOutput()
+        )
+    assert picked is directory.get("x")
+    index.close()
+
+
+def test_browser_lists_query_matches(memory_backend):
+    bucket = Bucket("test_bucket", {})
+    with create_pipe_input() as pipe_input, patch(
+        "pgcs.custom_select.load_in_background"
+    ):
+        pipe_input.send_text("f1")
+        timer = threading.Timer(
+            0.6, lambda: pipe_input.send_text(REVERSE_ANSI_SEQUENCES[Keys.Enter])
+        )
+        timer.start()
+        # nothing lists the bucket but the query
+        picked = traverse_gcs(
+            bucket.children, bucket, input=pipe_input, output=DummyOutput()
+        )
+    assert picked is bucket.get("f1")
+    assert bucket.partial
+
+
+def test_load_in_background_lists_flat_buckets(memory_backend):
+    bucket = Bucket("test_bucket", {})
+    with patch(
+        "pgcs.custom_select.pref", GCSPref(flat_listing_buckets=("test_bucket",))
+    ):
+        load_in_background(bucket)
+        future = flat_listings["test_bucket"]
+        assert future.result(5)
+        # a bucket loaded whole is not listed whole again
+        load_in_background(bucket)
+    assert flat_listings.pop("test_bucket") is future
+    assert bucket.get("d").get("x").path() == "gs://test_bucket/d/x"
+    assert bucket.usage[2]
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+from pgcs.download import PART_SUFFIX, PROGRESS_SUFFIX, DownloadManager
+from pgcs.file_system.entries import Bucket, Directory, File
+
+DATA = b"0123456789"
+
+
+def cat_file(path, start, end):
+    return DATA[start:end]
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_download_file_in_chunks(mock_backend, tmp_path):
+    mock_backend.read.side_effect = cat_file
+    file = File("file", Bucket("test_bucket", {}), "c", "u", size=len(DATA))
+    manager = DownloadManager(concurrency=4, chunk_size=3)
+    manager.download(file, str(tmp_path))
+    manager.wait()
+    assert (tmp_path / "file").read_bytes() == DATA
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["file"]
+    assert mock_backend.read.call_count == 4
+    assert manager.status() == "downloaded 1/1 files, 0.0/0.0 MiB"
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_download_resumes_partial_file(mock_backend, tmp_path):
+    mock_backend.read.side_effect = cat_file
+    file = File("file", Bucket("test_bucket", {}), "c", "u", size=10, generation="1")
+    (tmp_path / f"file{PART_SUFFIX}").write_bytes(b"012345" + b"\0" * 4)
+    (tmp_path / f"file{PROGRESS_SUFFIX}").write_text("10 1\n0\n1\n")
+    manager = DownloadManager(concurrency=2, chunk_size=3)
+    manager.download(file, str(tmp_path))
+    manager.wait()
+    assert (tmp_path / "file").read_bytes() == DATA
+    starts = sorted(call.args[1] for call in mock_backend.read.call_args_list)
+    assert starts == [6, 9]
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_download_restarts_changed_object(mock_backend, tmp_path):
+    mock_backend.read.side_effect = cat_file
+    file = File("file", Bucket("test_bucket", {}), "c", "u", size=10, generation="2")
+    (tmp_path / f"file{PART_SUFFIX}").write_bytes(b"xxxxxx" + b"\0" * 4)
+    (tmp_path / f"file{PROGRESS_SUFFIX}").write_text("10 1\n0\n1\n")
+    manager = DownloadManager(concurrency=2, chunk_size=3)
+    manager.download(file, str(tmp_path))
+    manager.wait()
+    assert (tmp_path / "file").read_bytes() == DATA
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_download_directory(mock_backend, tmp_path):
+    mock_backend.read.side_effect = cat_file
+    mock_backend.find.return_value = {
+        "test_bucket/dir/a": {"size": 10},
+        "test_bucket/dir/sub/b": {"size": 4},
+        "test_bucket/dir/sub/": {"size": 0},
+    }
+    directory = Directory("dir", Bucket("test_bucket", {}))
+    manager = DownloadManager(concurrency=4, chunk_size=4)
+    manager.download(directory, str(tmp_path))
+    manager.wait()
+    assert (tmp_path / "dir" / "a").read_bytes() == DATA
+    assert (tmp_path / "dir" / "sub" / "b").read_bytes() == DATA[:4]
+    assert not manager.errors
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_download_error(mock_backend, tmp_path):
+    mock_backend.find.side_effect = FileNotFoundError("gs://test_bucket/dir")
+    manager = DownloadManager(concurrency=1, chunk_size=4)
+    manager.download(Directory("dir", Bucket("test_bucket", {})), str(tmp_path))
+    manager.wait()
+    assert manager.errors == ["gs://test_bucket/dir"]
+    assert "1 failed" in manager.status()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_download_rejects_names_outside_dest(mock_backend, tmp_path):
+    mock_backend.read.side_effect = cat_file
+    mock_backend.find.return_value = {
+        "test_bucket/dir/a": {"size": 10},
+        "test_bucket/dir/../../../x": {"size": 10},
+        "test_bucket/dir//./b": {"size": 4},
+    }
+    dest = tmp_path / "dest"
+    manager = DownloadManager(concurrency=2, chunk_size=4)
+    manager.download(Directory("dir", Bucket("test_bucket", {})), str(dest))
+    manager.wait()
+    assert (dest / "dir" / "a").read_bytes() == DATA
+    assert (dest / "dir" / "b").read_bytes() == DATA[:4]
+    assert not (tmp_path / "x").exists()
+    assert len(manager.errors) == 1
+    assert "../../../x" in manager.errors[0]
@@ -0,0 +1,100 @@
+import subprocess
+import sys
+import threading
+from unittest.mock import patch
+
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.entries import Bucket
+from pgcs.main import (
+    flush_periodically,
+    flush_tree,
+    list_bucket_names,
+    main,
+    read_bucket_names,
+    sync_buckets,
+)
+from pgcs.preferences import GCSPref
+
+
+def test_main_import_is_lazy():
+    code = (
+        "import sys, pgcs.main; "
+        "print(sorted({m.split('.')[0] for m in sys.modules} "
+        "& {'gcsfs', 'prompt_toolkit', 'sqlite3'}))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "[]"
+
+
+def test_bucket_names_roundtrip(tmp_path):
+    assert read_bucket_names(tmp_path) == []
+    backend = MemoryBackend({"gs://b/x": b"", "gs://a/y": b""})
+    with patch("pgcs.file_system.backend._backend", backend):
+        assert list_bucket_names(tmp_path) == ["a", "b"]
+    assert read_bucket_names(tmp_path) == ["a", "b"]
+
+
+def test_sync_buckets():
+    root = {}
+    sync_buckets(root, lambda name: Bucket(name, root), ["a", "b"])
+    a = root["a"]
+    sync_buckets(root, lambda name: Bucket(name, root), ["a", "c"])
+    assert sorted(root) == ["a", "c"]
+    # buckets that are still listed keep their cached tree
+    assert root["a"] is a
+
+
+def test_pref_parses_values(tmp_path):
+    pref_file = tmp_path / ".preference"
+    with patch("pgcs.main.PREF_FILE_PATH", pref_file), patch(
+        "pgcs.preferences.PREF_FILE_PATH", pref_file
+    ):
+        for key, value in (
+            ("measure_usage", "False"),
+            ("prefetch_depth", "3"),
+            ("flat_listing_buckets", "a,b"),
+        ):
+            with patch.object(sys, "argv", ["pg", "pref", key, value]):
+                main()
+        pref = GCSPref.read()
+    assert pref.measure_usage is False
+    assert pref.prefetch_depth == 3
+    assert pref.flat_listing_buckets == ("a", "b")
+
+
+def test_profile_prints_report_at_exit(tmp_path, capsys):
+    pref_file = tmp_path / ".preference"
+    with patch("pgcs.main.PREF_FILE_PATH", pref_file), patch(
+        "pgcs.preferences.PREF_FILE_PATH", pref_file
+    ), patch("atexit.register") as register:
+        with patch.object(sys, "argv", ["pg", "--profile", "pref", "--init"]):
+            main()
+    (report,), _ = register.call_args
+    report()
+    assert "waiting on GCS" in capsys.readouterr().err
+
+
+def test_flush_tree_saves_changed_buckets(tmp_path):
+    backend = MemoryBackend({"gs://a/x": b"", "gs://b/y": b""})
+    pref = GCSPref(cache_dir=tmp_path)
+    root = {}
+    sync_buckets(root, lambda name: Bucket(name, root, cache_dir=tmp_path), ["a", "b"])
+    with patch("pgcs.file_system.backend._backend", backend):
+        root["a"].load()
+    flush_tree(pref, root, None)
+    # a bucket that was never opened keeps whatever is on disk
+    assert (tmp_path / "a").exists()
+    assert not (tmp_path / "b").exists()
+
+    mtime = (tmp_path / "a").stat().st_mtime_ns
+    flush_tree(pref, root, None)
+    assert (tmp_path / "a").stat().st_mtime_ns == mtime
+
+
+def test_flush_periodically():
+    flushed = threading.Event()
+    stop = flush_periodically(0.01, flushed.set)
+    assert flushed.wait(5)
+    stop.set()
@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+from pgcs.matcher import Matcher, compile_query, is_subsequence, listing_filter
+
+NAMES = ["train/model_final.ckpt", "models/final", "mfc", "README.md", "xyz"]
+
+
+def test_matcher_regex():
+    matcher = Matcher(NAMES)
+    assert matcher.match("") == NAMES
+    assert matcher.match("final") == ["train/model_final.ckpt", "models/final"]
+    assert matcher.match("^m") == ["models/final", "mfc"]
+    assert matcher.match("readme") == ["README.md"]
+    # half-typed patterns are searched for literally instead of raising
+    assert matcher.match("[m") == []
+
+
+def test_matcher_regex_keeps_escapes():
+    matcher = Matcher(["abc", "123", "a1"])
+    # uppercase escapes are not folded into their lowercase opposites
+    assert matcher.match(r"^\D+$") == ["abc"]
+    assert matcher.match(r"\W") == []
+    assert matcher.match(r"^A\d") == ["a1"]
+    matcher.set_items(["abc", "123", "a1", "XYZ"])
+    assert matcher.match(r"^A\d") == ["a1"]
+    matcher.match(r"^\D+$")
+    matcher.set_items(["abc", "123", "a1", "XYZ", "42"])
+    assert matcher.match(r"^\D+$") == ["abc", "XYZ"]
+
+
+def test_matcher_case_sensitive():
+    matcher = Matcher(NAMES, ignore_case=False)
+    assert matcher.match("readme") == []
+    assert matcher.match("README") == ["README.md"]
+
+
+def test_matcher_fuzzy_ranking():
+    matcher = Matcher(NAMES, mode="fuzzy")
+    assert matcher.match("mf") == ["mfc", "train/model_final.ckpt", "models/final"]
+    assert matcher.match("mfc") == ["mfc", "train/model_final.ckpt"]
+    assert matcher.match("zz") == []
+
+
+def test_matcher_narrows_previous_result():
+    matcher = Matcher(NAMES)
+    matcher.match("fin")
+    with patch.object(matcher, "_filter", wraps=matcher._filter) as mock_filter:
+        assert matcher.match("fina") == ["train/model_final.ckpt", "models/final"]
+        assert list(mock_filter.call_args.args[1]) == [0, 1]
+
+        # a query that is not an extension rescans every name
+        matcher.match("md")
+        assert list(mock_filter.call_args.args[1]) == list(range(len(NAMES)))
+
+        # previously seen queries are answered from the cache
+        mock_filter.reset_mock()
+        matcher.match("fin")
+        mock_filter.assert_not_called()
+
+
+def test_matcher_set_items():
+    matcher = Matcher(NAMES)
+    assert matcher.match("xyz") == ["xyz"]
+    matcher.set_items(["xyz1", "abc"])
+    assert matcher.match("xyz") == ["xyz1"]
+
+
+def test_compile_query_fuzzy():
+    assert compile_query("a.c", "fuzzy", True).pattern == r"a[^\.]*\.[^c]*c"
+    assert is_subsequence("ac", "abc")
+    assert not is_subsequence("ca", "abc")
+
+
+def test_matcher_extend_items():
+    matcher = Matcher(NAMES[:2], mode="fuzzy")
+    assert matcher.match("mf") == ["train/model_final.ckpt", "models/final"]
+    with patch.object(matcher, "_filter", wraps=matcher._filter) as mock_filter:
+        matcher.set_items(NAMES)
+        # only the appended names are filtered before re-ranking
+        assert list(mock_filter.call_args_list[0].args[1]) == [2, 3, 4]
+    assert matcher.match("mf") == ["mfc", "train/model_final.ckpt", "models/final"]
+
+
+def test_listing_filter():
+    assert listing_filter("model_", "regex") == ("model_", None)
+    assert listing_filter("^ckpt.v1", "regex") == ("ckpt.v1", None)
+    assert listing_filter(r"model_.*\.ckpt", "regex") == ("", "*model_*.ckpt*")
+    assert listing_filter("^run.*final$", "regex") == ("run", "run*final")
+    assert listing_filter("mf", "fuzzy") == ("", "*m*f*")
+    # neither a prefix nor a glob finds what these match
+    for query in ("", "a|b", r"\d+", "dir/x", "^a.*b*"):
+        assert listing_filter(query, "regex") is None
+    assert listing_filter("a*", "fuzzy") is None
@@ -0,0 +1,80 @@
+import time
+from unittest.mock import patch
+
+from pgcs.file_system.entries import Bucket, Directory
+from pgcs.prefetch import Prefetcher
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def wait_loaded(entry):
+    wait_for(lambda: entry.loaded)
+
+
+def list_objects(bucket, prefix, delimiter, page_token):
+    if not prefix:
+        return {"prefixes": ["dir1/", "dir2/"], "items": [{"name": "file"}]}
+    return {"prefixes": [f"{prefix}nested/"]}
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_prefetcher_schedule(mock_backend):
+    mock_backend.list_page.side_effect = list_objects
+    bucket = Bucket("test_bucket", {})
+    prefetcher = Prefetcher(depth=2, concurrency=2)
+    prefetcher.schedule(bucket)
+    wait_loaded(bucket)
+    assert sorted(bucket.children) == ["dir1", "dir2", "file"]
+    # dir1 and dir2 are listed as the second level
+    wait_loaded(bucket.get("dir1"))
+    wait_loaded(bucket.get("dir2"))
+    prefetcher.shutdown()
+    assert bucket.get("dir1").children
+    assert bucket.get("dir2").children
+    assert not bucket.get("dir1").get("nested").children
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_prefetcher_focus(mock_backend):
+    mock_backend.list_page.side_effect = list_objects
+    bucket = Bucket("test_bucket", {})
+    dirs = [Directory(f"dir{i}", bucket) for i in range(5)]
+    prefetcher = Prefetcher(depth=1, concurrency=1)
+    prefetcher.focus(dirs, 2)
+    for entry in dirs[1:4]:
+        wait_loaded(entry)
+        assert entry.children
+    prefetcher.shutdown()
+    assert not dirs[0].children
+    assert not dirs[4].children
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_prefetcher_disabled(mock_backend):
+    bucket = Bucket("test_bucket", {})
+    prefetcher = Prefetcher(depth=1, concurrency=0)
+    prefetcher.schedule(bucket)
+    prefetcher.shutdown()
+    mock_backend.list_page.assert_not_called()
+
+
+@patch("pgcs.file_system.backend._backend")
+def test_prefetcher_forgets_finished(mock_backend):
+    mock_backend.list_page.side_effect = list_objects
+    bucket = Bucket("test_bucket", {})
+    prefetcher = Prefetcher(depth=1, concurrency=1)
+    first = Directory("dir", bucket)
+    prefetcher.schedule(first)
+    wait_for(lambda: not prefetcher._futures)
+    assert first.loaded
+    # a directory replaced by a revalidation is listed again under its path
+    second = Directory("dir", bucket)
+    prefetcher.schedule(second)
+    wait_loaded(second)
+    prefetcher.shutdown()
+    assert not prefetcher._futures
@@ -0,0 +1,104 @@
+import gzip
+import struct
+from unittest.mock import patch
+
+from pgcs.file_system.backend import MemoryBackend, set_backend
+from pgcs.file_system.entries import Bucket, File
+from pgcs.preview import (
+    PreviewCache,
+    describe_parquet,
+    fetch_preview,
+    highlight,
+    to_text,
+)
+
+# FileMetaData of a 5 row file with the schema {a: INT32, b: BYTE_ARRAY}
+FOOTER = bytes(
+    [0x15, 0x02, 0x19, 0x3C]
+    + [0x48, 0x06, *b"schema", 0x15, 0x04, 0x00]
+    + [0x15, 0x02, 0x38, 0x01, *b"a", 0x00]
+    + [0x15, 0x0C, 0x38, 0x01, *b"b", 0x00]
+    + [0x16, 0x0A, 0x19, 0x0C, 0x00]
+)
+LINES = b"".join(b'{"line": %d}\n' % i for i in range(100))
+OBJECTS = {
+    "test_bucket/lines.jsonl": LINES,
+    "test_bucket/lines.jsonl.gz": gzip.compress(LINES),
+    "test_bucket/blob": bytes(range(256)),
+    "test_bucket/table.parquet": b"PAR1"
+    + b"\0" * 64
+    + FOOTER
+    + struct.pack("<I", len(FOOTER))
+    + b"PAR1",
+}
+
+
+def plain(fragments):
+    return "".join(text for _, text in fragments)
+
+
+def test_to_text_drops_cut_lines():
+    assert to_text(b"1\n2\n3") == "1\n2\n3"
+    assert to_text(b"1\n2\n3", head_cut=True, tail_cut=True) == "2"
+    assert to_text(b"\0\x01ab").startswith("00000000  00 01 61 62")
+
+
+def test_highlight():
+    fragments = highlight('{"a": 1}', "x.jsonl")
+    assert plain(fragments) == '{"a": 1}'
+    assert any(style.startswith("class:pygments.") for style, _ in fragments)
+    assert highlight("text", "x.unknown") == [("", "text")]
+    assert highlight("text", "x", "application/json") != [("", "text")]
+
+
+def test_describe_parquet():
+    assert describe_parquet(FOOTER).split("\n") == [
+        "parquet  5 rows  0 row groups",
+        "a: INT32",
+        "b: BYTE_ARRAY",
+    ]
+
+
+@patch("pgcs.file_system.backend._backend", None)
+def test_fetch_preview():
+    backend = MemoryBackend(OBJECTS)
+    set_backend(backend)
+    bucket = Bucket("test_bucket", {})
+    bucket.load()
+
+    with patch.object(backend, "aread", wraps=backend.aread) as aread:
+        head = plain(fetch_preview(bucket.get("lines.jsonl"), "head", 64))
+        aread.assert_called_once_with("gs://test_bucket/lines.jsonl", 0, 64)
+    assert head.split("\n") == ['{"line": %d}' % i for i in range(5)]
+    tail = plain(fetch_preview(bucket.get("lines.jsonl"), "tail", 64))
+    assert tail.split("\n")[-2:] == ['{"line": 99}', ""]
+
+    head = plain(fetch_preview(bucket.get("lines.jsonl.gz"), "head", 64))
+    assert head.startswith('{"line": 0}\n{"line": 1}')
+    tail = plain(fetch_preview(bucket.get("lines.jsonl.gz"), "tail", 64))
+    assert "cannot be decoded" in tail
+
+    assert plain(fetch_preview(bucket.get("blob"), "head", 32)).count("\n") == 1
+    table = plain(fetch_preview(bucket.get("table.parquet"), "head", 16))
+    assert table.startswith("parquet  5 rows")
+
+
+@patch("pgcs.file_system.backend._backend", None)
+def test_fetch_preview_stats_unlisted_file():
+    set_backend(MemoryBackend(OBJECTS))
+    file = File("lines.jsonl", Bucket("test_bucket", {}))
+    assert plain(fetch_preview(file, "head", 12)) == '{"line": 0}'
+    assert file.size == len(LINES)
+
+
+def test_preview_cache_evicts_least_recently_used():
+    cache = PreviewCache(max_chars=10)
+    cache.put(("a",), [("", "1234")])
+    cache.put(("b",), [("", "1234")])
+    assert cache.get(("a",)) == [("", "1234")]
+    cache.put(("c",), [("", "1234")])
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None
+    # a preview larger than the cap is kept until the next one arrives
+    cache.put(("d",), [("", "x" * 20)])
+    assert len(cache) == 1
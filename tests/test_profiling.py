@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+from pgcs.file_system.backend import MemoryBackend
+from pgcs.file_system.entries import Bucket
+from pgcs.profiling import Profiler, format_duration
+
+
+def test_profiler_histogram():
+    profiler = Profiler()
+    for seconds in (0.0005, 0.003, 0.003, 0.1):
+        profiler.record("gcs.list_page", seconds)
+    profiler.record("filter", 0.002)
+    stats = profiler.stats("gcs.list_page")
+    assert stats.count == 4
+    assert stats.max == 0.1
+    assert stats.buckets[:3] == [1, 0, 2]
+    # quantiles are read from the buckets, capped by the slowest call
+    assert stats.percentile(0.5) == 0.004
+    assert stats.percentile(1) == 0.1
+    assert profiler.last_request == ("gcs.list_page", 0.1)
+
+    report = profiler.report()
+    assert report.splitlines()[1].startswith("gcs.list_page")
+    assert "waiting on GCS 107 ms, local work 2 ms" in report
+
+
+def test_profiler_overlay():
+    profiler = Profiler()
+    assert profiler.overlay() == ""
+    profiler.record("filter", 0.01)
+    # local work is not a request
+    assert profiler.overlay() == ""
+    profiler.record("gcs.stat", 0.25)
+    profiler.count("cache.hit", 3)
+    profiler.count("cache.miss")
+    assert profiler.overlay() == "gcs.stat 250 ms, cache 75% hit"
+
+
+def test_format_duration():
+    assert format_duration(0.0000125) == "12 µs"
+    assert format_duration(0.0125) == "12 ms"
+    assert format_duration(12.5) == "12.50 s"
+
+
+def test_loads_are_timed(tmp_path):
+    profiler = Profiler()
+    backend = MemoryBackend({"gs://b/d/x": b"x"})
+    with patch("pgcs.file_system.backend._backend", backend), patch(
+        "pgcs.file_system.backend.profiler", profiler
+    ), patch("pgcs.file_system.entries.profiler", profiler):
+        bucket = Bucket("b", {}, cache_dir=tmp_path)
+        bucket.load()
+        bucket.save(tmp_path)
+        Bucket("b", {}, cache_dir=tmp_path).load()
+    assert profiler.stats("gcs.list_page").count == 1
+    assert profiler.stats("cache.read").count == 2
+    assert (profiler.counter("cache.hit"), profiler.counter("cache.miss")) == (1, 1)
@@ -0,0 +1,10 @@
+from pgcs.utils import format_size
+
+
+def test_format_size():
+    assert format_size(0) == "0 B"
+    assert format_size(1023) == "1023 B"
+    assert format_size(1536) == "1.5 KiB"
+    assert format_size(3 * 2**30) == "3.0 GiB"
+    # the largest unit is not rounded any further
+    assert format_size(2**50) == "1024.0 TiB"